@@ -4,13 +4,15 @@ from flask import Flask, jsonify
 from flask_restful import Api
 from flask_httpauth import HTTPBasicAuth
 
-from www.resources.config import default_configs, config_path
+from www.resources.config import default_configs, config_path, configs
 from www.resources.authentication.oauth2 import OAuth2Provider
+from www.resources.authentication.password_management import PasswordHasher
 
 app = Flask(__name__)
 api = Api(app)
 auth = HTTPBasicAuth()
 oauth2 = OAuth2Provider()
+password_hasher = PasswordHasher.from_configs(configs.get('AUTH').get('password_hashing'))
 
 # @app.errorhandler(Exception)
 def all_exception_response(e):
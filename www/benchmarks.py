@@ -0,0 +1,145 @@
+__author__ = 'Mepla'
+
+import argparse
+import logging
+import random
+import time
+
+from py2neo import Graph, Relationship, authenticate
+
+from www.resources.config import configs
+from www.resources.databases.factories import DatabaseFactory
+from www.resources.utilities.helpers import uuid_with_prefix
+from www.resources.databases.database_drivers import DatabaseRecordNotFound
+from www.resources.promotion_eligibility import EligibilityEngine
+
+
+def time_calls(func, iterations):
+    durations = []
+    for i in range(iterations):
+        start = time.time()
+        func()
+        durations.append(time.time() - start)
+
+    durations.sort()
+    return {'iterations': iterations,
+            'total': sum(durations),
+            'mean': sum(durations) / iterations,
+            'p50': durations[int(iterations * 0.50)],
+            'p95': durations[min(int(iterations * 0.95), iterations - 1)]}
+
+
+def print_results(title, results):
+    print(title)
+    for name, stats in results:
+        print('  {:<28} total: {:8.3f}s  mean: {:7.2f}ms  p50: {:7.2f}ms  p95: {:7.2f}ms'.format(
+            name, stats['total'], stats['mean'] * 1000, stats['p50'] * 1000, stats['p95'] * 1000))
+
+
+def _node_by_node_checkin(bid, uid):
+    """The check-in path as it was before the single MERGE statement: a fresh authenticated Graph, a business
+    lookup in `CheckIn.post`, then business, user and relation lookups and a push/create in the driver. It writes
+    the same `count`/`first`/`last` summary `checkin_statement` does, so both paths can run on migrated data."""
+    neo4j_configs = configs.get('DATABASES').get('neo4j')
+    neo4j_address = neo4j_configs.get('host') + ':' + str(neo4j_configs.get('port'))
+    authenticate(neo4j_address, neo4j_configs.get('username'), neo4j_configs.get('password'))
+    graph = Graph('http://' + neo4j_address + '/db/data')
+
+    graph.find_one('business', 'bid', bid)
+    business = graph.find_one('business', 'bid', bid)
+    user = graph.find_one('user', 'uid', uid)
+    existing_relation = graph.match_one(user, 'CHECK_IN', business)
+    timestamp = time.time()
+    if existing_relation:
+        existing_relation.properties['count'] += 1
+        if existing_relation.properties['first'] is None:
+            existing_relation.properties['first'] = timestamp
+        existing_relation.properties['last'] = timestamp
+        existing_relation.push()
+    else:
+        new_relation = Relationship(user, 'CHECK_IN', business, rid=uuid_with_prefix('rid'), count=1,
+                                    first=timestamp, last=timestamp)
+        graph.create(new_relation)
+
+
+def _merge_checkin(bid, uid):
+    DatabaseFactory().get_database_driver('graph').checkin_user(bid, uid)
+
+
+def bench_checkin(bid, uid, iterations):
+    results = [('node by node (previous)', time_calls(lambda: _node_by_node_checkin(bid, uid), iterations)),
+               ('single cypher merge', time_calls(lambda: _merge_checkin(bid, uid), iterations))]
+    print_results('Check-in of {} into {}:'.format(uid, bid), results)
+
+
+def make_promotions(bids, count, seed=0):
+    """`count` promotions of `bids` with a mix of the conditions promotions can have, only kept in memory."""
+    generator = random.Random(seed)
+    promotions = []
+    for i in range(count):
+        conditions = {}
+        if generator.random() < 0.5:
+            conditions['gender'] = generator.choice(['male', 'female'])
+        if generator.random() < 0.5:
+            conditions['age'] = {'from': generator.randint(12, 40), 'to': generator.randint(40, 70)}
+        if generator.random() < 0.7:
+            conditions['checkins'] = {'min': generator.randint(1, 10), 'days_since_last': generator.randint(0, 3)}
+        if generator.random() < 0.3:
+            conditions['must_follow'] = True
+        promotions.append({'pid': 'pid{}'.format(i), 'bid': generator.choice(bids), 'conditions': conditions})
+    return promotions
+
+
+def _per_promotion_eligibility(promotions, uid):
+    """The lookups `EligiblePromotions.check_eligibility` did before the engine: a driver, the user and, for
+    promotions with check-in conditions, the check-ins into the business, for every single promotion."""
+    for promotion in promotions:
+        graph_db = DatabaseFactory().get_database_driver('graph')
+        graph_db.find_single_user('uid', uid)
+        if promotion['conditions'].get('checkins'):
+            try:
+                graph_db.find_single_user_checkins(uid, promotion['bid'])
+            except DatabaseRecordNotFound:
+                pass
+
+
+def _engine_eligibility(promotions, uid):
+    engine = EligibilityEngine()
+    engine.evaluate_all(promotions, engine.load_context(uid))
+
+
+def bench_eligibility(bids, uid, count, iterations):
+    promotions = make_promotions(bids, count)
+    engine = EligibilityEngine()
+    context = engine.load_context(uid)
+    results = [('per promotion lookups (previous)', time_calls(lambda: _per_promotion_eligibility(promotions, uid),
+                                                               iterations)),
+               ('engine, load and evaluate', time_calls(lambda: _engine_eligibility(promotions, uid), iterations)),
+               ('engine, evaluate only', time_calls(lambda: engine.evaluate_all(promotions, context), iterations))]
+    print_results('Eligibility of {} for {} promotions:'.format(uid, count), results)
+
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.WARNING)
+    logging.getLogger('httpstream').setLevel(logging.CRITICAL)
+
+    parser = argparse.ArgumentParser(description='Benchmarks of hot paths. They write to the configured databases, '
+                                                 'only run them against test data.')
+    subparsers = parser.add_subparsers(dest='benchmark')
+
+    checkin_parser = subparsers.add_parser('checkin', help='Compare check-in write paths.')
+    checkin_parser.add_argument('--bid', required=True)
+    checkin_parser.add_argument('--uid', required=True)
+    checkin_parser.add_argument('--iterations', type=int, default=100)
+
+    eligibility_parser = subparsers.add_parser('eligibility', help='Compare promotion eligibility checks.')
+    eligibility_parser.add_argument('--bid', required=True, action='append', help='May be given several times.')
+    eligibility_parser.add_argument('--uid', required=True)
+    eligibility_parser.add_argument('--promotions', type=int, default=1000)
+    eligibility_parser.add_argument('--iterations', type=int, default=5)
+
+    args = parser.parse_args()
+    if args.benchmark == 'checkin':
+        bench_checkin(args.bid, args.uid, args.iterations)
+    elif args.benchmark == 'eligibility':
+        bench_eligibility(args.bid, args.uid, args.promotions, args.iterations)
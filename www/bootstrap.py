@@ -0,0 +1,32 @@
+__author__ = 'Mepla'
+
+import argparse
+import json
+import logging
+import sys
+
+from www.resources.databases.schema import ensure_schema, verify_schema, log_schema_report
+from www.resources.databases.database_drivers import DatabaseFindError
+
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.INFO)
+    logging.getLogger('httpstream').setLevel(logging.CRITICAL)
+
+    parser = argparse.ArgumentParser(description='Creates the indexes and constraints of the mongo and neo4j '
+                                                 'databases. Existing ones are left untouched.')
+    parser.add_argument('--verify-only', action='store_true', help='Only report what is missing.')
+    args = parser.parse_args()
+
+    if not args.verify_only:
+        ensure_schema()
+
+    try:
+        report = verify_schema()
+    except DatabaseFindError:
+        logging.error('Could not read the database schema, check that the databases are reachable.')
+        sys.exit(1)
+    log_schema_report(report)
+    print(json.dumps(report, indent=4))
+
+    sys.exit(0 if not report['missing_mongo_indexes'] and not report['missing_neo4j_schema'] else 1)
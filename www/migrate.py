@@ -0,0 +1,116 @@
+__author__ = 'Mepla'
+
+import argparse
+import logging
+
+from www.resources.databases.factories import DatabaseFactory
+from www.resources.databases.checkin_events import CheckinEventStore
+from www.resources.databases.promotion_index import PromotionIndex
+from www.resources.authentication.credentials import CredentialStore
+from www.resources.databases.database_drivers import DatabaseRecordNotFound
+
+
+def migrate_checkin_timestamps(batch_size=100):
+    """Moves the space separated `timestamps` of CHECK_IN relationships into the check-in event store.
+
+    Each relationship is handled on its own: its previously migrated events are removed, its timestamps are written
+    as events and the relationship is reduced to its summary. Running the migration again after a failure is safe.
+    """
+    graph_db = DatabaseFactory().get_database_driver('graph')
+    checkin_events = CheckinEventStore()
+    checkin_events.ensure_indexes()
+
+    migrated = 0
+    while True:
+        checkins = graph_db.find_checkins_with_timestamps(batch_size)
+        if not checkins:
+            break
+
+        for checkin in checkins:
+            relation = checkin['checkin']
+            timestamps = [float(t) for t in relation.get('timestamps', '').split()]
+
+            checkin_events.delete({'rid': relation['rid'], 'migrated': True})
+            checkin_events.append_many([checkin_events.create_event(checkin['bid'], checkin['uid'], relation['rid'],
+                                                                    t, migrated=True) for t in timestamps])
+
+            # Check-ins recorded after the deploy already updated `first` and `last`.
+            known = timestamps + [t for t in (relation.get('first'), relation.get('last')) if t is not None]
+            graph_db.set_checkin_summary(relation['rid'], min(known) if known else None, max(known) if known else None)
+            migrated += 1
+
+        logging.info('Migrated check-in timestamps of {} relationships.'.format(migrated))
+
+    return migrated
+
+
+def migrate_business_admins(batch_size=100):
+    """Turns the bids in the space separated `responsible_for` of users into ADMIN_OF relationships."""
+    graph_db = DatabaseFactory().get_database_driver('graph')
+
+    migrated = 0
+    while True:
+        users = graph_db.find_users_with_responsibilities(batch_size)
+        if not users:
+            break
+
+        for user in users:
+            for bid in (user.get('responsible_for') or '').split():
+                if bid == user['uid']:
+                    continue
+                try:
+                    graph_db.add_business_admin(user['uid'], bid)
+                except DatabaseRecordNotFound:
+                    logging.warning('Business of admin does not exist anymore: bid: {}  uid: {}'.format(bid, user['uid']))
+
+            graph_db.remove_responsibilities(user['uid'])
+            migrated += 1
+
+        logging.info('Migrated business admins of {} users.'.format(migrated))
+
+    return migrated
+
+
+def migrate_credentials(batch_size=100):
+    """Rebuilds the credentials entries of all users from the graph, after that logins no longer need the graph."""
+    credential_store = CredentialStore()
+    credential_store.ensure_indexes()
+    return credential_store.rebuild(batch_size)
+
+
+def migrate_promotion_index(batch_size=100):
+    """Rebuilds the promotion index from `business_promotions`, for promotions created before it existed."""
+    promotion_index = PromotionIndex()
+    promotion_index.ensure_indexes()
+    return promotion_index.rebuild(batch_size)
+
+
+if __name__ == '__main__':
+    logging.getLogger().setLevel(logging.INFO)
+    logging.getLogger('httpstream').setLevel(logging.CRITICAL)
+
+    parser = argparse.ArgumentParser(description='Data migrations. They are idempotent and can be run again after '
+                                                 'a failure.')
+    subparsers = parser.add_subparsers(dest='migration')
+
+    checkin_parser = subparsers.add_parser('checkin_timestamps', help='Move CHECK_IN timestamps to the event store.')
+    checkin_parser.add_argument('--batch-size', type=int, default=100)
+
+    admins_parser = subparsers.add_parser('business_admins', help='Move users\' responsible_for to ADMIN_OF.')
+    admins_parser.add_argument('--batch-size', type=int, default=100)
+
+    credentials_parser = subparsers.add_parser('credentials', help='Rebuild login credentials in the auth database.')
+    credentials_parser.add_argument('--batch-size', type=int, default=100)
+
+    promotion_index_parser = subparsers.add_parser('promotion_index', help='Rebuild the promotion reverse index.')
+    promotion_index_parser.add_argument('--batch-size', type=int, default=100)
+
+    args = parser.parse_args()
+    if args.migration == 'checkin_timestamps':
+        migrate_checkin_timestamps(args.batch_size)
+    elif args.migration == 'business_admins':
+        migrate_business_admins(args.batch_size)
+    elif args.migration == 'credentials':
+        migrate_credentials(args.batch_size)
+    elif args.migration == 'promotion_index':
+        migrate_promotion_index(args.batch_size)
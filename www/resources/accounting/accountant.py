@@ -1,4 +1,4 @@
-from www.resources.accounting.point_transfer_reasons import PTR, Transaction
+from www.resources.accounting.point_transfer_reasons import PTR, Transaction, Ledger
 from www.resources.databases.factories import DatabaseFactory
 
 __author__ = 'Mepla'
@@ -6,13 +6,17 @@ __author__ = 'Mepla'
 
 class Accountant(object):
     def __init__(self):
-        self._db = DatabaseFactory().get_database_driver('documents/accounting')
+        self._db = DatabaseFactory().get_database_driver('document/accounting')
 
     def apply_ptrs(self, ptrs):
         transaction = Transaction(ptrs)
         audited_transaction = Audit(transaction).process()
+
+        ledger = Ledger(audited_transaction.transaction_id, self._db)
         for ptr in audited_transaction.ptrs:
-            ptr.process()
+            ptr.process(audited_transaction.transaction_id, ledger)
+        ledger.commit()
+        return audited_transaction
 
 
 class Audit(object):
@@ -9,7 +9,7 @@ class BaseCurrency(object):
         self._currency_string = currency_string
         assert isinstance(currency_full_name, (str, unicode, NoneType))
         self._currency_full_name = currency_full_name
-        assert isinstance(currency_full_name, (bool, NoneType))
+        assert isinstance(online, (bool, NoneType))
         self._online = online
         assert isinstance(changeable, (bool, NoneType))
         self._changeable = changeable
@@ -1,5 +1,7 @@
+import logging
+
 from www.resources.accounting.money import BaseMoneyExchange
-from www.resources.databases.database_drivers import DatabaseSaveError
+from www.resources.databases.database_drivers import DatabaseSaveError, DatabaseFindError, DatabaseEmptyResult
 from www.resources.databases.factories import DatabaseFactory
 from www.resources.utilities.helpers import uuid_with_prefix, date_now_formatted
 
@@ -25,7 +27,7 @@ class BasePTR(object):
         self._settlement_date = None
         self._settled = False
 
-    def process(self, transaction_id):
+    def process(self, transaction_id, ledger=None):
         pass
 
     def generate_log(self):
@@ -107,39 +109,27 @@ class PromotionPTR(PTR):
         super(PromotionPTR, self).__init__(money, initiator_id, debtor_id, creditor_id)
         self._pid = pid
 
-    def process(self, transaction_id):
-        dbf = DatabaseFactory()
-        acc_db = dbf.get_database_driver('docs/accounting')
-
-        user_acc_doc = acc_db.find_doc('id', self._creditor_id, 'balances', 1)
+    def process(self, transaction_id, ledger=None):
+        """Adds the writes of this PTR to `ledger`, or writes them right away when no ledger is given."""
+        commit = ledger is None
+        if commit:
+            ledger = Ledger(transaction_id)
 
         debtor_log = self.generate_log()
         debtor_log['creditor'] = 'echo'
         debtor_log['settled'] = False
-        debtor_log['transaction_id'] = transaction_id
-
-        try:
-            acc_db.save(debtor_log, 'ptr_logs')
-        except DatabaseSaveError as exc:
-            raise PTRProcessException(exc.message)
+        ledger.log(debtor_log)
 
         creditor_log = self.generate_log()
         creditor_log['debtor'] = 'echo'
         creditor_log['settled'] = True
         creditor_log['settlement_date'] = date_now_formatted()
-        creditor_log['transaction_id'] = transaction_id
 
-        if user_acc_doc['currency'] == self._money_exchange.currency.currency_string:
-            amount_to_add = self._money_exchange.amount
-        else:
-            amount_to_add = self._money_exchange.currency.convert_to(user_acc_doc['currency'])
-        user_acc_doc['balance'] += amount_to_add
+        ledger.credit(self._creditor_id, self._money_exchange)
+        ledger.log(creditor_log)
 
-        try:
-            acc_db.save(user_acc_doc, 'balances')
-            acc_db.save(creditor_log, 'ptr_logs')
-        except DatabaseSaveError as exc:
-            raise PTRProcessException(exc.message)
+        if commit:
+            ledger.commit()
 
     def generate_log(self):
         log = super(PromotionPTR, self).generate_log()
@@ -182,3 +172,138 @@ class BaseTransaction(object):
 
 class Transaction(BaseTransaction):
     pass
+
+
+class Ledger(object):
+    """Collects the writes of the PTRs of one transaction and commits them with as few round trips as possible.
+
+    Logs get the transaction id and are inserted in one bulk write. Credits are kept per account as money exchanges
+    and are applied at commit in one bulk write of atomic `$inc`s, one per account, of the amount converted to the
+    currency of the balance. Each increment is conditioned on that currency, the only thing the amount depends on,
+    so concurrent credits of a hot account never conflict; only a change of currency since the balance was read
+    makes one miss, which shows in the matched count, and then the balances are read again and the missed ones
+    retried, at most `max_retries` times. Every increment also increments the `version` of the balance, for readers
+    that want to detect changes.
+
+    All balances are read in one query before anything is written, so a transaction crediting an unknown account
+    fails without writing. The logs are written before the balances, and those that settle with the transaction are
+    written unsettled and marked `settles_with_transaction`; they are settled once all balances are updated. So every
+    applied credit has a log, and a transaction that failed while updating balances is found by its unsettled logs
+    instead of being retried blindly. A transaction costs one read and three writes, whatever the number of its PTRs
+    and accounts.
+    """
+
+    logs_collection = 'ptr_logs'
+    balances_collection = 'balances'
+    balance_fields = ['id', 'currency', 'balance', 'version']
+    max_retries = 5
+
+    def __init__(self, transaction_id, acc_db=None):
+        self._acc_db = acc_db or DatabaseFactory().get_database_driver('document/accounting')
+        self._transaction_id = transaction_id
+        self._balances = {}
+        self._logs = []
+        self._credits = {}
+
+    @property
+    def transaction_id(self):
+        return self._transaction_id
+
+    def load_balances(self, account_ids, reload=False):
+        missing = list(set(account_ids) if reload else set(account_ids) - set(self._balances))
+        if not missing:
+            return
+
+        try:
+            balances = list(self._acc_db.iter_docs(None, None, self.balances_collection,
+                                                   conditions={'id': {'$in': missing}}, fields=self.balance_fields))
+        except DatabaseEmptyResult:
+            balances = []
+        except DatabaseFindError as exc:
+            raise PTRProcessException('Balances could not be read: {}'.format(missing))
+
+        self._balances.update(dict.fromkeys(missing))
+        for balance in balances:
+            self._balances[balance.pop('id')] = balance
+
+    def balance(self, account_id):
+        self.load_balances([account_id])
+        if self._balances[account_id] is None:
+            raise PTRProcessException('No balance found for account: {}'.format(account_id))
+        return self._balances[account_id]
+
+    def log(self, log):
+        log['transaction_id'] = self._transaction_id
+        if log.get('settled'):
+            log['settled'], log['settlement_date'] = False, None
+            log['settles_with_transaction'] = True
+        self._logs.append(log)
+
+    def credit(self, account_id, money_exchange):
+        self._credits.setdefault(account_id, []).append(money_exchange)
+
+    @staticmethod
+    def amount(balance, money_exchanges):
+        """The sum of `money_exchanges` in the currency of `balance`."""
+        amount = 0
+        for money_exchange in money_exchanges:
+            if balance['currency'] == money_exchange.currency.currency_string:
+                amount += money_exchange.amount
+            else:
+                amount += money_exchange.currency.convert_to(balance['currency'])
+        return amount
+
+    def commit(self):
+        self.load_balances(self._credits.keys())
+        for account_id in self._credits:
+            self.balance(account_id)
+
+        try:
+            self._acc_db.bulk_write(self.logs_collection, inserts=self._logs)
+        except DatabaseSaveError as exc:
+            raise PTRProcessException('Logs of transaction {} could not be written.'.format(self._transaction_id))
+
+        self._apply_credits()
+
+        try:
+            self._acc_db.update_fields(self.logs_collection,
+                                       {'transaction_id': self._transaction_id, 'settles_with_transaction': True},
+                                       {'settled': True, 'settlement_date': date_now_formatted()}, multiple=True)
+        except DatabaseSaveError as exc:
+            # The credits are applied, failing here would get the transaction retried and credited twice.
+            logging.error('Balances of transaction {} were updated but its logs could not be settled.'.format(
+                self._transaction_id))
+
+        self._logs, self._credits = [], {}
+
+    def _apply_credits(self):
+        pending = dict(self._credits)
+        for attempt in range(self.max_retries + 1):
+            currencies = dict((account_id, self.balance(account_id)['currency']) for account_id in pending)
+            increments = [({'id': account_id, 'currency': currencies[account_id]},
+                           {'balance': self.amount(self.balance(account_id), money_exchanges), 'version': 1})
+                          for account_id, money_exchanges in pending.items()]
+            try:
+                matched = self._acc_db.bulk_write(self.balances_collection, increments=increments, ordered=False)
+            except DatabaseSaveError as exc:
+                break
+            if matched == len(increments):
+                return
+
+            # An increment only misses when the currency of its balance changed since it was read, so the missed
+            # ones are those whose currency differs now. They are retried with their amounts converted again.
+            self.load_balances(pending.keys(), reload=True)
+            changed = dict((account_id, money_exchanges) for account_id, money_exchanges in pending.items()
+                           if self.balance(account_id)['currency'] != currencies[account_id])
+            if len(changed) != len(increments) - matched:
+                # Some misses are not explained by a change of currency, so which credits were applied is unknown.
+                logging.error('Transaction {} missed {} balances of which {} changed currency: {}'.format(
+                    self._transaction_id, len(increments) - matched, len(changed), changed.keys()))
+                break
+            pending = changed
+            logging.debug('Currencies of {} changed, retrying transaction {}.'.format(pending.keys(),
+                                                                                      self._transaction_id))
+
+        logging.error('Balances of transaction {} were not all updated, its logs are left unsettled.'.format(
+            self._transaction_id))
+        raise PTRProcessException('Balances of transaction {} could not be updated.'.format(self._transaction_id))
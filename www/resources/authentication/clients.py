@@ -0,0 +1,87 @@
+__author__ = 'Mepla'
+
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import namedtuple
+
+
+Client = namedtuple('Client', ['client_id', 'client_secret', 'scopes'])
+
+
+class ClientRegistry(object):
+    """In memory index of the registered OAuth2 clients, keyed by client_id with their scopes parsed to frozensets.
+
+    Client records are loaded through `load_clients` and reloaded every `reload_interval` seconds; the index is only
+    rebuilt when the records changed. A lookup of an unknown client_id triggers an early reload so newly registered
+    clients are picked up right away, but at most once per `miss_reload_interval` seconds so unknown ids can not make
+    every request hit the database. `invalidate` forces a reload on the next lookup, for use after clients are
+    changed. When a reload fails the loaded clients are kept.
+    """
+
+    def __init__(self, load_clients, reload_interval=60, miss_reload_interval=5):
+        self._load_clients = load_clients
+        self._reload_interval = reload_interval
+        self._miss_reload_interval = miss_reload_interval
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self._clients = None
+        self._loaded_at = 0
+        self._reloads = 0
+        self._rebuilds = 0
+
+    def get(self, client_id):
+        """Returns the `Client` of `client_id` or `None` when there is no such client."""
+        clients = self._get_clients(self._reload_interval)
+        client = clients.get(client_id)
+        if client is None:
+            client = self._get_clients(self._miss_reload_interval).get(client_id)
+        return client
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = 0
+
+    def stats(self):
+        with self._lock:
+            return {'clients': len(self._clients) if self._clients is not None else 0,
+                    'loaded_at': self._loaded_at,
+                    'reloads': self._reloads,
+                    'rebuilds': self._rebuilds}
+
+    def _get_clients(self, max_age):
+        if self._clients is not None and time.time() - self._loaded_at < max_age:
+            return self._clients
+
+        with self._lock:
+            if self._clients is not None and time.time() - self._loaded_at < max_age:
+                return self._clients
+
+            try:
+                docs = self._load_clients()
+            except Exception as exc:
+                if self._clients is None:
+                    raise
+                logging.error('Could not reload clients, keeping the loaded ones: {}'.format(exc))
+                self._loaded_at = time.time()
+                return self._clients
+
+            self._reloads += 1
+            records = sorted([doc.get('client_id'), doc.get('client_secret'), doc.get('scope') or ''] for doc in docs)
+            fingerprint = hashlib.sha1(json.dumps(records)).hexdigest()
+            if fingerprint != self._fingerprint:
+                self._clients = self.index_clients(records)
+                self._fingerprint = fingerprint
+                self._rebuilds += 1
+                logging.info('Client registry rebuilt with {} clients.'.format(len(self._clients)))
+
+            self._loaded_at = time.time()
+            return self._clients
+
+    @staticmethod
+    def index_clients(records):
+        """Indexes `[client_id, client_secret, scope string]` records to `{client_id: Client}`."""
+        return dict((client_id, Client(client_id, client_secret, frozenset(scope.split())))
+                    for client_id, client_secret, scope in records)
@@ -0,0 +1,78 @@
+__author__ = 'Mepla'
+
+import logging
+
+import pymongo
+
+from www.resources.databases.factories import DatabaseFactory
+from www.resources.databases.database_drivers import DatabaseRecordNotFound
+
+
+class CredentialStore(object):
+    """Compact copy of the login credentials of users (email, uid and password hash) in the auth database.
+
+    The user nodes in the graph stay the source of truth; entries here are written on sign-up and whenever a password
+    is rehashed, so a login only needs one indexed read in the auth store. An email without an entry is looked up in
+    the graph and its entry rebuilt, unless `graph_fallback` is off, which is safe once `rebuild` has run.
+    """
+
+    collection = 'credentials'
+    indexes = [([('email', pymongo.ASCENDING)], {'unique': True}),
+               ([('uid', pymongo.ASCENDING)], {'unique': True})]
+
+    def __init__(self, auth_db=None, graph_db=None, graph_fallback=True):
+        database_factory = DatabaseFactory()
+        self._auth_db = auth_db or database_factory.get_database_driver('document/auth')
+        self._graph_db = graph_db or database_factory.get_database_driver('graph')
+        self._graph_fallback = graph_fallback
+
+    @staticmethod
+    def create_entry(uid, email, password):
+        return {'uid': uid, 'email': email, 'password': password}
+
+    def find(self, email):
+        """Returns the entry of `email`, raises `DatabaseRecordNotFound` when there is no such user."""
+        try:
+            return self._auth_db.find_doc('email', email, self.collection)
+        except DatabaseRecordNotFound:
+            if not self._graph_fallback:
+                raise
+
+        user = self._graph_db.find_single_user('email', email)
+        logging.info('Rebuilding credentials entry from graph: uid: {}'.format(user.get('uid')))
+        entry = self.create_entry(user.get('uid'), user.get('email'), user.get('password'))
+        self.save(entry)
+        return entry
+
+    def save(self, entry):
+        self._auth_db.replace(self.collection, {'uid': entry['uid']}, dict(entry), upsert=True)
+
+    def update_password(self, uid, email, password):
+        """Saves a new password hash on the user node and its entry."""
+        self._graph_db.update({'uid': uid, 'password': password})
+        self.save(self.create_entry(uid, email, password))
+
+    def rebuild(self, batch_size=100):
+        """Writes the entries of all users in the graph, returns how many were written."""
+        rebuilt = 0
+        after_uid = None
+        while True:
+            users = self._graph_db.find_user_credentials(after_uid, batch_size)
+            if not users:
+                break
+
+            for user in users:
+                if not user.get('email') or not user.get('password'):
+                    logging.warning('User without credentials skipped: uid: {}'.format(user.get('uid')))
+                    continue
+                self.save(self.create_entry(user['uid'], user['email'], user['password']))
+                rebuilt += 1
+
+            after_uid = users[-1]['uid']
+            logging.info('Rebuilt credentials of {} users.'.format(rebuilt))
+
+        return rebuilt
+
+    def ensure_indexes(self):
+        for keys, options in self.indexes:
+            self._auth_db.create_index(self.collection, keys, **options)
@@ -2,14 +2,20 @@ __author__ = 'Mepla'
 
 import time
 import logging
+import threading
+from datetime import datetime
 from functools import wraps
-import re
 
 from flask import request
 
-from www.resources.utilities.helpers import uuid_with_prefix
+from www.resources.config import configs
+from www.resources.utilities.helpers import uuid_with_prefix, filter_general_document_db_record
+from www.resources.utilities.caching import LRUCache
+from www.resources.authentication.scopes import ScopeMatcher
+from www.resources.authentication.clients import ClientRegistry
+from www.resources.authentication.signed_tokens import SignedTokenCodec, RevocationList, InvalidSignedToken
 from www.resources.databases.factories import DatabaseFactory
-from www.resources.databases.database_drivers import DatabaseFindError
+from www.resources.databases.database_drivers import DatabaseFindError, DatabaseRecordNotFound, DatabaseEmptyResult
 
 max_ttl = 604800
 
@@ -26,59 +32,203 @@ class ClientWithWrongScopes(Exception):
 class AccessToResourceDenied(Exception):
     pass
 
-class OAuth2Provider(object):
-    def __init__(self):
-        self.auth_db = DatabaseFactory().get_database_driver('document/auth')
-
-    def client_id_check(self, client_id, client_secret, scope):
-        try:
-            existing_client = self.auth_db.find_doc('client_id', client_id, 'clients')
-            if not existing_client.get('client_secret') == client_secret:
-                raise ClientNotAuthorized()
+class AccessTokenNotValid(Exception):
+    pass
 
-            scopes = set(scope.split(' '))
-            existing_client_scopes = set(existing_client.get('scope').split(' '))
+class RefreshTokenNotValid(Exception):
+    pass
 
-            if not scopes.issubset(existing_client_scopes):
-                raise ClientWithWrongScopes()
+class SigningKeyMissing(Exception):
+    pass
 
+class OAuth2Provider(object):
+    def __init__(self, auth_db=None):
+        self.auth_db = auth_db or DatabaseFactory().get_database_driver('document/auth')
+
+        token_cache_configs = configs.get('AUTH').get('token_cache')
+        self._token_cache_ttl = token_cache_configs.get('ttl')
+        self._token_cache = LRUCache(max_size=token_cache_configs.get('max_size'), ttl=self._token_cache_ttl)
+        self._scope_matcher = ScopeMatcher(self._load_scopes, configs.get('AUTH').get('scopes_reload_interval'))
+
+        client_registry_configs = configs.get('AUTH').get('client_registry')
+        self._client_registry = ClientRegistry(self._load_clients, client_registry_configs.get('reload_interval'),
+                                               client_registry_configs.get('miss_reload_interval'))
+
+        # Signed tokens are only issued and accepted in signed mode, which needs a secret key from the config file.
+        self._token_mode = configs.get('AUTH').get('token_mode')
+        self._signed_token_codec = None
+        if self._token_mode == 'signed':
+            signing_key = configs.get('AUTH').get('signing_key')
+            if not signing_key:
+                raise SigningKeyMissing('AUTH.signing_key must be set to a secret key when token_mode is signed.')
+            self._signed_token_codec = SignedTokenCodec(signing_key)
+        self._revocation_list = RevocationList(self.auth_db, configs.get('AUTH').get('revocation_refresh_interval'))
+
+        self._refresh_token_ttl = configs.get('AUTH').get('refresh_token_ttl')
+        self._last_compaction = None
+        self._token_stats_ttl = configs.get('AUTH').get('token_stats_ttl')
+        self._token_stats = None
+        self._token_stats_at = 0
+        self._token_stats_lock = threading.Lock()
+
+    def client_id_check(self, client_id, client_secret, scope=None):
+        """Checks the credentials of a client and, when `scope` is given, that the client may request it."""
+        try:
+            existing_client = self._client_registry.get(client_id)
         except DatabaseFindError as exc:
             raise ClientDoesNotExist()
 
+        if existing_client is None:
+            raise ClientDoesNotExist()
+
+        if not existing_client.client_secret == client_secret:
+            raise ClientNotAuthorized()
+
+        if scope is None:
+            return
+
+        scopes = frozenset(scope.split())
+        if not scopes or not scopes.issubset(existing_client.scopes):
+            raise ClientWithWrongScopes()
+
     def generate_access_token(self, uid, client_id, scope, ttl=max_ttl):
-        access_token = uuid_with_prefix('at')
         refresh_token = uuid_with_prefix('rt')
 
         try:
-            existing_client = self.auth_db.find_doc('client_id', client_id, 'clients')
+            existing_client = self._client_registry.get(client_id)
         except DatabaseFindError as exc:
             raise ClientDoesNotExist()
 
-        doc = {'access_token': access_token, 'refresh_token': refresh_token, 'expires_in': ttl, 'token_type': 'Bearer',
-               'scope': scope, 'uid': uid, 'client_id': client_id, 'issue_date': time.time()}
+        if existing_client is None:
+            raise ClientDoesNotExist()
+
+        issue_date = time.time()
+        # The doc lives as long as its refresh token, the TTL index on `expires_at` removes it afterwards.
+        expires_at = datetime.utcfromtimestamp(issue_date + max(ttl, self._refresh_token_ttl))
+        doc = {'refresh_token': refresh_token, 'expires_in': ttl, 'token_type': 'Bearer', 'expires_at': expires_at,
+               'scope': scope, 'uid': uid, 'client_id': client_id, 'issue_date': issue_date}
+
+        if self._token_mode == 'signed':
+            access_token, claims = self._signed_token_codec.encode(uid, client_id, scope, ttl, doc['issue_date'])
+            doc['jti'] = claims['jti']
+        else:
+            access_token = uuid_with_prefix('at')
+            doc['access_token'] = access_token
+
         self.auth_db.save(doc, 'tokens')
 
         return {'access_token': access_token, 'refresh_token': refresh_token, 'expires_in': ttl, 'token_type': 'Bearer', 'scope': scope}
 
-    def refresh_access_token(self, refresh_token):
+    def refresh_access_token(self, refresh_token, client_id):
+        """Exchanges `refresh_token` for a new token pair. Refresh tokens are single use: the token doc is removed
+        atomically, so of two concurrent refreshes only one succeeds, and the access token issued with it stops
+        working. Caches of other processes may accept that access token until their cached copy expires.
+
+        Raises `RefreshTokenNotValid` when the token does not exist, was already used, belongs to another client or
+        is expired.
+        """
         try:
-            doc = self.auth_db.find_doc('refresh_token', refresh_token, 'tokens')
-        except DatabaseFindError as exc:
-            msg = {'message': 'You refresh token does not exit.'}
-            logging.error(msg)
-            return msg, 400
+            doc = self.auth_db.find_and_delete('tokens', {'refresh_token': refresh_token, 'client_id': client_id})
+        except DatabaseRecordNotFound as exc:
+            raise RefreshTokenNotValid('Refresh token does not exist or was already used.')
+
+        if doc.get('access_token'):
+            self.invalidate_access_token(doc.get('access_token'))
+        elif doc.get('jti') and time.time() < doc.get('issue_date') + doc.get('expires_in'):
+            self._revocation_list.revoke(doc.get('jti'), doc.get('issue_date') + doc.get('expires_in'))
 
-        if doc:
-            uid = doc.get('uid')
-            c_id = doc.get('client_id')
-            scope = doc.get('scope')
-            ttl = doc.get('expires_in')
-            return self.generate_access_token(uid, c_id, scope, ttl)
+        if time.time() > doc.get('issue_date') + max(doc.get('expires_in'), self._refresh_token_ttl):
+            raise RefreshTokenNotValid('Refresh token is expired.')
 
+        return self.generate_access_token(doc.get('uid'), client_id, doc.get('scope'), doc.get('expires_in'))
+
+    def find_access_token(self, access_token):
+        """Returns the token doc of `access_token`, from the token cache when it was validated recently.
+
+        Token docs are cached for at most the configured ttl and never beyond their own expiry. In signed mode signed
+        tokens are verified and their claims returned as token doc without any database access, otherwise they are
+        looked up like any other token and do not exist. Raises `DatabaseRecordNotFound` when the token does not
+        exist and `AccessTokenNotValid` when a signed token is forged or revoked.
+        """
+        if self._signed_token_codec and SignedTokenCodec.is_signed(access_token):
+            try:
+                claims = self._signed_token_codec.decode(access_token)
+            except InvalidSignedToken as exc:
+                raise AccessTokenNotValid(exc.message)
+
+            if self._revocation_list.is_revoked(claims.get('jti')):
+                raise AccessTokenNotValid('Access token is revoked.')
+            return claims
+
+        token_doc = self._token_cache.get(access_token)
+        if token_doc is None:
+            token_doc = filter_general_document_db_record(self.auth_db.find_doc('access_token', access_token, 'tokens'))
+            remaining_ttl = token_doc.get('issue_date') + token_doc.get('expires_in') - time.time()
+            if remaining_ttl > 0:
+                self._token_cache.set(access_token, token_doc, ttl=min(remaining_ttl, self._token_cache_ttl))
+        return token_doc
+
+    def invalidate_access_token(self, access_token):
+        """Drops `access_token` from the token cache of this process, the next check reads it from the database."""
+        self._token_cache.invalidate(access_token)
+
+    def revoke_access_token(self, access_token):
+        if self._signed_token_codec and SignedTokenCodec.is_signed(access_token):
+            claims = self._signed_token_codec.decode(access_token)
+            self._revocation_list.revoke(claims['jti'], claims['issue_date'] + claims['expires_in'])
         else:
-            msg = {'message': 'You refresh token does not exit.'}
-            logging.error(msg)
-            return msg, 400
+            self.auth_db.delete('tokens', {'access_token': access_token})
+            self.invalidate_access_token(access_token)
+
+    def token_cache_stats(self):
+        return self._token_cache.stats()
+
+    def compact_tokens(self):
+        """Deletes token docs whose refresh token expired and revocations of expired signed tokens.
+
+        The TTL index removes expired token docs on its own, this also covers docs issued before tokens had an
+        `expires_at` and the revocation list, and keeps working when the TTL monitor lags behind.
+        """
+        now = time.time()
+        result = {'tokens': self.auth_db.delete('tokens', {'expires_at': {'$lt': datetime.utcfromtimestamp(now)}},
+                                                multiple=True),
+                  'legacy_tokens': self.auth_db.delete('tokens', {'expires_at': {'$exists': False},
+                                                                  'issue_date': {'$lt': now - self._refresh_token_ttl}},
+                                                       multiple=True),
+                  'revoked_tokens': self.auth_db.delete('revoked_tokens', {'expires_at': {'$lt': now}}, multiple=True),
+                  'duration': time.time() - now,
+                  'finished_at': time.time()}
+
+        self._last_compaction = result
+        logging.info('Token store compacted: {}'.format(result))
+        return result
+
+    def token_stats(self):
+        """Counts of token docs: `live` ones can still be refreshed, `expired` ones wait for the TTL monitor or the
+        compaction and `legacy` ones were issued without `expires_at`.
+
+        The counts are cached for `token_stats_ttl` seconds and recounted by one caller at a time, so requests to
+        /status can not make the token store count its docs more often than that.
+        """
+        with self._token_stats_lock:
+            if self._token_stats is None or time.time() - self._token_stats_at > self._token_stats_ttl:
+                now = datetime.utcnow()
+                self._token_stats = {'live': self.auth_db.count('tokens', {'expires_at': {'$gt': now}}),
+                                     'expired': self.auth_db.count('tokens', {'expires_at': {'$lte': now}}),
+                                     'legacy': self.auth_db.count('tokens', {'expires_at': {'$exists': False}}),
+                                     'revoked': self.auth_db.count('revoked_tokens')}
+                self._token_stats_at = time.time()
+            stats = dict(self._token_stats, counted_at=self._token_stats_at)
+
+        stats['last_compaction'] = self._last_compaction
+        return stats
+
+    def invalidate_clients(self):
+        """Makes the next client lookup reload the client registry, call it after clients are added or changed."""
+        self._client_registry.invalidate()
+
+    def client_registry_stats(self):
+        return self._client_registry.stats()
 
     def check_access_token(self, f):
         @wraps(f)
@@ -103,21 +253,30 @@ class OAuth2Provider(object):
 
             logging.debug('Authorizing resource owner with access token: {}'.format(token_type + ' ' + token))
 
-            token_doc = self.auth_db.find_doc('access_token', token, 'tokens')
-            if token_doc:
-                if not client_id == token_doc.get('client_id'):
-                    msg = {'message': 'Your client_id does not match with your access token.'}
-                    logging.error(msg)
-                    return msg, 401
-
-                if time.time() - token_doc.get('issue_date') > token_doc.get('expires_in'):
-                    msg = {'message': 'Your access token is expired, please refresh it using your refresh token.'}
-                    logging.error(msg)
-                    return msg, 401
-            else:
+            try:
+                token_doc = self.find_access_token(token)
+            except DatabaseRecordNotFound as exc:
                 msg = {'message': 'Your access token does not exist.'}
                 logging.error(msg)
                 return msg, 401
+            except AccessTokenNotValid as exc:
+                msg = {'message': 'Your access token is not valid.'}
+                logging.error('{} {}'.format(msg, exc.message))
+                return msg, 401
+            except DatabaseFindError as exc:
+                msg = {'message': 'Internal server error.'}
+                logging.error('Could not read access token from database.')
+                return msg, 500
+
+            if not client_id == token_doc.get('client_id'):
+                msg = {'message': 'Your client_id does not match with your access token.'}
+                logging.error(msg)
+                return msg, 401
+
+            if time.time() - token_doc.get('issue_date') > token_doc.get('expires_in'):
+                msg = {'message': 'Your access token is expired, please refresh it using your refresh token.'}
+                logging.error(msg)
+                return msg, 401
 
             logging.info('Resource owner authenticated successfully. client_id: {}  uid: {}'.format(token_doc.get('client_id'), token_doc.get('uid')))
 
@@ -142,25 +301,24 @@ class OAuth2Provider(object):
 
         return wrapper
 
-    def check_allowed_scopes(self, method_uri, scope, uid):
-        logging.debug('Checking scope authorization for request: {}'.format(method_uri))
-
-        scope_doc = self.auth_db.find_doc('doc', 'all_scopes', 'scopes')
+    def _load_clients(self):
+        try:
+            return self.auth_db.find_doc(None, None, 'clients', limit=0)
+        except DatabaseEmptyResult:
+            return []
 
-        if not scope_doc:
+    def _load_scopes(self):
+        try:
+            scope_doc = self.auth_db.find_doc('doc', 'all_scopes', 'scopes')
+        except DatabaseRecordNotFound:
             raise DatabaseFindError
 
-        all_scopes = scope_doc['scopes'][scope]
-        regex_list = []
-        for i in range(0, len(all_scopes)):
-            reg_scope = all_scopes[i].replace('{self}', uid)
-            regex_list.append(reg_scope)
-
-        regex = '|'.join(regex_list)
+        return scope_doc['scopes']
 
-        result = re.match(regex, method_uri)
+    def check_allowed_scopes(self, method_uri, scope, uid):
+        logging.debug('Checking scope authorization for request: {}'.format(method_uri))
 
-        if not result:
+        if not self._scope_matcher.is_allowed(scope, method_uri, uid):
             raise AccessToResourceDenied()
 
         logging.debug('User ({}) is authorized to request resource ({})'.format(uid, method_uri))
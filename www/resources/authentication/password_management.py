@@ -1,9 +1,12 @@
 __author__ = 'Mepla'
 
+import os
 import hmac
 import hashlib
 import logging
 
+from www.resources.utilities.workers import BoundedExecutor
+
 
 class PasswordManager(object):
     @staticmethod
@@ -23,3 +26,86 @@ class PasswordManager(object):
 
         ghp = PasswordManager.hash_password(gp, u, e)
         return ghp == ahp
+
+
+class PasswordHasher(object):
+    """Versioned password hashing, done on a bounded executor so hashing never runs in the request thread.
+
+    Hashes of version v1 are the bare hex digests of `PasswordManager`. Later versions are stored as
+    `$<version>$<iterations>$<salt>$<digest>` and hashed with PBKDF2 using the algorithm and salt size configured for
+    that version; the iteration count is part of the hash so it can be raised in the configs without breaking
+    existing hashes. Never change the algorithm of an existing version, add a new version instead. A password that
+    verifies against a hash of another version or iteration count than the current one is rehashed on the spot so
+    the caller can save the new hash.
+
+    `ExecutorOverloaded` and `ExecutorTimeout` of the executor are passed on to the caller.
+    """
+
+    legacy_version = 'v1'
+
+    def __init__(self, executor, versions, current_version):
+        assert current_version in versions, 'current_version must be one of the configured versions.'
+        self._executor = executor
+        self._versions = versions
+        self._current_version = current_version
+
+    def hash_password(self, p, u, e):
+        if not p or not u or not e:
+            logging.error('Can not hash password without 3 arguments.')
+            return None
+
+        return self._executor.run(self._hash, p, u, e, self._current_version)
+
+    def verify_password(self, gp, ahp, u, e):
+        """Returns `(matches, new_hash)`, `new_hash` is not `None` when the password matched an outdated hash."""
+        if not gp or not u or not e or not ahp:
+            logging.error('Can not compare passwords without 4 arguments.')
+            return False, None
+
+        return self._executor.run(self._verify, gp, ahp, u, e)
+
+    def stats(self):
+        return self._executor.stats()
+
+    def _hash(self, p, u, e, version, iterations=None, salt=None):
+        if version == self.legacy_version:
+            return PasswordManager.hash_password(p, u, e)
+
+        version_configs = self._versions[version]
+        iterations = iterations or version_configs.get('iterations')
+        salt = salt or os.urandom(version_configs.get('salt_bytes')).encode('hex')
+        digest = hashlib.pbkdf2_hmac(str(version_configs.get('algorithm')), p.encode('utf-8'), str(salt), iterations)
+        return '${}${}${}${}'.format(version, iterations, salt, digest.encode('hex'))
+
+    @classmethod
+    def _parse(cls, hashed_password):
+        if not hashed_password.startswith('$'):
+            return cls.legacy_version, None, None
+        version, iterations, salt, digest = hashed_password[1:].split('$')
+        return version, int(iterations), salt
+
+    def _verify(self, gp, ahp, u, e):
+        try:
+            version, iterations, salt = self._parse(ahp)
+        except ValueError:
+            logging.error('Can not compare passwords with a malformed hash.')
+            return False, None
+
+        if version != self.legacy_version and version not in self._versions:
+            logging.error('Can not compare passwords with a hash of unknown version: {}'.format(version))
+            return False, None
+
+        if not hmac.compare_digest(str(self._hash(gp, u, e, version, iterations, salt)), str(ahp)):
+            return False, None
+
+        current_iterations = self._versions[self._current_version].get('iterations')
+        if version == self._current_version and iterations == current_iterations:
+            return True, None
+
+        return True, self._hash(gp, u, e, self._current_version)
+
+    @classmethod
+    def from_configs(cls, hashing_configs):
+        executor = BoundedExecutor('password-hashing', hashing_configs.get('workers'),
+                                   hashing_configs.get('max_queue_size'), hashing_configs.get('timeout'))
+        return cls(executor, hashing_configs.get('versions'), hashing_configs.get('current_version'))
@@ -0,0 +1,103 @@
+__author__ = 'Mepla'
+
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+
+
+class ScopeMatcher(object):
+    """Matches `method path` strings against the compiled route patterns of scopes.
+
+    Scope definitions map a scope name to a list of route regexes like `get /users/{self}/checkins`. They are loaded
+    through `load_scopes` and compiled once; `{self}` becomes a named group that is compared with the uid of the
+    request after matching, so the compiled patterns are shared by all users. Patterns are bucketed by their HTTP
+    method so a request is only tried against the routes of its method.
+
+    Definitions are reloaded every `reload_interval` seconds and only recompiled when their content changed. When a
+    reload fails the previous definitions are kept.
+    """
+
+    method_pattern = re.compile(r'^([a-z]+) ')
+    self_placeholder = '{self}'
+
+    def __init__(self, load_scopes, reload_interval=60):
+        self._load_scopes = load_scopes
+        self._reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._fingerprint = None
+        self._compiled_scopes = None
+        self._checked_at = 0
+
+    def is_allowed(self, scope, method_uri, uid):
+        compiled_scopes = self._get_compiled_scopes()
+        method = method_uri.split(' ', 1)[0]
+
+        for single_scope in scope.split():
+            routes = compiled_scopes.get(single_scope)
+            if not routes:
+                continue
+
+            for pattern in routes.get(method, []) + routes.get(None, []):
+                match = pattern.match(method_uri)
+                if match and self._is_self(match, uid):
+                    return True
+
+        return False
+
+    @staticmethod
+    def _is_self(match, uid):
+        for name, value in match.groupdict().items():
+            if name.startswith('self') and value is not None and value != uid.lower():
+                return False
+        return True
+
+    def _get_compiled_scopes(self):
+        if self._compiled_scopes is not None and time.time() - self._checked_at < self._reload_interval:
+            return self._compiled_scopes
+
+        with self._lock:
+            if self._compiled_scopes is not None and time.time() - self._checked_at < self._reload_interval:
+                return self._compiled_scopes
+
+            try:
+                scopes = self._load_scopes()
+            except Exception as exc:
+                if self._compiled_scopes is None:
+                    raise
+                logging.error('Could not reload scope definitions, keeping the loaded ones: {}'.format(exc))
+                self._checked_at = time.time()
+                return self._compiled_scopes
+
+            fingerprint = hashlib.sha1(json.dumps(scopes, sort_keys=True)).hexdigest()
+            if fingerprint != self._fingerprint:
+                self._compiled_scopes = self.compile_scopes(scopes)
+                self._fingerprint = fingerprint
+                logging.info('Scope definitions compiled: {}'.format(fingerprint))
+
+            self._checked_at = time.time()
+            return self._compiled_scopes
+
+    @classmethod
+    def compile_scopes(cls, scopes):
+        """Compiles `{scope: [route regex]}` to `{scope: {method or None: [compiled pattern]}}`."""
+        compiled_scopes = {}
+        for scope, routes in scopes.items():
+            compiled_routes = {}
+            for route in routes:
+                method_match = cls.method_pattern.match(route)
+                # Routes that are alternations themselves may cover several methods.
+                method = method_match.group(1) if method_match and '|' not in route else None
+                compiled_routes.setdefault(method, []).append(cls.compile_route(route))
+            compiled_scopes[scope] = compiled_routes
+        return compiled_scopes
+
+    @classmethod
+    def compile_route(cls, route):
+        parts = route.split(cls.self_placeholder)
+        regex = parts[0]
+        for index, part in enumerate(parts[1:]):
+            regex += '(?P<self{}>[^/]+)'.format(index) + part
+        return re.compile(regex)
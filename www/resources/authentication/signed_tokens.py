@@ -0,0 +1,113 @@
+__author__ = 'Mepla'
+
+import hmac
+import json
+import time
+import base64
+import hashlib
+import logging
+import threading
+
+from www.resources.utilities.helpers import uuid_with_prefix
+from www.resources.databases.database_drivers import DatabaseEmptyResult, DatabaseFindError
+
+
+class InvalidSignedToken(Exception):
+    pass
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip('=')
+
+
+def _b64decode(data):
+    data = str(data)
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+class SignedTokenCodec(object):
+    """Self contained access tokens signed with HMAC-SHA256.
+
+    A token is `st.<payload>.<signature>` where the payload carries the uid, client_id, scope, issue date, ttl and a
+    unique token id (`jti`) used for revocation. Checking one needs no database access. The `st.` prefix tells them
+    apart from opaque `at...` tokens so both kinds can be accepted at the same time.
+    """
+
+    prefix = 'st.'
+
+    def __init__(self, signing_key):
+        assert signing_key, 'A signing key is needed for signed access tokens.'
+        self._signing_key = str(signing_key)
+
+    @classmethod
+    def is_signed(cls, token):
+        return token.startswith(cls.prefix)
+
+    def _sign(self, signed_part):
+        return _b64encode(hmac.new(self._signing_key, signed_part, hashlib.sha256).digest())
+
+    def encode(self, uid, client_id, scope, ttl, issue_date=None):
+        claims = {'jti': uuid_with_prefix('jti'), 'uid': uid, 'client_id': client_id, 'scope': scope,
+                  'issue_date': issue_date or time.time(), 'expires_in': ttl}
+        signed_part = self.prefix + _b64encode(json.dumps(claims, separators=(',', ':')))
+        return signed_part + '.' + self._sign(signed_part), claims
+
+    def decode(self, token):
+        """Returns the claims of `token`, raises `InvalidSignedToken` when it is malformed or its signature is wrong.
+        Expiry is left to the caller, like for opaque tokens."""
+        try:
+            signed_part, signature = str(token).rsplit('.', 1)
+        except Exception as exc:
+            raise InvalidSignedToken('Malformed signed token.')
+
+        if not signed_part.startswith(self.prefix) or not hmac.compare_digest(self._sign(signed_part), signature):
+            raise InvalidSignedToken('Signature of signed token does not match.')
+
+        try:
+            return json.loads(_b64decode(signed_part[len(self.prefix):]))
+        except Exception as exc:
+            raise InvalidSignedToken('Malformed signed token payload.')
+
+
+class RevocationList(object):
+    """The ids of revoked signed tokens that have not expired yet.
+
+    Revocations are saved in the `revoked_tokens` collection and mirrored in memory. The in-memory copy is
+    refreshed from the database every `refresh_interval` seconds so revocations made by other processes are picked
+    up. Only revocations of tokens that have not expired yet are loaded, which keeps the list small.
+    """
+
+    collection = 'revoked_tokens'
+
+    def __init__(self, doc_db, refresh_interval=30):
+        self._doc_db = doc_db
+        self._refresh_interval = refresh_interval
+        self._lock = threading.Lock()
+        self._revoked = {}
+        self._refreshed_at = 0
+
+    def revoke(self, jti, expires_at):
+        self._doc_db.save({'jti': jti, 'expires_at': expires_at}, self.collection)
+        with self._lock:
+            self._revoked[jti] = expires_at
+
+    def is_revoked(self, jti):
+        if time.time() - self._refreshed_at > self._refresh_interval:
+            self.refresh()
+        return jti in self._revoked
+
+    def refresh(self):
+        now = time.time()
+        try:
+            docs = self._doc_db.find_doc(None, None, self.collection, limit=0, conditions={'expires_at': {'$gt': now}})
+        except DatabaseEmptyResult:
+            docs = []
+        except DatabaseFindError:
+            logging.error('Could not refresh revoked tokens, keeping the known ones.')
+            with self._lock:
+                self._refreshed_at = now
+            return
+
+        with self._lock:
+            self._revoked = dict((doc['jti'], doc['expires_at']) for doc in docs)
+            self._refreshed_at = now
@@ -1,19 +1,26 @@
-import datetime
-
 __author__ = 'Mepla'
 
 import logging
 
-from flask_restful import Resource
+from flask_restful import Resource, inputs
+from flask_restful.reqparse import RequestParser
 from flask import request
 
 from www.resources.databases.factories import DatabaseFactory
-from www.resources.json_schemas import validate_json, JsonValidationException, create_promotion_schema
+from www.resources.json_schemas import validate_json, JsonValidationException, create_promotion_schema, \
+    audience_estimate_schema
 from www import oauth2
-from www.resources.databases.database_drivers import DatabaseRecordNotFound, DatabaseEmptyResult, DatabaseSaveError, \
-    DatabaseFindError
+from www.resources.databases.database_drivers import DatabaseRecordNotFound, DatabaseSaveError, DatabaseFindError, \
+    DocumentNotUpdated
 from www.resources.utilities.helpers import filter_general_document_db_record
 from www.resources.utilities.helpers import uuid_with_prefix
+from www.resources.promotion_eligibility import EligibilityEngine, InvalidPromotionConditions, \
+    validate_promotion_conditions, promotion_predicates
+from www.resources.databases.promotion_index import PromotionIndex
+from www.resources.databases.promotion_cache import active_promotions
+from www.resources.databases.redemptions import RedemptionStore, RedemptionLimitReached
+from www.resources.databases.audience_snapshot import audience_estimator
+from www.resources.businesses import check_business_admin
 
 
 class BusinessPromotions(Resource):
@@ -23,22 +30,18 @@ class BusinessPromotions(Resource):
 
     def get(self, bid, uid=None):
         try:
-            promotions = self.doc_db.find_doc('bid', bid, 'business_promotions', limit=100)
-
+            promotions = active_promotions.promotions(bid)
         except DatabaseFindError as exc:
             msg = {'message': 'Internal server error.'}
             logging.error('Error reading database for business_promotions.')
             return msg, 500
-        except DatabaseEmptyResult as exc:
-            msg = {'message': 'There are no promotions for this business.'}
-            logging.error(msg)
-            return msg, 204
-        except DatabaseRecordNotFound as exc:
+
+        if not promotions:
             msg = {'message': 'There are no promotions for this business.'}
             logging.error(msg)
             return msg, 204
 
-        return filter_general_document_db_record(promotions)
+        return promotions
 
     def post(self, bid, uid=None):
         try:
@@ -50,7 +53,8 @@ class BusinessPromotions(Resource):
 
         try:
             validate_json(data, create_promotion_schema)
-        except JsonValidationException as exc:
+            validate_promotion_conditions(data.get('conditions'))
+        except (JsonValidationException, InvalidPromotionConditions) as exc:
             msg = {'message': exc.message}
             logging.error(msg)
             return msg, 400
@@ -69,15 +73,24 @@ class BusinessPromotions(Resource):
 
         data['bid'] = bid
         data['pid'] = uuid_with_prefix('pid')
+        data['version'] = 1
 
         try:
             self.doc_db.save(data, 'business_promotions')
-            return filter_general_document_db_record(data), 201
+            promotion_predicates.set(data)
+            active_promotions.invalidate(bid)
         except DatabaseSaveError as exc:
             msg = {'message': 'Your promotion could not be saved. This is an internal error.'}
             logging.error(msg)
             return msg, 500
 
+        try:
+            PromotionIndex(self.doc_db).add(data)
+        except DatabaseSaveError as exc:
+            logging.error('Promotion could not be indexed, run `python -m www.migrate promotion_index`: {}'.format(data['pid']))
+
+        return filter_general_document_db_record(data), 201
+
 
 class BusinessPromotion(Resource):
     def __init__(self):
@@ -98,6 +111,9 @@ class BusinessPromotion(Resource):
 
     def delete(self, bid, pid, uid=None):
         result = self.doc_db.delete('business_promotions', {'pid': pid})
+        promotion_predicates.invalidate(pid)
+        active_promotions.invalidate(bid)
+        PromotionIndex(self.doc_db).remove(pid)
 
         if result > 0:
             return None, 204
@@ -110,161 +126,145 @@ class BusinessPromotion(Resource):
 class EligiblePromotions(Resource):
     def __init__(self):
         self.doc_db = DatabaseFactory().get_database_driver('document/docs')
+        self.eligibility_engine = EligibilityEngine()
 
     @oauth2.check_access_token
     def get(self, bid, uid=None):
-        try:
-            now_date = datetime.date.today().strftime('%Y-%m-%d')
-            conditions = {'life_span.start_date': {'$lt': now_date}, 'life_span.end_date': {'$gt': now_date}}
-            promotions = self.doc_db.find_doc('bid', bid, 'business_promotions', conditions=conditions, limit=100)
+        arg_parser = RequestParser()
+        arg_parser.add_argument('explain', type=inputs.boolean, default=False, help='`explain` argument must be a boolean.')
+        args = arg_parser.parse_args()
 
+        try:
+            promotions = active_promotions.active_promotions(bid)
         except DatabaseFindError as exc:
             msg = {'message': 'Internal server error.'}
             logging.error('Error reading database for business_promotions.')
             return msg, 500
-        except DatabaseEmptyResult as exc:
+
+        if not promotions:
             msg = {'message': 'There are no promotions for this business.'}
             logging.error(msg)
             return msg, 204
+
+        try:
+            context = self.eligibility_engine.load_context(uid)
         except DatabaseRecordNotFound as exc:
-            msg = {'message': 'There are no promotions for this business.'}
+            msg = {'message': 'User does not exist.'}
             logging.error(msg)
-            return msg, 204
+            return msg, 404
+        except DatabaseFindError as exc:
+            msg = {'message': 'Internal server error.'}
+            logging.error('Error querying graph database for eligibility of user: {}'.format(uid))
+            return msg, 500
 
-        eligible_promotions = []
+        results = self.eligibility_engine.evaluate_all(promotions, context)
 
-        for promotion in promotions:
-            try:
-                self.check_eligibility(promotion, uid)
-                eligible_promotions.append(promotion)
-            except DatabaseFindError as exc:
-                msg = {'message': 'Internal server error.'}
-                logging.info(msg)
-                logging.debug('Error querying graph database: {} -> {}'.format(exc, exc.message))
-                continue
-            except DatabaseRecordNotFound:
-                msg = {'message': 'User does not exist or does not have any checkins.'}
-                logging.debug(msg)
-                continue
-            except Exception as exc:
-                pass
+        if args.get('explain'):
+            return [{'pid': promotion.get('pid'), 'eligible': not reasons, 'reasons': reasons}
+                    for promotion, reasons in results]
 
+        eligible_promotions = [promotion for promotion, reasons in results if not reasons]
         if len(eligible_promotions) < 1:
             return None, 204
         else:
             return filter_general_document_db_record(eligible_promotions)
 
-    def check_eligibility(self, promotion, uid):
-        graph_db = DatabaseFactory().get_database_driver('graph')
-        user = graph_db.find_single_user('uid', uid)
-
-        if not user:
-            msg = {'message': 'No user with uid: {}'.format(uid)}
-            logging.critical(msg)
-            raise DatabaseRecordNotFound(msg)
-
-        try:
-            conditions = promotion.get('conditions')
-
-            # Gender check
-            gender_condition = conditions.get('gender')
-            if gender_condition:
-                if gender_condition != user.get('gender'):
-                    raise Exception('Gender condition not satisfied.')
-
-            # Age check
-            age_condition = conditions.get('age')
-            birth_date = user.get('birth_date')
-            if not birth_date:
-                raise Exception('Birth date not specified.')
-
-            user_age = get_age(birth_date)
-
-            min_age = age_condition.get('from')
-            if min_age:
-                if user_age < min_age:
-                    raise Exception('User age is lower than minimum.')
-
-            max_age = age_condition.get('to')
-            if max_age:
-                if user_age > max_age:
-                    raise Exception('User age is higher than maximum.')
-
-            # Checkins check
-            checkins_condition = conditions.get('checkins')
-            if checkins_condition:
-                checkin = graph_db.find_single_user_checkins(uid, promotion.get('bid'))
-
-                min_checkins_condition = checkins_condition.get('min')
-                if min_checkins_condition:
-                    if checkin.get('count') < min_checkins_condition:
-                        raise Exception('Minimum number of checkins not met.')
-
-                max_checkins_condition = checkins_condition.get('min')
-                if max_checkins_condition:
-                    if checkin.get('count') > max_checkins_condition:
-                        raise Exception('Maximum number of checkins exceeded.')
-
-                days_since_last_condition = checkins_condition.get('days_since_last')
-                if days_since_last_condition:
-                    last_checkin_timestamp = checkin.get('timestamps').split()[0]
-                    last_checkin_date = datetime.datetime.fromtimestamp(last_checkin_timestamp)
-                    actual_days_since_last_checkin = (datetime.datetime.today() - last_checkin_date).days
-
-                    if actual_days_since_last_checkin < days_since_last_condition:
-                        raise Exception('Number of days since last checkin is not met.')
-
-                # Follow check
-                follow_condition = checkins_condition.get('must_follow')
-                if follow_condition:
-                    is_follower = self.doc_db.is_follower(uid, promotion.get('bid'))
-                    if not is_follower:
-                        raise Exception('User must be a follower.')
-
-        except Exception as exc:
-            msg = 'Something went wrong in promotion eligibility check: {}: {}'.format(exc, exc.message)
-            logging.error(msg)
-            raise exc
-
 
 class PromotionApply(Resource):
     def __init__(self):
         self.doc_db = DatabaseFactory().get_database_driver('document/docs')
+        self.redemptions = RedemptionStore(self.doc_db)
 
+    @oauth2.check_access_token
     def post(self, bid, pid, uid=None):
-        result = BusinessPromotion().get(bid, pid, uid)
-        if not isinstance(result, dict):
-            return result
+        idempotency_key = request.headers.get('Idempotency-Key')
+
+        if idempotency_key:
+            try:
+                return self.redemptions.find_by_idempotency_key(uid, idempotency_key), 200
+            except DatabaseRecordNotFound:
+                pass
+            except DatabaseFindError as exc:
+                msg = {'message': 'Internal server error.'}
+                logging.error('Error reading redeem codes of user: {}'.format(uid))
+                return msg, 500
+
+        try:
+            promotion = next((promotion for promotion in active_promotions.active_promotions(bid)
+                              if promotion.get('pid') == pid), None)
+        except DatabaseFindError as exc:
+            msg = {'message': 'Internal server error.'}
+            logging.error('Error reading database for business_promotions.')
+            return msg, 500
+
+        if not promotion:
+            msg = {'message': 'There is no active promotion with pid ({}).'.format(pid)}
+            logging.error(msg)
+            return msg, 404
 
+        engine = EligibilityEngine()
         try:
-            EligiblePromotions().check_eligibility(result, uid)
+            reasons = engine.evaluate(promotion, engine.load_context(uid))
         except DatabaseFindError as exc:
             msg = {'message': 'Internal server error.'}
-            logging.info(msg)
-            logging.debug('Error querying graph database: {} -> {}'.format(exc, exc.message))
+            logging.error('Error querying graph database for eligibility of user: {}'.format(uid))
             return msg, 500
         except DatabaseRecordNotFound:
             msg = {'message': 'You are not eligible for this promotion.'}
             logging.debug(msg)
             return msg, 400
-        except Exception as exc:
-            msg = {'message': 'You are not eligible for this promotion.'}
+
+        if reasons:
+            msg = {'message': 'You are not eligible for this promotion.', 'reasons': reasons}
             logging.debug(msg)
             return msg, 400
-        
-        rcid = uuid_with_prefix('rcid')
-        redeem_code_doc = {'rcid': rcid, 'pid': pid, 'bid': bid, 'uid': uid}
 
         try:
-            self.doc_db.save(result, 'redeem_codes')
-            return filter_general_document_db_record(redeem_code_doc), 201
-        except DatabaseSaveError as exc:
+            redeem_code_doc, created = self.redemptions.redeem(promotion, uid, idempotency_key)
+        except RedemptionLimitReached as exc:
+            msg = {'message': exc.message}
+            logging.debug(msg)
+            return msg, 409
+        except (DatabaseSaveError, DocumentNotUpdated, DatabaseFindError, DatabaseRecordNotFound) as exc:
             msg = {'message': 'Your redeem code could not be generated. This is an internal error.'}
             logging.error(msg)
             return msg, 500
 
+        return redeem_code_doc, 201 if created else 200
+
+
+class PromotionAudience(Resource):
+    """How many users the conditions of a promotion draft would select, for the admins of the business."""
+
+    def __init__(self):
+        super(PromotionAudience, self).__init__()
+        self.graph_db = DatabaseFactory().get_database_driver('graph')
+
+    @oauth2.check_access_token
+    def post(self, bid, uid=None):
+        forbidden = check_business_admin(self.graph_db, uid, bid)
+        if forbidden:
+            return forbidden
+
+        try:
+            data = request.get_json(force=True, silent=False)
+        except Exception as exc:
+            msg = {'msg': 'Your JSON is invalid.'}
+            logging.error(msg)
+            return msg, 400
+
+        try:
+            validate_json(data, audience_estimate_schema)
+            validate_promotion_conditions(data.get('conditions'))
+        except (JsonValidationException, InvalidPromotionConditions) as exc:
+            msg = {'message': exc.message}
+            logging.error(msg)
+            return msg, 400
+
+        estimate = audience_estimator.estimate(bid, data.get('conditions'))
+        if estimate is None:
+            msg = {'message': 'Audience estimates are not available yet, please try again later.'}
+            logging.error(msg)
+            return msg, 503, {'Retry-After': '60'}
 
-def get_age(birth_date):
-        days_of_age = (datetime.datetime.today() - datetime.datetime.strptime(birth_date, '%Y-%m-%d')).days
-        user_age = float(float(days_of_age)/float(365))
-        return int(user_age)
+        return estimate
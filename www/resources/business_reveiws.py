@@ -1,7 +1,3 @@
-from flask_restful.reqparse import RequestParser
-
-from www.resources.config import configs
-
 __author__ = 'Mepla'
 
 import time
@@ -15,6 +11,7 @@ from www.resources.databases.database_drivers import DatabaseSaveError, Database
 from www.resources.databases.factories import DatabaseFactory
 from www.resources.json_schemas import validate_json, JsonValidationException, review_schema
 from www.resources.utilities.helpers import filter_general_document_db_record
+from www.resources.utilities.pagination import KeysetPaginator, InvalidPageArguments, paged_response
 from www.resources.utilities.helpers import uuid_with_prefix
 from www import oauth2
 
@@ -23,59 +20,29 @@ class BusinessReviews(Resource):
     def __init__(self):
         self.doc_db = DatabaseFactory().get_database_driver('document/docs')
         self.graph_db = DatabaseFactory().get_database_driver('graph')
+        self.paginator = KeysetPaginator(self.doc_db, 'business_reviews', 'rid')
 
     @oauth2.check_access_token
     def get(self, uid, bid):
-        parser = RequestParser()
-        parser.add_argument('limit', type=int, help='`limit` argument must be an integer.')
-        parser.add_argument('before', type=float, help='`before` argument must be a timestamp (float).')
-        parser.add_argument('after', type=float, help='`after` argument must be a timestamp (float).')
-
-        args = parser.parse_args()
-
-        before = args.get('before')
-        after = args.get('after')
+        try:
+            reviews, next_cursor = self.paginator.page_from_request(bid)
 
-        if before and after and before < after:
-            msg = {'message': '`before` argument must be greater than or equal to `after`.'}
+        except InvalidPageArguments as exc:
+            msg = {'message': exc.message}
             logging.debug(msg)
             return msg, 400
 
-        conditions = {}
-
-        if before:
-            conditions['timestamp'] = {'$lt': before}
-
-        if after:
-            if conditions.get('timestamp'):
-                conditions['timestamp']['$gt'] = after
-            else:
-                conditions['timestamp'] = {'$gt': after}
-
-        limit = args.get('limit')
-        max_limit = configs.get('DATABASES').get('mongodb').get('max_page_limit')
-        if not limit or limit > max_limit:
-            limit = max_limit
-
-        try:
-            reviews = self.doc_db.find_doc('bid', bid, 'business_reviews', limit=limit, conditions=conditions, sort_key='timestamp', sort_direction=-1)
-
         except DatabaseFindError as exc:
             msg = {'message': 'Could not retrieve requested information'}
             logging.error(msg)
             return msg, 500
 
-        except DatabaseRecordNotFound as exc:
-            msg = {'message': 'The information you requested is not found'}
-            logging.info(msg)
-            return msg, 404
-
         except DatabaseEmptyResult as exc:
             msg = {'message': 'There are no reviews.'}
             logging.info(msg)
             return msg, 204
 
-        return filter_general_document_db_record(reviews)
+        return paged_response(reviews, next_cursor)
 
     @oauth2.check_access_token
     def post(self, uid, bid):
@@ -1,7 +1,3 @@
-from flask_restful.reqparse import RequestParser
-
-from www.resources.config import configs
-
 __author__ = 'Mepla'
 
 import logging
@@ -15,7 +11,8 @@ from www.resources.json_schemas import validate_json, JsonValidationException, s
 from www import oauth2
 from www.resources.databases.database_drivers import DatabaseRecordNotFound, DatabaseEmptyResult, DatabaseSaveError, \
     DatabaseFindError
-from www.resources.utilities.helpers import filter_general_document_db_record
+from www.resources.utilities.helpers import filter_general_document_db_record, stream_json_list
+from www.resources.utilities.pagination import KeysetPaginator, InvalidPageArguments, paged_response
 from www.resources.utilities.helpers import uuid_with_prefix
 
 
@@ -23,6 +20,7 @@ class BusinessSurveyResults(Resource):
     def __init__(self):
         self.doc_db = DatabaseFactory().get_database_driver('document/docs')
         self.graph_db = DatabaseFactory().get_database_driver('graph')
+        self.paginator = KeysetPaginator(self.doc_db, 'business_survey_results', 'srid')
 
     @oauth2.check_access_token
     def post(self, uid, bid):
@@ -66,54 +64,23 @@ class BusinessSurveyResults(Resource):
             return msg, 500
 
     def get(self, bid):
-        parser = RequestParser()
-        parser.add_argument('limit', type=int, help='`limit` argument must be an integer.')
-        parser.add_argument('before', type=float, help='`before` argument must be a timestamp (float).')
-        parser.add_argument('after', type=float, help='`after` argument must be a timestamp (float).')
-
-        args = parser.parse_args()
-
-        before = args.get('before')
-        after = args.get('after')
+        try:
+            surveys, next_cursor = self.paginator.page_from_request(bid)
 
-        if before and after and before < after:
-            msg = {'message': '`before` argument must be greater than or equal to `after`.'}
+        except InvalidPageArguments as exc:
+            msg = {'message': exc.message}
             logging.debug(msg)
             return msg, 400
-
-        conditions = {}
-
-        if before:
-            conditions['timestamp'] = {'$lt': before}
-
-        if after:
-            if conditions.get('timestamp'):
-                conditions['timestamp']['$gt'] = after
-            else:
-                conditions['timestamp'] = {'$gt': after}
-
-        limit = args.get('limit')
-        max_limit = configs.get('DATABASES').get('mongodb').get('max_page_limit')
-        if not limit or limit > max_limit:
-            limit = max_limit
-
-        try:
-            surveys = self.doc_db.find_doc('bid', bid, 'business_survey_results', limit=limit, conditions=conditions, sort_key='timestamp', sort_direction=-1)
-
         except DatabaseFindError as exc:
             msg = {'message': 'Internal server error.'}
-            logging.error('Error reading database for business_survey_templates.')
+            logging.error('Error reading database for business_survey_results.')
             return msg, 500
         except DatabaseEmptyResult as exc:
-            msg = {'message': 'There are no survey templates for this business.'}
-            logging.error(msg)
-            return msg, 204
-        except DatabaseRecordNotFound as exc:
-            msg = {'message': 'There are no survey templates for this business.'}
+            msg = {'message': 'There are no survey results for this business.'}
             logging.error(msg)
             return msg, 204
 
-        return filter_general_document_db_record(surveys)
+        return paged_response(surveys, next_cursor)
 
 
 class BusinessSurveyResult(Resource):
@@ -150,7 +117,7 @@ class BusinessSurveyTemplates(Resource):
 
     def get(self, bid):
         try:
-            result = self.doc_db.find_doc('bid', bid, 'business_survey_templates', 100)
+            result = self.doc_db.iter_docs('bid', bid, 'business_survey_templates', 100)
         except DatabaseFindError as exc:
             msg = {'message': 'Internal server error.'}
             logging.error('Error reading database for business_survey_templates.')
@@ -159,16 +126,8 @@ class BusinessSurveyTemplates(Resource):
             msg = {'message': 'There are no survey templates for this business.'}
             logging.error(msg)
             return msg, 204
-        except DatabaseRecordNotFound as exc:
-            msg = {'message': 'There are no survey templates for this business.'}
-            logging.error(msg)
-            return msg, 204
-
-        api_result = []
-        for single_template in result:
-            api_result.append(filter_business_survey_template(single_template))
 
-        return api_result
+        return stream_json_list(filter_business_survey_template(single_template) for single_template in result)
 
     def post(self):
         pass
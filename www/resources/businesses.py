@@ -8,7 +8,7 @@ from www.resources.databases.factories import DatabaseFactory
 from www.resources.json_schemas import validate_json, JsonValidationException, business_update_schema, business_signup_schema, \
     business_category_add_single_schema, add_admin_for_business_schema
 from flask import request
-from www.resources.utilities.helpers import filter_general_document_db_record, filter_user_info
+from www.resources.utilities.helpers import filter_general_document_db_record, filter_user_info, stream_json_list
 
 import logging
 from www import oauth2
@@ -20,8 +20,8 @@ class Businesses(Resource):
         super(Businesses, self).__init__()
         self.graph_db = DatabaseFactory().get_database_driver('graph')
 
-    # @oauth2.check_access_token
-    def post(self, uid=None):
+    @oauth2.check_access_token
+    def post(self, uid):
         logging.debug('Client requested to create a business.')
 
         try:
@@ -39,12 +39,23 @@ class Businesses(Resource):
             return msg, 400
 
         try:
-            return self.graph_db.create_new_business(**body)
+            new_business = self.graph_db.create_new_business(**body)
         except Exception as exc:
             msg = {'message': 'Internal server error'}
             logging.error(exc, msg)
             return msg
 
+        # The creator is the first admin of the business, every other admin is added by an existing one.
+        try:
+            self.graph_db.add_business_admin(uid, new_business['bid'])
+        except (DatabaseRecordNotFound, DocumentNotUpdated) as exc:
+            msg = {'message': 'Internal server error'}
+            logging.error('Could not make the creator admin of the new business: bid: {}  uid: {}'
+                          .format(new_business['bid'], uid))
+            return msg, 500
+
+        return new_business
+
 
 class BusinessProfile(Resource):
     def __init__(self):
@@ -123,16 +134,19 @@ class BusinessCategory(Resource):
     @oauth2.check_access_token
     def get(self, uid):
         logging.debug('Client requested Business Categories.')
-        resp = self.doc_db.find_doc(None, None, 'business_categories', 100)
-
-        if resp:
-            logging.debug('Business Categories returned: {}'.format(resp))
-            return resp, 200
-        else:
+        try:
+            resp = self.doc_db.iter_docs(None, None, 'business_categories', 100)
+        except DatabaseFindError as exc:
+            msg = {'message': 'Internal server error.'}
+            logging.error('Error reading database for business_categories.')
+            return msg, 500
+        except DatabaseEmptyResult as exc:
             msg = {'Message': 'The collection you asked for is empty'}
             logging.error(msg)
             return msg, 204
 
+        return stream_json_list(resp)
+
     def post(self):
         logging.debug('Client requested to create a business category.')
 
@@ -169,6 +183,21 @@ class BusinessCategory(Resource):
             return msg, 500
 
 
+def check_business_admin(graph_db, uid, bid):
+    """Returns the error response when `uid` is not an admin of `bid`, `None` when it is."""
+    try:
+        if graph_db.is_business_admin(uid, bid):
+            return None
+    except DatabaseFindError as exc:
+        msg = {'message': 'Internal server error'}
+        logging.error('Could not check business admin: bid: {}  uid: {}'.format(bid, uid))
+        return msg, 500
+
+    msg = {'message': 'Only admins of this business can do this.'}
+    logging.error(msg)
+    return msg, 403
+
+
 class BusinessAdmins(Resource):
     def __init__(self):
         super(BusinessAdmins, self).__init__()
@@ -176,6 +205,10 @@ class BusinessAdmins(Resource):
 
     @oauth2.check_access_token
     def post(self, uid, bid):
+        forbidden = check_business_admin(self.graph_db, uid, bid)
+        if forbidden:
+            return forbidden
+
         try:
             data = request.get_json(force=True, silent=False)
         except Exception as exc:
@@ -191,35 +224,16 @@ class BusinessAdmins(Resource):
             return msg, 400
 
         try:
-            existing_user = self.graph_db.find_single_user('uid', data['uid'])
+            user = self.graph_db.add_business_admin(data['uid'], bid)
         except DatabaseRecordNotFound as exc:
-            logging.error('The uid you tried to add as admin does not exist bid: {}  uid: {}'.format(bid, data['uid']))
-            msg = {'message': 'Internal server error'}
+            logging.error('The uid you tried to add as admin or the business does not exist bid: {}  uid: {}'.format(bid, data['uid']))
+            msg = {'message': 'The user or the business does not exist.'}
             return msg, 400
-        except DatabaseFindError as exc:
-            logging.error('Could add uid add admin for business, uid find error: bid:{} uid: {}'.format(bid, data['uid']))
+        except DocumentNotUpdated as exc:
+            logging.error('Could not add business admin: bid: {}  uid: {}'.format(bid, data['uid']))
             msg = {'message': 'Internal server error'}
             return msg, 500
 
-        responsible = existing_user.get('responsible_for')
-
-        if responsible and responsible.find(bid) >=0:
-            should_update = False
-        else:
-            should_update = True
-            responsible = ''
-
-        if should_update:
-            existing_user['responsible_for'] = responsible + ' ' + bid
-            try:
-                user = self.graph_db.update(existing_user)
-            except DocumentNotUpdated as exc:
-                logging.error('Could not add business admin: bid: {}  uid: {}'.format(bid, data['uid']))
-                msg = {'message': 'Internal server error'}
-                return msg, 500
-        else:
-            user = existing_user
-
         return filter_user_info(user), 200
 
     @oauth2.check_access_token
@@ -244,31 +258,19 @@ class BusinessAdmin(Resource):
 
     @oauth2.check_access_token
     def delete(self, uid, bid, admin_uid):
+        forbidden = check_business_admin(self.graph_db, uid, bid)
+        if forbidden:
+            return forbidden
+
         try:
-            existing_user = self.graph_db.find_single_user('uid', admin_uid)
-        except DatabaseRecordNotFound as exc:
-            msg = {'message': 'The uid you tried to add as admin does not exist bid: {}  uid: {}'.format(bid, admin_uid)}
-            logging.error(msg)
-            return msg, 400
-        except DatabaseFindError as exc:
-            logging.error('Could add uid as admin for business, uid find error: bid:{} uid: {}'.format(bid, admin_uid))
+            removed = self.graph_db.remove_business_admin(admin_uid, bid)
+        except DocumentNotUpdated as exc:
+            logging.error('Could not remove business admin: bid: {}  uid: {}'.format(bid, admin_uid))
             msg = {'message': 'Internal server error'}
             return msg, 500
 
-        responsible = existing_user.get('responsible_for')
-        if responsible:
-            if responsible.find(bid) >= 0:
-                responsible_array = responsible.split()
-                responsible_array.remove(bid)
-                existing_user['responsible_for'] = ' '.join(responsible_array)
-                try:
-                    existing_user = self.graph_db.update(existing_user)
-                except DocumentNotUpdated as exc:
-                    logging.error('Could not add business admin: bid: {}  uid: {}'.format(bid, admin_uid))
-                    msg = {'message': 'Internal server error'}
-                    return msg, 500
-
-                return None, 200
+        if removed > 0:
+            return None, 200
 
         msg = {'message': 'The uid you tried to delete from admins was not actually and admin'}
         logging.error(msg)
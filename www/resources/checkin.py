@@ -3,25 +3,30 @@ __author__ = 'Mepla'
 import logging
 
 from flask_restful import Resource
+from flask_restful.reqparse import RequestParser
 
+from www.resources.config import configs
 from www.resources.databases.factories import DatabaseFactory
+from www.resources.databases.checkin_events import CheckinEventStore
 from www import oauth2
-from www.resources.databases.database_drivers import DatabaseRecordNotFound, DatabaseEmptyResult, DatabaseFindError
+from www.resources.databases.database_drivers import DatabaseRecordNotFound, DatabaseEmptyResult, DatabaseFindError, \
+    DatabaseSaveError
 
 
 class CheckIn(Resource):
     def __init__(self):
         super(CheckIn, self).__init__()
         self.graph_db = DatabaseFactory().get_database_driver('graph')
+        self.checkin_events = CheckinEventStore()
 
     @oauth2.check_access_token
     def post(self, bid, uid):
         logging.info('Client requested for checkin.')
 
         try:
-            existing_business = self.graph_db.find_single_business('bid', bid)
-        except DatabaseRecordNotFound as exc:
-            msg = {'message': 'The business you tried to create promotion for does not exist.'}
+            relation = self.graph_db.checkin_user(bid, uid)
+        except DatabaseRecordNotFound:
+            msg = {'message': 'The business you tried to check into does not exist.'}
             logging.debug(msg)
             return msg, 404
 
@@ -31,21 +36,58 @@ class CheckIn(Resource):
             return msg, 500
 
         try:
-            relation = self.graph_db.checkin_user(bid, uid)
-        except DatabaseRecordNotFound:
-            msg = {'message': 'The business you tried to check into does not exist.'}
-            logging.debug(msg)
-            return msg, 400
+            self.checkin_events.append(bid, uid, relation.get('rid'), relation.get('last'))
+        except DatabaseSaveError as exc:
+            msg = {'message': 'Your changes may have been done partially or not at all.'}
+            logging.error('Check-in event could not be saved: bid: {}  uid: {}'.format(bid, uid))
+            return msg, 500
 
         return relation
 
     @oauth2.check_access_token
     def get(self, uid, bid):
+        parser = RequestParser()
+        parser.add_argument('limit', type=int, help='`limit` argument must be an integer.')
+        parser.add_argument('before', type=float, help='`before` argument must be a timestamp (float).')
+        parser.add_argument('after', type=float, help='`after` argument must be a timestamp (float).')
+
+        args = parser.parse_args()
+
+        before = args.get('before')
+        after = args.get('after')
+
+        if before and after and before < after:
+            msg = {'message': '`before` argument must be greater than or equal to `after`.'}
+            logging.debug(msg)
+            return msg, 400
+
+        limit = args.get('limit')
+        max_limit = configs.get('DATABASES').get('mongodb').get('max_page_limit')
+        if not limit or limit > max_limit:
+            limit = max_limit
+
         try:
-            response = self.graph_db.checkins_for_business(bid)
+            events = self.checkin_events.find_for_business(bid, before=before, after=after, limit=limit)
         except DatabaseEmptyResult:
             msg = {'message': 'There is no check_ins for this business.'}
             logging.debug(msg)
             return msg, 204
 
-        return response
+        except DatabaseFindError as exc:
+            msg = {'message': 'Could not retrieve requested information'}
+            logging.error(msg)
+            return msg, 500
+
+        try:
+            users = self.graph_db.find_users(set([event['uid'] for event in events]))
+        except DatabaseFindError as exc:
+            msg = {'message': 'Could not retrieve requested information'}
+            logging.error(msg)
+            return msg, 500
+
+        names = {}
+        for user in users:
+            names[user.get('uid')] = u'{} {}'.format(user.get('f_name'), user.get('l_name'))
+
+        return [{'timestamp': event['timestamp'], 'uid': event['uid'], 'name': names.get(event['uid'])}
+                for event in events]
@@ -1,5 +1,6 @@
 __author__ = 'Mepla'
 
+import copy
 import logging
 import json
 
@@ -8,25 +9,108 @@ config_path = '/etc/enchilada/config.josn'
 default_configs = {
     "debug_mode": True,
     "LOGLEVEL": "DEBUG",
+    "verify_schema_on_startup": True,
     "DATABASES": {
         "neo4j": {
             "username": "neo4j",
             "password": "Echomybiz",
             "host": "52.10.54.183",
             "port": 7474,
-            "max_page_limit": 30
+            "max_page_limit": 30,
+            "socket_timeout": 30,
+            "identity_map_size": 1000,
+            "node_cache": {
+                "enabled": False,
+                "max_size": 10000,
+                "ttl": 30
+            }
         },
         "mongodb": {
             "host": "52.10.54.183",
             "port": 27017,
-            "max_page_limit": 30
+            "max_page_limit": 30,
+            "batch_size": 100,
+            "max_pool_size": 100,
+            "min_pool_size": 0,
+            "max_idle_time_ms": 60000,
+            "connect_timeout_ms": 5000,
+            "socket_timeout_ms": 30000,
+            "server_selection_timeout_ms": 5000,
+            "wait_queue_timeout_ms": 1000
+        }
+    },
+    "PROMOTIONS": {
+        "predicate_cache": {
+            "max_size": 10000
+        },
+        "active_cache": {
+            "max_size": 1000,
+            "max_ttl": 600,
+            "max_promotions": 100
+        },
+        "audience_snapshot": {
+            "enabled": True,
+            "refresh_interval": 3600,
+            "batch_size": 1000
+        }
+    },
+    "AUTH": {
+        "token_mode": "opaque",
+        "signing_key": None,
+        "revocation_refresh_interval": 30,
+        "refresh_token_ttl": 2592000,
+        "token_stats_ttl": 60,
+        "token_compaction": {
+            "enabled": True,
+            "interval": 3600
+        },
+        "scopes_reload_interval": 60,
+        "password_hashing": {
+            "current_version": "v2",
+            "workers": 4,
+            "max_queue_size": 64,
+            "timeout": 5.0,
+            "versions": {
+                "v2": {
+                    "algorithm": "sha256",
+                    "iterations": 100000,
+                    "salt_bytes": 16
+                }
+            }
+        },
+        "credentials": {
+            "graph_fallback": True
+        },
+        "client_registry": {
+            "reload_interval": 60,
+            "miss_reload_interval": 5
+        },
+        "token_cache": {
+            "max_size": 10000,
+            "ttl": 300
         }
     }
 }
 
 
-try:
-    configs = json.load(config_path)
-except Exception as exc:
-    logging.warning('Could not load config file ({}). Default configs loaded.'.format(config_path))
-    configs = default_configs
\ No newline at end of file
+def merge_configs(defaults, overrides):
+    """Recursively merges the overrides into the defaults, keeping every default the overrides omit."""
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(defaults.get(key), dict):
+            merge_configs(defaults[key], value)
+        else:
+            defaults[key] = value
+    return defaults
+
+
+def load_configs(path):
+    configs = copy.deepcopy(default_configs)
+    try:
+        with open(path) as config_file:
+            return merge_configs(configs, json.load(config_file))
+    except Exception as exc:
+        logging.warning('Could not load config file ({}). Default configs loaded.'.format(path))
+        return configs
+
+
+configs = load_configs(config_path)
@@ -0,0 +1,195 @@
+__author__ = 'Mepla'
+
+import time
+import datetime
+import logging
+import threading
+
+import numpy
+
+from www.resources.config import configs
+from www.resources.databases.factories import DatabaseFactory
+
+
+class AudienceSnapshot(object):
+    """Columns of all users and their relations to businesses, for counting the users promotion conditions select.
+
+    Users are rows: gender codes, birth dates as day ordinals (0 when unknown) and birthdays as `month * 100 + day`.
+    Check-ins and follows are (user row, business) pairs grouped by business, so the pairs of one business are a
+    slice. `count` evaluates conditions as boolean masks over the rows with the same semantics as the eligibility
+    engine, without any database access.
+    """
+
+    def __init__(self, genders, birth_ordinals, birthdays, checkins, follows, built_at=None):
+        self.genders = genders
+        self.birth_ordinals = birth_ordinals
+        self.birthdays = birthdays
+        self.checkins = checkins
+        self.follows = follows
+        self.built_at = built_at or time.time()
+
+    @property
+    def size(self):
+        return len(self.birth_ordinals)
+
+    @classmethod
+    def build(cls, users, checkins, follows):
+        """Builds a snapshot from dicts of users (uid, gender, birth_date), check-ins (uid, bid, count, last) and
+        follows (uid, bid)."""
+        rows = {}
+        gender_values = {}
+        gender_codes = numpy.zeros(len(users), dtype=numpy.int16)
+        birth_ordinals = numpy.zeros(len(users), dtype=numpy.int32)
+        birthdays = numpy.zeros(len(users), dtype=numpy.int16)
+
+        for row, user in enumerate(users):
+            rows[user['uid']] = row
+            gender_codes[row] = gender_values.setdefault(user.get('gender'), len(gender_values))
+            try:
+                birth_date = datetime.datetime.strptime(user.get('birth_date'), '%Y-%m-%d').date()
+                birth_ordinals[row] = birth_date.toordinal()
+                birthdays[row] = birth_date.month * 100 + birth_date.day
+            except (TypeError, ValueError):
+                pass
+
+        genders = {'values': gender_values, 'codes': gender_codes}
+
+        checkin_groups = cls._group_by_business(rows, checkins, [('count', numpy.int32), ('last', numpy.float64)])
+        follow_groups = cls._group_by_business(rows, follows, [])
+        return cls(genders, birth_ordinals, birthdays, checkin_groups, follow_groups)
+
+    @staticmethod
+    def _group_by_business(rows, pairs, columns):
+        """Returns {bid: {'rows': user rows, column: values}} of the pairs of users in `rows`."""
+        groups = {}
+        for pair in pairs:
+            row = rows.get(pair.get('uid'))
+            if row is None:
+                continue
+            group = groups.setdefault(pair.get('bid'), {'rows': []})
+            group['rows'].append(row)
+            for column, dtype in columns:
+                group.setdefault(column, []).append(pair.get(column) or 0)
+
+        for group in groups.values():
+            group['rows'] = numpy.array(group['rows'], dtype=numpy.int32)
+            for column, dtype in columns:
+                group[column] = numpy.array(group[column], dtype=dtype)
+        return groups
+
+    def count(self, bid, conditions, now=None):
+        """Returns how many users satisfy `conditions` of a promotion of `bid`."""
+        now = now or time.time()
+        today = datetime.date.fromtimestamp(now)
+        mask = numpy.ones(self.size, dtype=bool)
+
+        gender = conditions.get('gender')
+        if gender:
+            code = self.genders['values'].get(gender)
+            if code is None:
+                return 0
+            mask &= self.genders['codes'] == code
+
+        # The age in whole years of 365 days is at least `from` while at least 365 * `from` days old, and at most
+        # `to` while less than 365 * (`to` + 1) days old.
+        age_condition = conditions.get('age') or {}
+        if age_condition.get('from') or age_condition.get('to'):
+            mask &= self.birth_ordinals > 0
+            if age_condition.get('from'):
+                mask &= self.birth_ordinals <= today.toordinal() - 365 * age_condition.get('from')
+            if age_condition.get('to'):
+                mask &= self.birth_ordinals > today.toordinal() - 365 * (age_condition.get('to') + 1)
+
+        checkins_condition = conditions.get('checkins') or {}
+        if checkins_condition.get('min') or checkins_condition.get('max') is not None or \
+                checkins_condition.get('days_since_last'):
+            group = self.checkins.get(bid)
+            counts = numpy.zeros(self.size, dtype=numpy.int32)
+            last = numpy.full(self.size, numpy.nan)
+            if group:
+                counts[group['rows']] = group['count']
+                last[group['rows']] = group['last']
+
+            if checkins_condition.get('min'):
+                mask &= counts >= checkins_condition.get('min')
+            if checkins_condition.get('max') is not None:
+                mask &= counts <= checkins_condition.get('max')
+            if checkins_condition.get('days_since_last'):
+                with numpy.errstate(invalid='ignore'):
+                    mask &= now - last >= checkins_condition.get('days_since_last') * 86400
+
+        if conditions.get('must_follow') or checkins_condition.get('must_follow'):
+            follows = numpy.zeros(self.size, dtype=bool)
+            group = self.follows.get(bid)
+            if group:
+                follows[group['rows']] = True
+            mask &= follows
+
+        if (conditions.get('special_conditions') or {}).get('must_be_birthday'):
+            mask &= self.birthdays == today.month * 100 + today.day
+
+        return int(numpy.count_nonzero(mask))
+
+
+class AudienceEstimator(object):
+    """Holds the current `AudienceSnapshot` and rebuilds it from the graph database when `refresh` is called.
+
+    The graph is read in pages of `batch_size` rows. A new snapshot replaces the current one only when it is
+    complete, so estimates are always made from a whole snapshot while the next one is built.
+    """
+
+    def __init__(self, graph_db=None, batch_size=1000):
+        self._graph_db = graph_db
+        self._batch_size = batch_size
+        self._snapshot = None
+        self._refresh_lock = threading.Lock()
+        self._last_refresh_duration = None
+
+    @property
+    def snapshot(self):
+        return self._snapshot
+
+    def _read_all(self, find, key):
+        rows = []
+        after = None
+        while True:
+            page = find(after, self._batch_size)
+            if not page:
+                return rows
+            rows.extend(page)
+            after = page[-1][key]
+
+    def refresh(self):
+        with self._refresh_lock:
+            started_at = time.time()
+            graph_db = self._graph_db or DatabaseFactory().get_database_driver('graph')
+            users = self._read_all(graph_db.find_user_demographics, 'uid')
+            checkins = self._read_all(graph_db.find_checkin_summaries, 'rid')
+            follows = self._read_all(graph_db.find_business_follows, 'fid')
+            self._snapshot = AudienceSnapshot.build(users, checkins, follows)
+            self._last_refresh_duration = time.time() - started_at
+
+        logging.info('Audience snapshot of {} users built in {:.1f}s.'.format(self._snapshot.size,
+                                                                                self._last_refresh_duration))
+
+    def estimate(self, bid, conditions):
+        """Returns the estimate for `conditions`, `None` while there is no snapshot yet."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return None
+
+        started_at = time.time()
+        audience = snapshot.count(bid, conditions)
+        return {'audience': audience,
+                'users': snapshot.size,
+                'snapshot_age': time.time() - snapshot.built_at,
+                'duration_ms': (time.time() - started_at) * 1000}
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {'users': snapshot.size if snapshot else None,
+                'built_at': snapshot.built_at if snapshot else None,
+                'last_refresh_duration': self._last_refresh_duration}
+
+
+audience_estimator = AudienceEstimator(batch_size=configs.get('PROMOTIONS').get('audience_snapshot').get('batch_size'))
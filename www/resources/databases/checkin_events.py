@@ -0,0 +1,75 @@
+__author__ = 'Mepla'
+
+import time
+import datetime
+
+import pymongo
+
+from www.resources.databases.factories import DatabaseFactory
+from www.resources.utilities.helpers import uuid_with_prefix
+
+
+class CheckinEventStore(object):
+    """Append-only store of single check-in events.
+
+    The CHECK_IN relationship in the graph only keeps a summary of a user's check-ins into a business (`count`,
+    `first` and `last`), every single check-in is an event here with a numeric `timestamp`. Events carry the `rid`
+    of the relationship they belong to and the UTC `day` they fall into, so they can be grouped per relationship
+    or per day without touching the timestamps themselves.
+    """
+
+    collection = 'checkin_events'
+    indexes = [[('bid', pymongo.ASCENDING), ('timestamp', pymongo.DESCENDING)],
+               [('uid', pymongo.ASCENDING), ('bid', pymongo.ASCENDING), ('timestamp', pymongo.DESCENDING)],
+               [('rid', pymongo.ASCENDING)]]
+
+    def __init__(self, doc_db=None):
+        self._doc_db = doc_db or DatabaseFactory().get_database_driver('document/docs')
+
+    @staticmethod
+    def create_event(bid, uid, rid, timestamp=None, **kwargs):
+        if timestamp is None:
+            timestamp = time.time()
+        timestamp = float(timestamp)
+
+        event = {'ceid': uuid_with_prefix('ceid'), 'bid': bid, 'uid': uid, 'rid': rid, 'timestamp': timestamp,
+                 'day': datetime.datetime.utcfromtimestamp(timestamp).strftime('%Y-%m-%d')}
+        event.update(kwargs)
+        return event
+
+    def append(self, bid, uid, rid, timestamp=None):
+        event = self.create_event(bid, uid, rid, timestamp)
+        self._doc_db.save(event, self.collection)
+        return event
+
+    def append_many(self, events):
+        if events:
+            self._doc_db.save(events, self.collection, multiple=True)
+
+    def delete(self, conditions):
+        return self._doc_db.delete(self.collection, conditions, multiple=True)
+
+    def find_for_business(self, bid, before=None, after=None, limit=0):
+        return self._find({'bid': bid}, before, after, limit)
+
+    def find_for_user(self, uid, bid=None, before=None, after=None, limit=0):
+        conditions = {'uid': uid}
+        if bid:
+            conditions['bid'] = bid
+        return self._find(conditions, before, after, limit)
+
+    def _find(self, conditions, before, after, limit):
+        """Newest events first, strictly between `after` and `before` when they are given."""
+        if before is not None or after is not None:
+            conditions['timestamp'] = {}
+            if before is not None:
+                conditions['timestamp']['$lt'] = before
+            if after is not None:
+                conditions['timestamp']['$gt'] = after
+
+        return self._doc_db.find_doc(None, None, self.collection, limit=limit, conditions=conditions,
+                                     sort_key='timestamp', sort_direction=-1)
+
+    def ensure_indexes(self):
+        for keys in self.indexes:
+            self._doc_db.create_index(self.collection, keys)
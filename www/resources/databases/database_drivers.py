@@ -7,10 +7,12 @@ import time
 from operator import itemgetter
 
 from py2neo import Graph, Node, Relationship, authenticate
-from pymongo import MongoClient
+from pymongo import MongoClient, ReturnDocument
+from pymongo.errors import DuplicateKeyError
 
 from www.resources.utilities.helpers import uuid_with_prefix
 from www.resources.utilities.helpers import filter_general_document_db_record, filter_user_info
+from www.resources.utilities.caching import LRUCache
 
 
 class DatabaseFindError(Exception):
@@ -21,6 +23,10 @@ class DatabaseSaveError(Exception):
     pass
 
 
+class DuplicateDocument(DatabaseSaveError):
+    pass
+
+
 class DatabaseRecordNotFound(Exception):
     pass
 
@@ -46,7 +52,7 @@ class DocumentDatabaseBase(object):
 
 
 class MongoDatabase(DocumentDatabaseBase):
-    def __init__(self, host='localhost', port=27017, db='docs'):
+    def __init__(self, host='localhost', port=27017, db='docs', mongo_client=None):
         from www.resources.config import configs
         if configs['debug_mode']:
             docs = 'test_docs'
@@ -57,7 +63,7 @@ class MongoDatabase(DocumentDatabaseBase):
             auth = 'auth'
             accounting = 'accounting'
 
-        self._mongo_client = MongoClient(host, port)
+        self._mongo_client = mongo_client or MongoClient(host, port)
         if db == 'docs':
             self._mongo_db = self._mongo_client.test_docs
         elif db == 'auth':
@@ -76,6 +82,9 @@ class MongoDatabase(DocumentDatabaseBase):
                 objs = self._mongo_db[doc_type].insert_many(doc, ordered=False)
             else:
                 obj = self._mongo_db[doc_type].insert_one(doc)
+        except DuplicateKeyError as exc:
+            logging.error('Duplicate doc not saved to database: {} exc: {}'.format(self._mongo_db, exc))
+            raise DuplicateDocument()
         except Exception as exc:
             logging.error('Error saving doc to database: {} exc: {}'.format(self._mongo_db, exc))
             raise DatabaseSaveError()
@@ -88,6 +97,160 @@ class MongoDatabase(DocumentDatabaseBase):
 
         return result.deleted_count
 
+    def replace(self, doc_type, conditions, doc, upsert=False):
+        """Replaces the first doc matching `conditions` with `doc`, inserts `doc` when there is none and `upsert`."""
+        try:
+            result = self._mongo_db[doc_type].replace_one(conditions, doc, upsert=upsert)
+        except Exception as exc:
+            logging.error('Error replacing doc in database: {} exc: {}'.format(self._mongo_db, exc))
+            raise DatabaseSaveError()
+
+        if not result.matched_count and result.upserted_id is None:
+            raise DocumentNotUpdated()
+
+    def update_fields(self, doc_type, conditions, fields, multiple=False):
+        """Sets `fields` ({field: value}) on the first doc matching `conditions`, or on all of them with `multiple`.
+        Returns the number of docs matched."""
+        try:
+            if multiple:
+                result = self._mongo_db[doc_type].update_many(conditions, {'$set': fields})
+            else:
+                result = self._mongo_db[doc_type].update_one(conditions, {'$set': fields})
+        except Exception as exc:
+            logging.error('Error updating doc in database: {} exc: {}'.format(self._mongo_db, exc))
+            raise DatabaseSaveError()
+
+        return result.matched_count
+
+    def increment(self, doc_type, conditions, increments, upsert=False):
+        """Atomically adds `increments` ({field: amount}) to the first doc matching `conditions` and returns the doc as
+        updated. Raises `DatabaseRecordNotFound` when no doc matches; with `upsert` a doc is inserted instead, unless it
+        would violate a unique index, which raises `DatabaseRecordNotFound` as well. Conditions on the incremented
+        fields make conditional counters, e.g. `{'count': {'$lt': limit}}` only increments below a limit."""
+        try:
+            doc = self._mongo_db[doc_type].find_one_and_update(conditions, {'$inc': increments}, upsert=upsert,
+                                                               return_document=ReturnDocument.AFTER)
+        except DuplicateKeyError as exc:
+            raise DatabaseRecordNotFound()
+        except Exception as exc:
+            logging.error('Error incrementing doc in database: {} exc: {}'.format(self._mongo_db, exc))
+            raise DocumentNotUpdated()
+
+        if not doc:
+            raise DatabaseRecordNotFound()
+        return filter_general_document_db_record(doc)
+
+    def bulk_write(self, doc_type, inserts=None, increments=None, ordered=True):
+        """Inserts the docs of `inserts` and applies the (conditions, {field: amount}) pairs of `increments` to the
+        first doc matching each, in one round trip. Returns the number of docs the increments matched, an increment
+        that matches no doc is not an error. Raises `DatabaseSaveError` when a write fails, with `ordered` the writes
+        after it are not applied."""
+        operations = [pymongo.InsertOne(doc) for doc in inserts or []]
+        operations += [pymongo.UpdateOne(conditions, {'$inc': amounts}) for conditions, amounts in increments or []]
+        if not operations:
+            return 0
+
+        try:
+            result = self._mongo_db[doc_type].bulk_write(operations, ordered=ordered)
+        except Exception as exc:
+            logging.error('Error in bulk writing to database: {}.{} exc: {}'.format(self._mongo_db, doc_type, exc))
+            raise DatabaseSaveError()
+
+        return result.matched_count
+
+    def find_and_delete(self, doc_type, conditions):
+        """Atomically removes the first doc matching `conditions` and returns it, so only one caller can get it."""
+        try:
+            doc = self._mongo_db[doc_type].find_one_and_delete(conditions)
+        except Exception as exc:
+            logging.error('Error in finding and deleting doc in database: {} exc: {}'.format(self._mongo_db, exc))
+            raise DatabaseFindError()
+
+        if not doc:
+            raise DatabaseRecordNotFound()
+        return filter_general_document_db_record(doc)
+
+    def count(self, doc_type, conditions=None):
+        try:
+            return self._mongo_db[doc_type].count_documents(conditions or {})
+        except Exception as exc:
+            logging.error('Error in counting docs in database: {} exc: {}'.format(self._mongo_db, exc))
+            raise DatabaseFindError()
+
+    def create_index(self, doc_type, keys, **kwargs):
+        try:
+            return self._mongo_db[doc_type].create_index(keys, **kwargs)
+        except Exception as exc:
+            logging.error('Error creating index {} on {}.{}: {}'.format(keys, self._mongo_db, doc_type, exc))
+            raise DatabaseSaveError()
+
+    def iter_docs(self, key, value, doc_type, limit=0, conditions=None, sort_key=None, sort_direction=1, fields=None,
+                  batch_size=None):
+        """Like `find_doc` for lists, but yields docs as the cursor delivers them.
+
+        `sort_key` may also be a list of (key, direction) pairs. `_id` and `id` are excluded by the server, or only
+        `fields` are returned when given. The first doc is fetched before returning, so a failing query raises
+        `DatabaseFindError` and an empty one `DatabaseEmptyResult` right away instead of in the middle of the
+        iteration.
+        """
+        find_predicate = {}
+        if conditions:
+            find_predicate = conditions
+
+        if key and value:
+            find_predicate[key] = value
+
+        if fields:
+            projection = dict((field, True) for field in fields)
+            projection['_id'] = False
+        else:
+            projection = {'_id': False, 'id': False}
+
+        if not batch_size:
+            from www.resources.config import configs
+            batch_size = configs.get('DATABASES').get('mongodb').get('batch_size', 100)
+
+        try:
+            cursor = self._mongo_db[doc_type].find(find_predicate, projection, limit=limit, batch_size=batch_size)
+            if isinstance(sort_key, list):
+                cursor = cursor.sort(sort_key)
+            elif sort_key:
+                cursor = cursor.sort(sort_key, pymongo.DESCENDING if sort_direction == -1 else pymongo.ASCENDING)
+            first_doc = next(cursor, None)
+        except Exception as exc:
+            logging.error('Error in finding doc in database: {} exc: {}'.format(self._mongo_db, exc))
+            raise DatabaseFindError()
+
+        if first_doc is None:
+            raise DatabaseEmptyResult()
+
+        return self._iter_cursor(first_doc, cursor)
+
+    def _iter_cursor(self, first_doc, cursor):
+        yield first_doc
+        try:
+            for doc in cursor:
+                yield doc
+        except Exception as exc:
+            logging.error('Error in iterating docs of database: {} exc: {}'.format(self._mongo_db, exc))
+            raise DatabaseFindError()
+        finally:
+            cursor.close()
+
+    def index_information(self, doc_type):
+        try:
+            return self._mongo_db[doc_type].index_information()
+        except Exception as exc:
+            logging.error('Error reading indexes of {}.{}: {}'.format(self._mongo_db, doc_type, exc))
+            raise DatabaseFindError()
+
+    def collection_names(self):
+        try:
+            return [name for name in self._mongo_db.list_collection_names() if not name.startswith('system.')]
+        except Exception as exc:
+            logging.error('Error listing collections of {}: {}'.format(self._mongo_db, exc))
+            raise DatabaseFindError()
+
     def find_doc(self, key, value, doc_type, limit=1, conditions=None, sort_key=None, sort_direction=1):
         try:
             find_predicate = {}
@@ -97,7 +260,7 @@ class MongoDatabase(DocumentDatabaseBase):
             if key and value:
                 find_predicate[key] = value
 
-            if limit == 1:
+            if limit == 1 and not sort_key:
                 doc = self._mongo_db[doc_type].find_one(find_predicate)
                 if not doc:
                     raise DatabaseRecordNotFound()
@@ -127,50 +290,105 @@ class MongoDatabase(DocumentDatabaseBase):
 
 
 class Neo4jDatabase(GraphDatabaseBase):
-    def __init__(self, host='localhost', port=7474, username='neo4', password='new4j'):
-        neo4j_address = host + ':' + str(port)
-        authenticate(neo4j_address, username, password)
-        self._graph = Graph('http://' + neo4j_address + '/db/data')
-        self.docs_in_memory = {}
+    identity_keys = {'user': 'uid', 'business': 'bid'}
+
+    def __init__(self, host='localhost', port=7474, username='neo4', password='new4j', graph=None, node_cache=None,
+                 identity_map_size=1000):
+        if graph:
+            self._graph = graph
+        else:
+            neo4j_address = host + ':' + str(port)
+            authenticate(neo4j_address, username, password)
+            self._graph = Graph('http://' + neo4j_address + '/db/data')
+
+        # Nodes fetched by this driver (one unit of work), keyed by uid/bid so they can be pushed by `update()`.
+        self._identity_map = LRUCache(max_size=identity_map_size)
+        # Optional process wide cache of node properties shared between drivers, keyed by (label, uid/bid).
+        self._node_cache = node_cache
+
+    def _find_node(self, label, key, value):
+        identity_key = self.identity_keys.get(label)
+        if key == identity_key:
+            node = self._identity_map.get(value)
+            if node:
+                return node
+
+        node = self._graph.find_one(label, key, value)
+        if node and identity_key:
+            self._identity_map.set(node.properties.get(identity_key), node)
+        return node
+
+    def _find_cached_properties(self, label, key, value):
+        if self._node_cache is None or key != self.identity_keys.get(label):
+            return None
+        return self._node_cache.get((label, value))
+
+    def _cache_properties(self, label, properties):
+        if self._node_cache is not None:
+            self._node_cache.set((label, properties.get(self.identity_keys[label])), dict(properties))
+
+    def clear_identity_map(self):
+        self._identity_map.clear()
 
     def update(self, doc):
-        existing_doc = self.docs_in_memory.get(doc.get('uid')) or self.docs_in_memory.get(doc.get('bid')) or self.docs_in_memory.get(doc.get('rid')) or self.docs_in_memory.get(doc.get('id'))
-        if existing_doc:
+        for label, identity_key in self.identity_keys.items():
+            identity = doc.get(identity_key)
+            if not identity:
+                continue
+
+            try:
+                existing_node = self._find_node(label, identity_key, identity)
+            except Exception as exc:
+                logging.error('Could not fetch node for update: {}'.format(exc))
+                raise DocumentNotUpdated()
+
+            if not existing_node:
+                continue
+
             try:
                 for key in doc.keys():
-                    existing_doc[key] = doc[key]
-                existing_doc.push()
-                return existing_doc.properties
+                    existing_node[key] = doc[key]
+                existing_node.push()
             except Exception as exc:
-                DocumentNotUpdated()
-        else:
-            raise DocumentNotUpdated()
+                logging.error('Could not push node update: {}'.format(exc))
+                raise DocumentNotUpdated()
+            finally:
+                if self._node_cache is not None:
+                    self._node_cache.invalidate((label, identity))
+
+            return dict(existing_node.properties)
+
+        raise DocumentNotUpdated()
 
     def create_new_user(self, **kwargs):
         new_user = Node('user', **kwargs)
         return self._graph.create(new_user)[0].properties
 
     def find_single_user(self, key, value):
+        cached_user = self._find_cached_properties('user', key, value)
+        if cached_user:
+            return dict(cached_user)
+
         try:
-            existing_user = self._graph.find_one('user', key, value)
+            existing_user = self._find_node('user', key, value)
         except Exception as exc:
             print(exc)
             raise DatabaseFindError()
 
         if existing_user:
-            self.docs_in_memory[existing_user.properties.get('uid')] = existing_user
+            self._cache_properties('user', existing_user.properties)
             return dict(existing_user.properties)
         else:
             raise DatabaseRecordNotFound
 
     def find_single_user_checkins(self, user_id, bid=None):
-        existing_user = self._graph.find_one('user', 'uid', user_id)
+        existing_user = self._find_node('user', 'uid', user_id)
         if not existing_user:
             raise DatabaseRecordNotFound()
 
         existing_business = None
         if bid:
-            existing_business = self._graph.find_one('business', 'bid', bid)
+            existing_business = self._find_node('business', 'bid', bid)
             if not existing_business:
                 raise DatabaseRecordNotFound()
 
@@ -203,57 +421,67 @@ class Neo4jDatabase(GraphDatabaseBase):
         return self._graph.create(new_business)[0].properties
 
     def find_single_business(self, key, value):
+        cached_business = self._find_cached_properties('business', key, value)
+        if cached_business:
+            return dict(cached_business)
+
         try:
-            existing_business = self._graph.find_one('business', key, value)
+            existing_business = self._find_node('business', key, value)
         except Exception as exc:
             raise DatabaseFindError()
 
         if existing_business:
-            self.docs_in_memory[existing_business.properties.get('bid')] = existing_business
-            return existing_business.properties
+            self._cache_properties('business', existing_business.properties)
+            return dict(existing_business.properties)
         else:
             raise DatabaseRecordNotFound
 
-    def checkins_for_business(self, bid):
+    def find_users(self, uids):
         try:
-            business = self._graph.find_one('business', 'bid', bid)
-            if not business:
-                raise Exception()
+            result = self._graph.cypher.execute('MATCH (u:user) WHERE u.uid IN {uids} RETURN u', {'uids': list(uids)})
         except Exception as exc:
-            raise DatabaseRecordNotFound()
+            logging.error(exc)
+            raise DatabaseFindError()
+
+        return [dict(record.u.properties) for record in result.records]
+
+    user_activity_statement = '''
+        MATCH (u:user {uid: {uid}})
+        OPTIONAL MATCH (u)-[c:CHECK_IN]->(cb:business)
+        WITH u, collect([cb.bid, c.count, c.first, c.last]) AS checkins
+        OPTIONAL MATCH (u)-[:FOLLOWS]->(fb:business)
+        RETURN u, checkins, collect(fb.bid) AS follows
+    '''
 
+    def find_user_activity(self, uid):
+        """Returns the properties of a user, the summaries of their check-ins keyed by bid and the bids they follow,
+        all in one statement."""
         try:
-            results = self._graph.match(None, "CHECK_IN", business)
-            if not results:
-                raise Exception()
+            result = self._graph.cypher.execute(self.user_activity_statement, {'uid': uid})
         except Exception as exc:
-            raise DatabaseEmptyResult
+            logging.error('Error executing user activity cypher: {}'.format(exc))
+            raise DatabaseFindError()
 
-        print time.time()
-        response_list = list()
-        for res in results:
-            user = res.start_node
-            timestamps = res.properties['timestamps'].split(' ')
-            for t in timestamps:
-                response_list.append({'timestamp': t, 'uid': user.properties['uid'],
-                                      'name': user.properties['f_name'] + ' ' + user.properties['l_name']})
-        print time.time()
+        if not result.records:
+            raise DatabaseRecordNotFound()
 
-        response_list = sorted(response_list, key=itemgetter('timestamp'), reverse=True)
-        return response_list
+        record = result.records[0]
+        checkins = dict((bid, {'count': count, 'first': first, 'last': last})
+                        for bid, count, first, last in record.checkins if bid is not None)
+        return dict(record.u.properties), checkins, set(bid for bid in record.follows if bid is not None)
 
     def follow(self, business_or_user_id, uid):
         try:
             if business_or_user_id.find('uid') == 0:
-                end_node = self._graph.find_one('user', 'uid', business_or_user_id)
+                end_node = self._find_node('user', 'uid', business_or_user_id)
             else:
-                end_node = self._graph.find_one('business', 'bid', business_or_user_id)
+                end_node = self._find_node('business', 'bid', business_or_user_id)
             if not end_node:
                 raise Exception()
         except Exception as exc:
             raise DatabaseRecordNotFound()
 
-        user = self._graph.find_one('user', 'uid', uid)
+        user = self._find_node('user', 'uid', uid)
 
         existing_relation = self._graph.match_one(user, "FOLLOWS", end_node)
         if existing_relation:
@@ -267,7 +495,7 @@ class Neo4jDatabase(GraphDatabaseBase):
 
     def find_business_followers(self, bid):
         try:
-            business = self._graph.find_one('business', 'bid', bid)
+            business = self._find_node('business', 'bid', bid)
             if not business:
                 raise Exception()
         except Exception as exc:
@@ -292,15 +520,15 @@ class Neo4jDatabase(GraphDatabaseBase):
     def is_follower(self, uid, business_or_user_id):
         try:
             if business_or_user_id.find('uid') == 0:
-                end_node = self._graph.find_one('user', 'uid', business_or_user_id)
+                end_node = self._find_node('user', 'uid', business_or_user_id)
             else:
-                end_node = self._graph.find_one('business', 'bid', business_or_user_id)
+                end_node = self._find_node('business', 'bid', business_or_user_id)
             if not end_node:
                 raise Exception()
         except Exception as exc:
             raise DatabaseRecordNotFound()
 
-        user = self._graph.find_one('user', 'uid', uid)
+        user = self._find_node('user', 'uid', uid)
 
         existing_relation = self._graph.match_one(user, "FOLLOWS", end_node)
         if existing_relation:
@@ -308,32 +536,78 @@ class Neo4jDatabase(GraphDatabaseBase):
         else:
             return False
 
+    checkin_statement = '''
+        MATCH (b:business {bid: {bid}}), (u:user {uid: {uid}})
+        MERGE (u)-[r:CHECK_IN]->(b)
+        ON CREATE SET r.rid = {rid}, r.count = 1, r.first = {timestamp}, r.last = {timestamp}
+        ON MATCH SET r.count = r.count + 1, r.first = coalesce(r.first, {timestamp}), r.last = {timestamp}
+        RETURN r
+    '''
+
     def checkin_user(self, business_id, user_id):
+        parameters = {'bid': business_id, 'uid': user_id, 'rid': uuid_with_prefix('rid'), 'timestamp': time.time()}
         try:
-            business = self._graph.find_one('business', 'bid', business_id)
-            if not business:
-                raise Exception()
+            result = self._graph.cypher.execute(self.checkin_statement, parameters)
         except Exception as exc:
+            logging.error('Error executing checkin cypher: {}'.format(exc))
+            raise DatabaseFindError()
+
+        if len(result.records) < 1:
             raise DatabaseRecordNotFound()
 
-        user = self._graph.find_one('user', 'uid', user_id)
+        return dict(result.records[0].r.properties)
 
-        existing_relation = self._graph.match_one(user, "CHECK_IN", business)
-        if existing_relation:
-            existing_relation.properties['count'] += 1
-            existing_relation.properties['timestamps'] = str(time.time()) + ' ' + existing_relation.properties['timestamps']
-            existing_relation.push()
-            return existing_relation.properties
-        else:
-            new_id = uuid_with_prefix('rid')
-            timestamps = str(time.time())
-            new_relation = Relationship(user, 'CHECK_IN', business, rid=new_id, count=1, timestamps=timestamps)
-            self._graph.create(new_relation)
-            return new_relation.properties
+    def find_checkins_with_timestamps(self, limit=100):
+        try:
+            result = self._graph.cypher.execute('MATCH (u:user)-[r:CHECK_IN]->(b:business) WHERE has(r.timestamps) '
+                                                'RETURN u.uid AS uid, b.bid AS bid, r LIMIT {limit}', {'limit': limit})
+        except Exception as exc:
+            logging.error(exc)
+            raise DatabaseFindError()
+
+        return [{'uid': record.uid, 'bid': record.bid, 'checkin': dict(record.r.properties)} for record in result.records]
+
+    def set_checkin_summary(self, rid, first, last):
+        try:
+            self._graph.cypher.execute('MATCH ()-[r:CHECK_IN {rid: {rid}}]->() '
+                                       'SET r.first = {first}, r.last = {last} REMOVE r.timestamps',
+                                       {'rid': rid, 'first': first, 'last': last})
+        except Exception as exc:
+            logging.error(exc)
+            raise DocumentNotUpdated()
+
+    def get_uniqueness_constraints(self, label):
+        try:
+            return self._graph.schema.get_uniqueness_constraints(label)
+        except Exception as exc:
+            logging.error(exc)
+            raise DatabaseFindError()
+
+    def get_indexes(self, label):
+        try:
+            return self._graph.schema.get_indexes(label)
+        except Exception as exc:
+            logging.error(exc)
+            raise DatabaseFindError()
+
+    def create_uniqueness_constraint(self, label, key):
+        try:
+            self._graph.schema.create_uniqueness_constraint(label, key)
+        except Exception as exc:
+            logging.error(exc)
+            raise DatabaseSaveError()
+
+    def create_index(self, label, key):
+        try:
+            self._graph.schema.create_index(label, key)
+        except Exception as exc:
+            logging.error(exc)
+            raise DatabaseSaveError()
 
     def find_business_admins(self, bid):
         try:
-            result = self._graph.cypher.execute('match (n:user) where n.responsible_for =~ \'^.*{}.*$\' return n'.format(bid))
+            result = self._graph.cypher.execute('MATCH (n:user)-[:ADMIN_OF]->(:business {bid: {bid}}) RETURN n',
+                                                {'bid': bid})
         except Exception as exc:
             logging.error(exc)
             raise DatabaseFindError
@@ -343,3 +617,112 @@ class Neo4jDatabase(GraphDatabaseBase):
 
         else:
             return [admin.n.properties for admin in result.records]
+
+    def is_business_admin(self, uid, bid):
+        try:
+            result = self._graph.cypher.execute('MATCH (:user {uid: {uid}})-[r:ADMIN_OF]->(:business {bid: {bid}}) '
+                                                'RETURN count(r) AS admins', {'uid': uid, 'bid': bid})
+        except Exception as exc:
+            logging.error(exc)
+            raise DatabaseFindError
+
+        return result.records[0].admins > 0
+
+    def add_business_admin(self, uid, bid):
+        try:
+            result = self._graph.cypher.execute('MATCH (u:user {uid: {uid}}), (b:business {bid: {bid}}) '
+                                                'MERGE (u)-[r:ADMIN_OF]->(b) ON CREATE SET r.timestamp = {timestamp} '
+                                                'RETURN u', {'uid': uid, 'bid': bid, 'timestamp': time.time()})
+        except Exception as exc:
+            logging.error(exc)
+            raise DocumentNotUpdated()
+
+        if len(result.records) < 1:
+            raise DatabaseRecordNotFound()
+
+        return dict(result.records[0].u.properties)
+
+    def remove_business_admin(self, uid, bid):
+        try:
+            result = self._graph.cypher.execute('MATCH (:user {uid: {uid}})-[r:ADMIN_OF]->(:business {bid: {bid}}) '
+                                                'DELETE r RETURN count(r) AS removed', {'uid': uid, 'bid': bid})
+        except Exception as exc:
+            logging.error(exc)
+            raise DocumentNotUpdated()
+
+        return result.records[0].removed
+
+    def find_users_with_responsibilities(self, limit=100):
+        try:
+            result = self._graph.cypher.execute('MATCH (u:user) WHERE has(u.responsible_for) '
+                                                'RETURN u.uid AS uid, u.responsible_for AS responsible_for '
+                                                'LIMIT {limit}', {'limit': limit})
+        except Exception as exc:
+            logging.error(exc)
+            raise DatabaseFindError()
+
+        return [{'uid': record.uid, 'responsible_for': record.responsible_for} for record in result.records]
+
+    def find_user_credentials(self, after_uid=None, limit=100):
+        """Returns uid, email and password of at most `limit` users ordered by uid, starting after `after_uid`."""
+        try:
+            result = self._graph.cypher.execute('MATCH (u:user) WHERE {after_uid} IS NULL OR u.uid > {after_uid} '
+                                                'RETURN u.uid AS uid, u.email AS email, u.password AS password '
+                                                'ORDER BY u.uid LIMIT {limit}', {'after_uid': after_uid, 'limit': limit})
+        except Exception as exc:
+            logging.error(exc)
+            raise DatabaseFindError()
+
+        return [{'uid': record.uid, 'email': record.email, 'password': record.password} for record in result.records]
+
+    def find_user_demographics(self, after_uid=None, limit=1000):
+        """Returns uid, gender and birth date of at most `limit` users ordered by uid, starting after `after_uid`."""
+        try:
+            result = self._graph.cypher.execute('MATCH (u:user) WHERE {after_uid} IS NULL OR u.uid > {after_uid} '
+                                                'RETURN u.uid AS uid, u.gender AS gender, u.birth_date AS birth_date '
+                                                'ORDER BY u.uid LIMIT {limit}', {'after_uid': after_uid, 'limit': limit})
+        except Exception as exc:
+            logging.error(exc)
+            raise DatabaseFindError()
+
+        return [{'uid': record.uid, 'gender': record.gender, 'birth_date': record.birth_date}
+                for record in result.records]
+
+    def find_checkin_summaries(self, after_rid=None, limit=1000):
+        """Returns the summaries of at most `limit` CHECK_IN relationships ordered by rid, starting after `after_rid`."""
+        try:
+            result = self._graph.cypher.execute('MATCH (u:user)-[c:CHECK_IN]->(b:business) '
+                                                'WHERE {after_rid} IS NULL OR c.rid > {after_rid} '
+                                                'RETURN c.rid AS rid, u.uid AS uid, b.bid AS bid, c.count AS count, '
+                                                'c.last AS last ORDER BY c.rid LIMIT {limit}',
+                                                {'after_rid': after_rid, 'limit': limit})
+        except Exception as exc:
+            logging.error(exc)
+            raise DatabaseFindError()
+
+        return [{'rid': record.rid, 'uid': record.uid, 'bid': record.bid, 'count': record.count, 'last': record.last}
+                for record in result.records]
+
+    def find_business_follows(self, after_fid=None, limit=1000):
+        """Returns at most `limit` FOLLOWS relationships of users to businesses ordered by fid, starting after
+        `after_fid`."""
+        try:
+            result = self._graph.cypher.execute('MATCH (u:user)-[f:FOLLOWS]->(b:business) '
+                                                'WHERE {after_fid} IS NULL OR f.fid > {after_fid} '
+                                                'RETURN f.fid AS fid, u.uid AS uid, b.bid AS bid '
+                                                'ORDER BY f.fid LIMIT {limit}', {'after_fid': after_fid, 'limit': limit})
+        except Exception as exc:
+            logging.error(exc)
+            raise DatabaseFindError()
+
+        return [{'fid': record.fid, 'uid': record.uid, 'bid': record.bid} for record in result.records]
+
+    def remove_responsibilities(self, uid):
+        try:
+            self._graph.cypher.execute('MATCH (u:user {uid: {uid}}) REMOVE u.responsible_for', {'uid': uid})
+        except Exception as exc:
+            logging.error(exc)
+            raise DocumentNotUpdated()
+        finally:
+            if self._node_cache is not None:
+                self._node_cache.invalidate(('user', uid))
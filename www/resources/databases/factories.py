@@ -1,9 +1,16 @@
 __author__ = 'Mepla'
 
+import os
 import logging
+import threading
+
+from py2neo import Graph, authenticate
+from pymongo import MongoClient
+from pymongo.monitoring import ConnectionPoolListener
 
 from www.resources.databases.database_drivers import Neo4jDatabase, MongoDatabase, DatabaseNotFound
 from www.resources.config import configs
+from www.resources.utilities.caching import LRUCache
 
 
 class Singleton(type):
@@ -15,39 +22,257 @@ class Singleton(type):
         return cls._instances[cls]
 
 
+class MongoPoolStats(ConnectionPoolListener):
+    """Counts connection pool events of a single MongoClient."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {'created': 0, 'closed': 0, 'checked_out': 0, 'checked_in': 0, 'check_out_failed': 0,
+                          'pool_cleared': 0}
+
+    def _increment(self, counter):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._increment('pool_cleared')
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._increment('created')
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._increment('closed')
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._increment('check_out_failed')
+
+    def connection_checked_out(self, event):
+        self._increment('checked_out')
+
+    def connection_checked_in(self, event):
+        self._increment('checked_in')
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self._counters)
+        stats['open'] = stats['created'] - stats['closed']
+        stats['in_use'] = stats['checked_out'] - stats['checked_in']
+        return stats
+
+
+class MongoConnectionRegistry(object):
+    """Process wide registry of pooled MongoClients and the drivers built on top of them.
+
+    One MongoClient is kept per (host, port) and one driver per (host, port, db). Clients are not fork safe, so
+    when the registry notices it is running in a new process it drops everything inherited from the parent and
+    lazily reconnects.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._clients = {}
+        self._pool_stats = {}
+        self._drivers = {}
+
+    def get_driver(self, host, port, db):
+        self._check_fork()
+        key = (host, port, db)
+        driver = self._drivers.get(key)
+        if driver:
+            return driver
+
+        with self._lock:
+            driver = self._drivers.get(key)
+            if not driver:
+                driver = MongoDatabase(host, port, db, mongo_client=self._get_client(host, port))
+                self._drivers[key] = driver
+                logging.info('Pooled mongo driver created for: {}'.format(key))
+        return driver
+
+    def _get_client(self, host, port):
+        client = self._clients.get((host, port))
+        if not client:
+            mongo_db_configs = configs.get('DATABASES').get('mongodb')
+            pool_stats = MongoPoolStats()
+            client = MongoClient(host, port,
+                                 maxPoolSize=mongo_db_configs.get('max_pool_size', 100),
+                                 minPoolSize=mongo_db_configs.get('min_pool_size', 0),
+                                 maxIdleTimeMS=mongo_db_configs.get('max_idle_time_ms'),
+                                 connectTimeoutMS=mongo_db_configs.get('connect_timeout_ms'),
+                                 socketTimeoutMS=mongo_db_configs.get('socket_timeout_ms'),
+                                 serverSelectionTimeoutMS=mongo_db_configs.get('server_selection_timeout_ms'),
+                                 waitQueueTimeoutMS=mongo_db_configs.get('wait_queue_timeout_ms'),
+                                 event_listeners=[pool_stats])
+            self._clients[(host, port)] = client
+            self._pool_stats[(host, port)] = pool_stats
+        return client
+
+    def _check_fork(self):
+        if self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid != os.getpid():
+                logging.info('Process fork detected, discarding mongo clients inherited from pid: {}'.format(self._pid))
+                self._clients = {}
+                self._pool_stats = {}
+                self._drivers = {}
+                self._pid = os.getpid()
+
+    def pool_stats(self):
+        self._check_fork()
+        stats = {}
+        for (host, port), pool_stats in self._pool_stats.items():
+            stats['{}:{}'.format(host, port)] = pool_stats.snapshot()
+        return stats
+
+    def close(self):
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients = {}
+            self._pool_stats = {}
+            self._drivers = {}
+
+
+class Neo4jConnectionRegistry(object):
+    """Process wide registry of authenticated py2neo Graphs.
+
+    Authentication and Graph construction happen once per (host, port, username) and process. py2neo keeps the
+    HTTP connections of a host alive and reuses them, so sharing one Graph keeps the number of open connections
+    bounded by the number of threads using it instead of growing with the number of requests. Drivers handed out
+    are cheap per-request wrappers around the shared Graph, each with its own identity map, and optionally sharing
+    a process wide node cache configured in configs['DATABASES']['neo4j']['node_cache'].
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._graphs = {}
+        self._stats = {'graphs_created': 0, 'drivers_created': 0}
+
+        neo4j_configs = configs.get('DATABASES').get('neo4j')
+        self._identity_map_size = neo4j_configs.get('identity_map_size', 1000)
+        node_cache_configs = neo4j_configs.get('node_cache') or {}
+        if node_cache_configs.get('enabled'):
+            self._node_cache = LRUCache(max_size=node_cache_configs.get('max_size', 10000),
+                                        ttl=node_cache_configs.get('ttl', 30))
+        else:
+            self._node_cache = None
+
+    def get_driver(self, host, port, username, password):
+        self._check_fork()
+        key = (host, port, username)
+        graph = self._graphs.get(key)
+        if not graph:
+            with self._lock:
+                graph = self._graphs.get(key)
+                if not graph:
+                    graph = self._connect(host, port, username, password)
+                    self._graphs[key] = graph
+                    self._stats['graphs_created'] += 1
+
+        self._stats['drivers_created'] += 1
+        return Neo4jDatabase(graph=graph, node_cache=self._node_cache, identity_map_size=self._identity_map_size)
+
+    @staticmethod
+    def _connect(host, port, username, password):
+        neo4j_configs = configs.get('DATABASES').get('neo4j')
+        socket_timeout = neo4j_configs.get('socket_timeout')
+        if socket_timeout:
+            try:
+                from py2neo.packages.httpstream import http
+                http.socket_timeout = socket_timeout
+            except ImportError:
+                logging.warning('Could not set neo4j socket timeout, httpstream is not available.')
+
+        neo4j_address = host + ':' + str(port)
+        authenticate(neo4j_address, username, password)
+        logging.info('Shared neo4j graph created for: {}'.format(neo4j_address))
+        return Graph('http://' + neo4j_address + '/db/data')
+
+    def _check_fork(self):
+        if self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid != os.getpid():
+                logging.info('Process fork detected, discarding neo4j graphs inherited from pid: {}'.format(self._pid))
+                self._graphs = {}
+                if self._node_cache is not None:
+                    self._node_cache.clear()
+                self._pid = os.getpid()
+
+    def pool_stats(self):
+        stats = dict(self._stats)
+        stats['graphs'] = len(self._graphs)
+        if self._node_cache is not None:
+            stats['node_cache'] = self._node_cache.stats()
+        return stats
+
+    def reset(self):
+        with self._lock:
+            self._graphs = {}
+            if self._node_cache is not None:
+                self._node_cache.clear()
+
+
 class DatabaseFactory(object):
     __metaclass__ = Singleton
 
     def __init__(self):
-        self._databases = []
+        self._mongo_registry = MongoConnectionRegistry()
+        self._neo4j_registry = Neo4jConnectionRegistry()
 
     def get_database_driver(self, db_type='document/docs'):
 
         logging.debug('A database driver is requested of type: {}'.format(db_type))
         if db_type == 'document/docs':
             mongo_db_configs = configs.get('DATABASES').get('mongodb')
-            mongo_db_instance = MongoDatabase(mongo_db_configs.get('host'), mongo_db_configs.get('port'), 'docs')
-            logging.debug('Database driver of type `{}` was created and returned: {}'.format(db_type, mongo_db_instance))
+            mongo_db_instance = self._mongo_registry.get_driver(mongo_db_configs.get('host'), mongo_db_configs.get('port'), 'docs')
+            logging.debug('Database driver of type `{}` was returned: {}'.format(db_type, mongo_db_instance))
             return mongo_db_instance
 
         if db_type == 'document/auth':
             mongo_db_configs = configs.get('DATABASES').get('mongodb')
-            mongo_db_instance = MongoDatabase(mongo_db_configs.get('host'), mongo_db_configs.get('port'), 'auth')
-            logging.debug('Database driver of type `{}` was created and returned: {}'.format(db_type, mongo_db_instance))
+            mongo_db_instance = self._mongo_registry.get_driver(mongo_db_configs.get('host'), mongo_db_configs.get('port'), 'auth')
+            logging.debug('Database driver of type `{}` was returned: {}'.format(db_type, mongo_db_instance))
             return mongo_db_instance
 
         if db_type == 'document/accounting':
             mongo_db_configs = configs.get('DATABASES').get('mongodb')
-            mongo_db_instance = MongoDatabase(mongo_db_configs.get('host'), mongo_db_configs.get('port'), 'accounting')
-            logging.debug('Database driver of type `{}` was created and returned: {}'.format(db_type, mongo_db_instance))
+            mongo_db_instance = self._mongo_registry.get_driver(mongo_db_configs.get('host'), mongo_db_configs.get('port'), 'accounting')
+            logging.debug('Database driver of type `{}` was returned: {}'.format(db_type, mongo_db_instance))
             return mongo_db_instance
 
         elif db_type == 'graph':
             neo4j_configs = configs.get('DATABASES').get('neo4j')
-            neo4j_instance = Neo4jDatabase(neo4j_configs.get('host'), neo4j_configs.get('port'),
-                                           neo4j_configs.get('username'), neo4j_configs.get('password'))
-            self._databases.append(neo4j_instance)
-            logging.debug('Database driver of type `{}` was created and returned: {}'.format(db_type, neo4j_instance))
+            neo4j_instance = self._neo4j_registry.get_driver(neo4j_configs.get('host'), neo4j_configs.get('port'),
+                                                             neo4j_configs.get('username'), neo4j_configs.get('password'))
+            logging.debug('Database driver of type `{}` was returned: {}'.format(db_type, neo4j_instance))
             return neo4j_instance
         else:
             raise DatabaseNotFound()
+
+    def mongo_pool_stats(self):
+        return self._mongo_registry.pool_stats()
+
+    def graph_pool_stats(self):
+        return self._neo4j_registry.pool_stats()
+
+    def close(self):
+        self._mongo_registry.close()
+        self._neo4j_registry.reset()
@@ -0,0 +1,133 @@
+__author__ = 'Mepla'
+
+import time
+import logging
+import datetime
+import threading
+
+from www.resources.config import configs
+from www.resources.databases.factories import DatabaseFactory
+from www.resources.databases.database_drivers import DatabaseEmptyResult
+from www.resources.utilities.caching import LRUCache
+
+
+class _Entry(object):
+    def __init__(self, promotions, active, loaded_at, expires_at):
+        self.promotions = promotions
+        self.active = active
+        self.loaded_at = loaded_at
+        self.expires_at = expires_at
+
+
+class ActivePromotionCache(object):
+    """The promotions of a business and the ones active today, cached per bid.
+
+    A promotion is active while today's date is after its `life_span.start_date` and before its `end_date`, the
+    same comparison of `YYYY-MM-DD` strings the database query did. The active set is loaded with its own query of
+    the promotions that have not ended yet, soonest start first, so old promotions never crowd active ones out of
+    the `max_promotions` loaded per business; a warning is logged when the cap is reached anyway.
+
+    The active set of a business can only change at the start of a day one of its promotions starts or ends at, so
+    an entry expires at the first such midnight, and at most `max_ttl` seconds after it was loaded to pick up
+    promotions changed by other processes. Creating or deleting a promotion in this process invalidates the entry
+    of its business right away.
+    """
+
+    def __init__(self, doc_db=None, max_size=1000, max_ttl=600, max_promotions=100):
+        self._doc_db = doc_db or DatabaseFactory().get_database_driver('document/docs')
+        self._cache = LRUCache(max_size=max_size)
+        self._max_ttl = max_ttl
+        self._max_promotions = max_promotions
+        self._lock = threading.Lock()
+        self._invalidations = 0
+        self._served = 0
+        self._served_age_total = 0.0
+        self._served_age_max = 0.0
+
+    def promotions(self, bid):
+        """All promotions of `bid`, at most `max_promotions` of them."""
+        return self._get(bid).promotions
+
+    def active_promotions(self, bid):
+        return self._get(bid).active
+
+    def invalidate(self, bid):
+        with self._lock:
+            self._invalidations += 1
+        self._cache.invalidate(bid)
+
+    def _get(self, bid):
+        entry = self._cache.get(bid)
+        now = time.time()
+        if entry is None:
+            entry = self._load(bid, now)
+            self._cache.set(bid, entry, ttl=entry.expires_at - now)
+
+        age = now - entry.loaded_at
+        with self._lock:
+            self._served += 1
+            self._served_age_total += age
+            self._served_age_max = max(self._served_age_max, age)
+        return entry
+
+    def _find(self, bid, conditions=None, sort_key=None):
+        try:
+            return list(self._doc_db.iter_docs('bid', bid, 'business_promotions', limit=self._max_promotions,
+                                               conditions=conditions, sort_key=sort_key))
+        except DatabaseEmptyResult:
+            return []
+
+    def _load(self, bid, now):
+        today = datetime.date.fromtimestamp(now)
+        promotions = self._find(bid)
+
+        # Active and upcoming promotions, everything the active set and its next boundary depend on.
+        current = self._find(bid, conditions={'life_span.end_date': {'$gt': today.strftime('%Y-%m-%d')}},
+                             sort_key='life_span.start_date')
+        if len(current) >= self._max_promotions:
+            logging.warning('Business {} has more than {} current promotions, only the ones starting first are '
+                            'served.'.format(bid, self._max_promotions))
+        active = [promotion for promotion in current if self.is_active(promotion, today.strftime('%Y-%m-%d'))]
+
+        expires_at = now + self._max_ttl
+        boundary = self.next_boundary(current, today)
+        if boundary is not None:
+            expires_at = min(expires_at, time.mktime(boundary.timetuple()))
+
+        return _Entry(promotions, active, now, expires_at)
+
+    @staticmethod
+    def is_active(promotion, today):
+        life_span = promotion.get('life_span') or {}
+        start_date, end_date = life_span.get('start_date'), life_span.get('end_date')
+        return bool(start_date and end_date) and start_date < today < end_date
+
+    @staticmethod
+    def next_boundary(promotions, today):
+        """The first date after `today` on which a promotion becomes active or inactive, `None` if there is none."""
+        boundaries = []
+        for promotion in promotions:
+            life_span = promotion.get('life_span') or {}
+            for key, offset in (('start_date', 1), ('end_date', 0)):
+                try:
+                    date = datetime.datetime.strptime(life_span.get(key), '%Y-%m-%d').date()
+                except (TypeError, ValueError):
+                    continue
+                date += datetime.timedelta(days=offset)
+                if date > today:
+                    boundaries.append(date)
+        return min(boundaries) if boundaries else None
+
+    def stats(self):
+        stats = self._cache.stats()
+        with self._lock:
+            stats.update({'invalidations': self._invalidations,
+                          'served_age_mean': self._served_age_total / self._served if self._served else 0.0,
+                          'served_age_max': self._served_age_max})
+        return stats
+
+
+promotion_cache_configs = configs.get('PROMOTIONS').get('active_cache')
+active_promotions = ActivePromotionCache(max_size=promotion_cache_configs.get('max_size'),
+                                         max_ttl=promotion_cache_configs.get('max_ttl'),
+                                         max_promotions=promotion_cache_configs.get('max_promotions'))
@@ -0,0 +1,121 @@
+__author__ = 'Mepla'
+
+import bisect
+import datetime
+import logging
+
+import pymongo
+
+from www.resources.databases.factories import DatabaseFactory
+from www.resources.databases.database_drivers import DatabaseEmptyResult
+
+
+class PromotionIndex(object):
+    """Reverse index of promotions by the users they can be eligible for.
+
+    Every promotion has one entry with its bid, its life span and buckets of its conditions: the gender it needs,
+    the age bands (decades) its age range touches and the check-in bucket its minimum number of check-ins falls in.
+    Promotions without a gender or age condition are in the `any` bucket. `find_candidates` selects the entries of a
+    user with a single indexed query; buckets are coarse, so candidates still have to be evaluated exactly, but no
+    promotion a user is eligible for is left out.
+    """
+
+    collection = 'promotion_index'
+    any_value = 'any'
+    age_band_size = 10
+    max_age = 120
+    checkin_buckets = [0, 1, 2, 5, 10, 20, 50, 100]
+    indexes = [([('pid', pymongo.ASCENDING)], {'unique': True}),
+               ([('bid', pymongo.ASCENDING), ('gender', pymongo.ASCENDING), ('age_bands', pymongo.ASCENDING)], {}),
+               ([('end_date', pymongo.ASCENDING)], {})]
+
+    def __init__(self, doc_db=None):
+        self._doc_db = doc_db or DatabaseFactory().get_database_driver('document/docs')
+
+    @classmethod
+    def checkin_bucket(cls, count):
+        return cls.checkin_buckets[bisect.bisect_right(cls.checkin_buckets, count or 0) - 1]
+
+    @classmethod
+    def age_band(cls, age):
+        return min(age, cls.max_age) // cls.age_band_size
+
+    @classmethod
+    def create_entry(cls, promotion):
+        conditions = promotion.get('conditions') or {}
+        life_span = promotion.get('life_span') or {}
+
+        age_condition = conditions.get('age') or {}
+        if age_condition.get('from') or age_condition.get('to'):
+            age_bands = range(cls.age_band(age_condition.get('from') or 0),
+                              cls.age_band(age_condition.get('to') or cls.max_age) + 1)
+        else:
+            age_bands = [cls.any_value]
+
+        checkins_condition = conditions.get('checkins') or {}
+        return {'pid': promotion.get('pid'), 'bid': promotion.get('bid'), 'version': promotion.get('version', 0),
+                'start_date': life_span.get('start_date'), 'end_date': life_span.get('end_date'),
+                'gender': conditions.get('gender') or cls.any_value,
+                'age_bands': age_bands,
+                'checkins_bucket': cls.checkin_bucket(checkins_condition.get('min')),
+                'must_follow': bool(conditions.get('must_follow') or checkins_condition.get('must_follow'))}
+
+    def add(self, promotion):
+        entry = self.create_entry(promotion)
+        self._doc_db.replace(self.collection, {'pid': entry['pid']}, entry, upsert=True)
+        return entry
+
+    def remove(self, pid):
+        return self._doc_db.delete(self.collection, {'pid': pid})
+
+    def find_candidates(self, context, today=None):
+        """Returns the entries of active promotions of the businesses the user of `context` follows or checked into
+        that the user may be eligible for. Raises `DatabaseEmptyResult` when there are none."""
+        related_bids = set(context.follows) | set(context.checkins.keys())
+        if not related_bids:
+            raise DatabaseEmptyResult()
+
+        bids_by_bucket = {}
+        for bid in related_bids:
+            key = (self.checkin_bucket(context.checkin_count(bid)), bid in context.follows)
+            bids_by_bucket.setdefault(key, []).append(bid)
+
+        clauses = []
+        for (bucket, follows), bids in bids_by_bucket.items():
+            clause = {'bid': {'$in': bids}, 'checkins_bucket': {'$lte': bucket}}
+            if not follows:
+                clause['must_follow'] = False
+            clauses.append(clause)
+
+        today = today or datetime.date.today().strftime('%Y-%m-%d')
+        genders = [self.any_value] + ([context.gender] if context.gender else [])
+        age_bands = [self.any_value] + ([self.age_band(context.age)] if context.age is not None else [])
+        conditions = {'$or': clauses, 'gender': {'$in': genders}, 'age_bands': {'$in': age_bands},
+                      'start_date': {'$lt': today}, 'end_date': {'$gt': today}}
+
+        return list(self._doc_db.iter_docs(None, None, self.collection, conditions=conditions))
+
+    def rebuild(self, batch_size=100):
+        """Writes the entries of all promotions that have not ended and removes the ones of ended promotions."""
+        today = datetime.date.today().strftime('%Y-%m-%d')
+        removed = self._doc_db.delete(self.collection, {'end_date': {'$lt': today}}, multiple=True)
+
+        try:
+            promotions = self._doc_db.iter_docs(None, None, 'business_promotions', batch_size=batch_size,
+                                                conditions={'life_span.end_date': {'$gte': today}})
+        except DatabaseEmptyResult:
+            promotions = []
+
+        indexed = 0
+        for promotion in promotions:
+            self.add(promotion)
+            indexed += 1
+            if indexed % batch_size == 0:
+                logging.info('Indexed {} promotions.'.format(indexed))
+
+        logging.info('Promotion index rebuilt: {} indexed, {} ended entries removed.'.format(indexed, removed))
+        return indexed
+
+    def ensure_indexes(self):
+        for keys, options in self.indexes:
+            self._doc_db.create_index(self.collection, keys, **options)
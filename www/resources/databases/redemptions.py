@@ -0,0 +1,141 @@
+__author__ = 'Mepla'
+
+import time
+import logging
+
+import pymongo
+
+from www.resources.databases.factories import DatabaseFactory
+from www.resources.databases.database_drivers import DatabaseRecordNotFound, DuplicateDocument, DatabaseFindError, \
+    DatabaseSaveError
+from www.resources.utilities.helpers import uuid_with_prefix, filter_general_document_db_record
+
+
+class RedemptionLimitReached(Exception):
+    pass
+
+
+class RedemptionStore(object):
+    """Redeem codes of promotions, with redemption limits kept by atomic counters.
+
+    A promotion may limit its redemptions in total (`limits.total`) and per user (`limits.per_user`). Each limit is a
+    counter doc that is only incremented while it is below the limit, in a single conditional `$inc` with upsert,
+    so concurrent redemptions can never exceed a limit: when the counter is at the limit the update matches no doc
+    and the upsert conflicts with the unique index of the counter. When a later step fails the counters taken so far
+    are given back, which may let a concurrent redemption near the limit fail, but never lets one exceed it.
+
+    Redemptions may carry an idempotency key chosen by the client. A retried redemption with the same key returns
+    the redeem code of the first one instead of redeeming again, a unique index on (uid, idempotency_key) decides
+    between concurrent retries.
+
+    Both rely on the unique indexes, without them an upsert could insert a second counter. `verify_indexes` creates
+    missing ones; it runs on startup and nothing is redeemed in a process before it succeeded.
+    """
+
+    codes_collection = 'redeem_codes'
+    promotion_counters_collection = 'promotion_redemptions'
+    user_counters_collection = 'user_redemptions'
+    indexes = [(codes_collection, [('uid', pymongo.ASCENDING), ('idempotency_key', pymongo.ASCENDING)],
+                {'unique': True, 'partialFilterExpression': {'idempotency_key': {'$exists': True}}}),
+               (promotion_counters_collection, [('pid', pymongo.ASCENDING)], {'unique': True}),
+               (user_counters_collection, [('pid', pymongo.ASCENDING), ('uid', pymongo.ASCENDING)], {'unique': True})]
+
+    indexes_verified = False
+
+    def __init__(self, doc_db=None):
+        self._doc_db = doc_db or DatabaseFactory().get_database_driver('document/docs')
+
+    def verify_indexes(self):
+        """Creates the unique indexes of `indexes` that are missing, returns whether they all exist."""
+        try:
+            for collection, keys, options in self.indexes:
+                existing = self._doc_db.index_information(collection).values()
+                if not any([tuple(key) for key in index['key']] == keys and index.get('unique') for index in existing):
+                    logging.warning('Creating missing redemption index on {}: {}'.format(collection, keys))
+                    self._doc_db.create_index(collection, keys, **options)
+        except (DatabaseFindError, DatabaseSaveError) as exc:
+            logging.error('Redemption indexes could not be verified, promotions can not be redeemed.')
+            return False
+
+        RedemptionStore.indexes_verified = True
+        return True
+
+    def find_by_idempotency_key(self, uid, idempotency_key):
+        """Returns the redeem code created with `idempotency_key`, raises `DatabaseRecordNotFound` if there is none."""
+        return filter_general_document_db_record(self._doc_db.find_doc(
+            None, None, self.codes_collection, conditions={'uid': uid, 'idempotency_key': idempotency_key}))
+
+    def redeem(self, promotion, uid, idempotency_key=None):
+        """Returns `(redeem_code_doc, created)`, `created` is `False` when `idempotency_key` was used before.
+
+        Raises `RedemptionLimitReached` when a limit of the promotion is reached and `DatabaseSaveError` or
+        `DocumentNotUpdated` when the redemption could not be saved or the indexes could not be verified.
+        """
+        if not RedemptionStore.indexes_verified and not self.verify_indexes():
+            raise DatabaseSaveError('Redemption indexes are missing.')
+
+        if idempotency_key:
+            try:
+                return self.find_by_idempotency_key(uid, idempotency_key), False
+            except DatabaseRecordNotFound:
+                pass
+
+        pid = promotion.get('pid')
+        limits = promotion.get('limits') or {}
+        taken = []
+
+        try:
+            self._take(self.user_counters_collection, {'pid': pid, 'uid': uid}, limits.get('per_user'),
+                       'You have reached the redemption limit of this promotion.')
+            taken.append((self.user_counters_collection, {'pid': pid, 'uid': uid}))
+
+            self._take(self.promotion_counters_collection, {'pid': pid}, limits.get('total'),
+                       'This promotion has reached its redemption limit.')
+            taken.append((self.promotion_counters_collection, {'pid': pid}))
+
+            redeem_code_doc = {'rcid': uuid_with_prefix('rcid'), 'pid': pid, 'bid': promotion.get('bid'), 'uid': uid,
+                               'timestamp': time.time()}
+            if idempotency_key:
+                redeem_code_doc['idempotency_key'] = idempotency_key
+            self._doc_db.save(redeem_code_doc, self.codes_collection)
+            return filter_general_document_db_record(redeem_code_doc), True
+
+        except DuplicateDocument:
+            self._give_back(taken)
+            if not idempotency_key:
+                raise
+            # A concurrent retry with the same idempotency key was saved first.
+            return self.find_by_idempotency_key(uid, idempotency_key), False
+
+        except Exception:
+            self._give_back(taken)
+            raise
+
+    def _take(self, collection, counter_key, limit, message):
+        conditions = dict(counter_key)
+        if limit is not None:
+            conditions['count'] = {'$lt': limit}
+
+        try:
+            self._doc_db.increment(collection, conditions, {'count': 1}, upsert=True)
+            return
+        except DatabaseRecordNotFound:
+            pass
+
+        # No counter below the limit matched, or the counter did not exist and a concurrent first redemption
+        # created it before our upsert could. The counter exists now, so without upsert only the limit can fail it.
+        try:
+            self._doc_db.increment(collection, conditions, {'count': 1})
+        except DatabaseRecordNotFound:
+            raise RedemptionLimitReached(message)
+
+    def _give_back(self, taken):
+        for collection, counter_key in taken:
+            try:
+                self._doc_db.increment(collection, counter_key, {'count': -1})
+            except Exception as exc:
+                logging.error('Could not give back redemption counter {} of {}: {}'.format(counter_key, collection, exc))
+
+    def ensure_indexes(self):
+        for collection, keys, options in self.indexes:
+            self._doc_db.create_index(collection, keys, **options)
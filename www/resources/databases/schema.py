@@ -0,0 +1,135 @@
+__author__ = 'Mepla'
+
+import logging
+
+import pymongo
+
+from www.resources.databases.factories import DatabaseFactory
+from www.resources.databases.checkin_events import CheckinEventStore
+from www.resources.databases.promotion_index import PromotionIndex
+from www.resources.databases.redemptions import RedemptionStore
+from www.resources.authentication.credentials import CredentialStore
+from www.resources.databases.database_drivers import DatabaseFindError, DatabaseSaveError
+from www.resources.utilities.pagination import KeysetPaginator
+
+
+# (collection, keys, options) of every index the hot lookups rely on, per document database.
+mongo_indexes = {
+    'document/auth': [
+        ('tokens', [('access_token', pymongo.ASCENDING)], {'unique': True, 'sparse': True}),
+        ('tokens', [('refresh_token', pymongo.ASCENDING)], {'unique': True, 'sparse': True}),
+        ('tokens', [('expires_at', pymongo.ASCENDING)], {'expireAfterSeconds': 0}),
+        ('clients', [('client_id', pymongo.ASCENDING)], {'unique': True}),
+        ('scopes', [('doc', pymongo.ASCENDING)], {'unique': True}),
+        ('revoked_tokens', [('jti', pymongo.ASCENDING)], {'unique': True}),
+        ('revoked_tokens', [('expires_at', pymongo.ASCENDING)], {}),
+    ] + [(CredentialStore.collection, keys, options) for keys, options in CredentialStore.indexes],
+    'document/docs': [
+        ('business_categories', [('bcid', pymongo.ASCENDING)], {'unique': True}),
+        ('business_promotions', [('pid', pymongo.ASCENDING)], {'unique': True}),
+        ('business_promotions', [('bid', pymongo.ASCENDING)], {}),
+        ('business_promotions', [('bid', pymongo.ASCENDING), ('life_span.end_date', pymongo.ASCENDING)], {}),
+        ('business_messages', [('mid', pymongo.ASCENDING)], {'unique': True}),
+        ('business_messages', KeysetPaginator.index_keys('mid'), {}),
+        ('business_reviews', [('rid', pymongo.ASCENDING)], {'unique': True}),
+        ('business_reviews', KeysetPaginator.index_keys('rid'), {}),
+        ('business_survey_results', [('srid', pymongo.ASCENDING)], {'unique': True}),
+        ('business_survey_results', KeysetPaginator.index_keys('srid'), {}),
+        ('business_survey_templates', [('stid', pymongo.ASCENDING)], {'unique': True}),
+        ('business_survey_templates', [('bid', pymongo.ASCENDING)], {}),
+        ('redeem_codes', [('rcid', pymongo.ASCENDING)], {'unique': True}),
+    ] + [(CheckinEventStore.collection, keys, {}) for keys in CheckinEventStore.indexes]
+      + [(PromotionIndex.collection, keys, options) for keys, options in PromotionIndex.indexes]
+      + RedemptionStore.indexes,
+    'document/accounting': [
+        ('balances', [('id', pymongo.ASCENDING)], {'unique': True}),
+        ('ptr_logs', [('transaction_id', pymongo.ASCENDING)], {}),
+    ],
+}
+
+# (label, property) pairs that must be unique, a uniqueness constraint is backed by an index.
+neo4j_uniqueness_constraints = [('user', 'uid'), ('user', 'email'), ('business', 'bid')]
+
+# (label, property) pairs that are looked up but are not unique.
+neo4j_indexes = [('user', 'udid')]
+
+
+def _has_mongo_index(index_information, keys):
+    for index in index_information.values():
+        if [tuple(key) for key in index['key']] == [tuple(key) for key in keys]:
+            return True
+    return False
+
+
+def ensure_schema():
+    """Creates every declared index and constraint that does not exist yet. Safe to run any number of times."""
+    database_factory = DatabaseFactory()
+
+    for db_type, indexes in mongo_indexes.items():
+        doc_db = database_factory.get_database_driver(db_type)
+        for collection, keys, options in indexes:
+            try:
+                doc_db.create_index(collection, keys, **options)
+            except DatabaseSaveError:
+                logging.error('Index could not be created on {}: {}'.format(collection, keys))
+
+    graph_db = database_factory.get_database_driver('graph')
+    for label, key in neo4j_uniqueness_constraints:
+        try:
+            if key not in graph_db.get_uniqueness_constraints(label):
+                graph_db.create_uniqueness_constraint(label, key)
+        except (DatabaseFindError, DatabaseSaveError):
+            logging.error('Uniqueness constraint could not be created on :{}({}).'.format(label, key))
+
+    for label, key in neo4j_indexes:
+        try:
+            if key not in graph_db.get_indexes(label):
+                graph_db.create_index(label, key)
+        except (DatabaseFindError, DatabaseSaveError):
+            logging.error('Index could not be created on :{}({}).'.format(label, key))
+
+
+def verify_schema():
+    """Reports declared indexes and constraints that are missing and collections that only have the `_id` index.
+
+    Returns a dict with `missing_mongo_indexes`, `missing_neo4j_schema` and `unindexed_collections`, all empty when
+    the databases are bootstrapped.
+    """
+    database_factory = DatabaseFactory()
+    report = {'missing_mongo_indexes': [], 'missing_neo4j_schema': [], 'unindexed_collections': []}
+
+    for db_type, indexes in mongo_indexes.items():
+        doc_db = database_factory.get_database_driver(db_type)
+        existing_collections = set(doc_db.collection_names())
+
+        for collection, keys, options in indexes:
+            if collection not in existing_collections or not _has_mongo_index(doc_db.index_information(collection), keys):
+                report['missing_mongo_indexes'].append({'database': db_type, 'collection': collection,
+                                                        'keys': [list(key) for key in keys]})
+
+        for collection in existing_collections:
+            if len(doc_db.index_information(collection)) < 2:
+                report['unindexed_collections'].append({'database': db_type, 'collection': collection})
+
+    graph_db = database_factory.get_database_driver('graph')
+    for label, key in neo4j_uniqueness_constraints:
+        if key not in graph_db.get_uniqueness_constraints(label):
+            report['missing_neo4j_schema'].append({'label': label, 'property': key, 'type': 'uniqueness_constraint'})
+
+    for label, key in neo4j_indexes:
+        if key not in graph_db.get_indexes(label):
+            report['missing_neo4j_schema'].append({'label': label, 'property': key, 'type': 'index'})
+
+    return report
+
+
+def log_schema_report(report):
+    for missing in report['missing_mongo_indexes']:
+        logging.warning('Missing mongo index on {}.{}: {}'.format(missing['database'], missing['collection'], missing['keys']))
+    for missing in report['missing_neo4j_schema']:
+        logging.warning('Missing neo4j {} on :{}({})'.format(missing['type'], missing['label'], missing['property']))
+    for unindexed in report['unindexed_collections']:
+        logging.warning('Collection is queried without an index: {}.{}'.format(unindexed['database'], unindexed['collection']))
+
+    if not any(report.values()):
+        logging.info('Database schema verified, all indexes and constraints exist.')
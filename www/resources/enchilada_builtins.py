@@ -65,7 +65,8 @@ class CheckedIn(BaseEntity):
         self.user_id = user_id
         self.business_id = business_id
         self.count = kwargs.get('count')
-        self.timestamps = kwargs.get('timestamps')
+        self.first = kwargs.get('first')
+        self.last = kwargs.get('last')
         self.referrer = kwargs.get('referrer')
         self.tokens = kwargs.get('tokens')
         self.loyalty = kwargs.get('loyalty')
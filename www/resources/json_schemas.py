@@ -58,6 +58,17 @@ login_schema = '''
 }
 '''
 
+refresh_token_schema = '''
+{
+    "type": "object",
+    "properties":{
+        "refresh_token":  { "type": "string" }
+    },
+    "additionalProperties": false,
+    "required": [ "refresh_token"]
+}
+'''
+
 business_signup_schema = '''
 {
     "type": "object",
@@ -226,6 +237,14 @@ create_promotion_schema = '''
                     }
                 }
             }
+        },
+        "limits": {
+            "type": "object",
+            "properties": {
+                "total": { "type": "integer", "minimum": 1 },
+                "per_user": { "type": "integer", "minimum": 1 }
+            },
+            "additionalProperties": false
         }
     },
     "additionalProperties": false,
@@ -233,6 +252,44 @@ create_promotion_schema = '''
 }
 '''
 
+audience_estimate_schema = '''
+{
+    "type": "object",
+    "properties":{
+        "conditions": {
+            "type": "object",
+            "properties": {
+                "gender":  { "type": "string" },
+                "must_follow":  { "type": "boolean" },
+                "age": {
+                    "type": "object",
+                    "properties": {
+                        "from": { "type": "integer" },
+                        "to": { "type": "integer" }
+                    }
+                },
+                "checkins": {
+                    "type": "object",
+                    "properties": {
+                        "min": { "type": "integer" },
+                        "max": { "type": "integer" },
+                        "days_since_last": { "type": "integer" }
+                    }
+                },
+                "special_conditions": {
+                    "type": "object",
+                    "properties": {
+                        "must_be_birthday": { "type": "boolean" }
+                    }
+                }
+            }
+        }
+    },
+    "additionalProperties": false,
+    "required": [ "conditions" ]
+}
+'''
+
 
 def validate_json(json_data, schema):
     try:
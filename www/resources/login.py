@@ -8,17 +8,19 @@ from flask import request, jsonify
 from flask_restful.reqparse import RequestParser
 from flask_restful import Resource
 
-from www.resources.databases.factories import DatabaseFactory
-from www.resources.databases.database_drivers import DatabaseFindError
-from www import oauth2
-from www.resources.authentication.password_management import PasswordManager
-from www.resources.authentication.oauth2 import ClientNotAuthorized, ClientDoesNotExist
-from www.resources.json_schemas import login_schema, validate_json, JsonValidationException
+from www.resources.config import configs
+from www.resources.databases.database_drivers import DatabaseFindError, DatabaseRecordNotFound, DatabaseSaveError, DocumentNotUpdated
+from www.resources.authentication.credentials import CredentialStore
+from www import oauth2, password_hasher
+from www.resources.utilities.workers import ExecutorOverloaded, ExecutorTimeout
+from www.resources.authentication.oauth2 import ClientNotAuthorized, ClientDoesNotExist, RefreshTokenNotValid
+from www.resources.json_schemas import login_schema, refresh_token_schema, validate_json, JsonValidationException
 
 
 class Login(Resource):
     def __init__(self):
-        pass
+        super(Login, self).__init__()
+        self.credential_store = CredentialStore(graph_fallback=configs.get('AUTH').get('credentials').get('graph_fallback'))
 
     def post(self):
         arg_parser = RequestParser()
@@ -69,24 +71,79 @@ class Login(Resource):
             username = data.get('username')
             password = data.get('password')
 
-            graph_db = DatabaseFactory().get_database_driver('graph')
             try:
-                existing_user = graph_db.find_single_user('email', username)
-            except DatabaseFindError as exc:
-                msg = {'message': 'Internal server error'}, 500
-                logging.error(msg)
+                credentials = self.credential_store.find(username)
+            except DatabaseRecordNotFound as exc:
+                msg = {'message': 'Your username and password combination is not correct.'}
+                return msg, 401
+            except (DatabaseFindError, DatabaseSaveError) as exc:
+                msg = {'message': 'Internal server error'}
+                logging.error('Could not read credentials of user: {}'.format(username))
                 return msg, 500
 
-            if existing_user:
-                if PasswordManager.compare_passwords(password, existing_user['password'], existing_user['uid'], existing_user['email']):
-                    access_token_response = oauth2.generate_access_token(existing_user['uid'], client_id, scope)
-                    return jsonify(access_token_response)
-                else:
-                    msg = {'message': 'Your username and password combination is not correct.'}
-                    return msg, 401
+            try:
+                matches, new_hash = password_hasher.verify_password(password, credentials['password'], credentials['uid'], credentials['email'])
+            except (ExecutorOverloaded, ExecutorTimeout) as exc:
+                msg = {'message': 'Server is busy, please try again later.'}
+                logging.error(msg)
+                return msg, 503, {'Retry-After': '1'}
+
+            if matches:
+                if new_hash:
+                    try:
+                        self.credential_store.update_password(credentials['uid'], credentials['email'], new_hash)
+                    except (DocumentNotUpdated, DatabaseSaveError) as exc:
+                        logging.error('Could not save rehashed password of user: {}'.format(credentials['uid']))
+
+                access_token_response = oauth2.generate_access_token(credentials['uid'], client_id, scope)
+                return jsonify(access_token_response)
             else:
                 msg = {'message': 'Your username and password combination is not correct.'}
                 return msg, 401
 
+        elif args['grant_type'] == 'refresh_token':
+            try:
+                authorization = request.headers.get('Authorization')
+                (auth_type, auth_base64) = authorization.split(' ')
+                (client_id, client_secret) = b64decode(auth_base64).split(':')
+            except Exception as exc:
+                msg = {'message': 'Your HTTP Authorization header must be set to Basic HTTP authentication of your client_id and client_secret.'}
+                logging.error(msg)
+                return msg, 401
+
+            try:
+                oauth2.client_id_check(client_id, client_secret)
+            except (ClientNotAuthorized, ClientDoesNotExist) as exc:
+                msg = {'message': 'You are not an authorized client.'}
+                logging.error(msg)
+                return msg, 401
+
+            try:
+                data = request.get_json(force=True, silent=False)
+                validate_json(data, refresh_token_schema)
+            except JsonValidationException as exc:
+                msg = {'message': exc.message}
+                logging.error(msg)
+                return msg, 400
+            except Exception as exc:
+                msg = {'msg': 'Your JSON is invalid.'}
+                logging.error(msg)
+                return msg, 400
+
+            try:
+                access_token_response = oauth2.refresh_access_token(data.get('refresh_token'), client_id)
+            except RefreshTokenNotValid as exc:
+                msg = {'message': 'Your refresh token is not valid, please login again.'}
+                logging.error('{} {}'.format(msg, exc.message))
+                return msg, 401
+            except DatabaseFindError as exc:
+                msg = {'message': 'Internal server error'}
+                logging.error('Could not read refresh token from database.')
+                return msg, 500
+
+            return jsonify(access_token_response)
+
         else:
-            pass
+            msg = {'message': 'Your \'grant_type\' must be either \'password\' or \'refresh_token\'.'}
+            logging.error(msg)
+            return msg, 400
@@ -0,0 +1,194 @@
+__author__ = 'Mepla'
+
+import time
+import datetime
+
+from www.resources.config import configs
+from www.resources.databases.factories import DatabaseFactory
+from www.resources.utilities.caching import LRUCache
+
+
+class UserContext(object):
+    """What eligibility depends on for one user, loaded once per request: the user profile, check-in summaries keyed
+    by bid, the bids the user follows and the evaluation time."""
+
+    def __init__(self, user, checkins, follows, now=None):
+        self.user = user
+        self.checkins = checkins
+        self.follows = follows
+        self.now = now or time.time()
+        self.today = datetime.datetime.fromtimestamp(self.now)
+        self.gender = user.get('gender')
+        self.birth_date = parse_birth_date(user.get('birth_date'))
+        self.age = get_age(self.birth_date, self.today) if self.birth_date else None
+        self.is_birthday = self.birth_date is not None and \
+            (self.birth_date.month, self.birth_date.day) == (self.today.month, self.today.day)
+
+    def checkin_count(self, bid):
+        checkin = self.checkins.get(bid)
+        return (checkin.get('count') or 0) if checkin else 0
+
+    def last_checkin(self, bid):
+        checkin = self.checkins.get(bid)
+        return checkin.get('last') if checkin else None
+
+
+class InvalidPromotionConditions(Exception):
+    pass
+
+
+class CompiledPromotion(object):
+    """The conditions of a promotion compiled to the checks they need, in the order they are evaluated.
+
+    Each check takes a `UserContext` and returns the reason the user is not eligible or `None`. Condition values are
+    bound when compiling, so evaluating a promotion only compares them with the values precomputed in the context.
+    """
+
+    def __init__(self, pid, bid, version, checks):
+        self.pid = pid
+        self.bid = bid
+        self.version = version
+        self._checks = checks
+
+    def evaluate(self, context):
+        reasons = []
+        for check in self._checks:
+            reason = check(context)
+            if reason and reason not in reasons:
+                reasons.append(reason)
+        return reasons
+
+
+def validate_promotion_conditions(conditions):
+    """Raises `InvalidPromotionConditions` for conditions no user can ever satisfy."""
+    age_condition = conditions.get('age') or {}
+    if age_condition.get('from') and age_condition.get('to') and age_condition.get('from') > age_condition.get('to'):
+        raise InvalidPromotionConditions('`conditions.age.from` must not be greater than `conditions.age.to`.')
+
+    checkins_condition = conditions.get('checkins') or {}
+    if checkins_condition.get('min') and checkins_condition.get('max') is not None and \
+            checkins_condition.get('min') > checkins_condition.get('max'):
+        raise InvalidPromotionConditions('`conditions.checkins.min` must not be greater than `conditions.checkins.max`.')
+
+
+def compile_promotion(promotion):
+    conditions = promotion.get('conditions') or {}
+    bid = promotion.get('bid')
+    checks = []
+
+    gender = conditions.get('gender')
+    if gender:
+        checks.append(lambda context: 'gender' if context.gender != gender else None)
+
+    age_condition = conditions.get('age') or {}
+    min_age, max_age = age_condition.get('from'), age_condition.get('to')
+    if min_age or max_age:
+        def check_age(context):
+            if context.age is None:
+                return 'birth_date_missing'
+            if min_age and context.age < min_age:
+                return 'age_below_minimum'
+            if max_age and context.age > max_age:
+                return 'age_above_maximum'
+        checks.append(check_age)
+
+    checkins_condition = conditions.get('checkins') or {}
+    min_checkins, max_checkins = checkins_condition.get('min'), checkins_condition.get('max')
+    if min_checkins:
+        checks.append(lambda context: 'checkins_below_minimum' if context.checkin_count(bid) < min_checkins else None)
+    if max_checkins is not None:
+        checks.append(lambda context: 'checkins_above_maximum' if context.checkin_count(bid) > max_checkins else None)
+
+    if checkins_condition.get('days_since_last'):
+        # Whole days since the last check-in are at least N exactly when N * 86400 seconds have passed.
+        min_seconds = checkins_condition.get('days_since_last') * 86400
+
+        def check_days_since_last(context):
+            last = context.last_checkin(bid)
+            if last is None:
+                return 'no_checkins'
+            if context.now - last < min_seconds:
+                return 'days_since_last_checkin'
+        checks.append(check_days_since_last)
+
+    # Older promotions have `must_follow` under `checkins`.
+    if conditions.get('must_follow') or checkins_condition.get('must_follow'):
+        checks.append(lambda context: 'must_follow' if bid not in context.follows else None)
+
+    if (conditions.get('special_conditions') or {}).get('must_be_birthday'):
+        def check_birthday(context):
+            if context.birth_date is None:
+                return 'birth_date_missing'
+            if not context.is_birthday:
+                return 'not_birthday'
+        checks.append(check_birthday)
+
+    return CompiledPromotion(promotion.get('pid'), bid, promotion.get('version', 0), checks)
+
+
+class PromotionPredicateCache(object):
+    """Compiled promotions keyed by pid. An entry is only used for the version of the promotion it was compiled
+    from, a promotion saved with a new version is compiled again on its next evaluation."""
+
+    def __init__(self, max_size=10000):
+        self._cache = LRUCache(max_size=max_size)
+
+    def get(self, promotion):
+        compiled = self._cache.get(promotion.get('pid'))
+        if compiled is None or compiled.version != promotion.get('version', 0):
+            compiled = self.set(promotion)
+        return compiled
+
+    def set(self, promotion):
+        compiled = compile_promotion(promotion)
+        self._cache.set(compiled.pid, compiled)
+        return compiled
+
+    def invalidate(self, pid):
+        self._cache.invalidate(pid)
+
+    def stats(self):
+        return self._cache.stats()
+
+
+promotion_predicates = PromotionPredicateCache(configs.get('PROMOTIONS').get('predicate_cache').get('max_size'))
+
+
+class EligibilityEngine(object):
+    """Evaluates promotion conditions for a user in memory.
+
+    `load_context` reads everything conditions can refer to in a single graph statement, after that any number of
+    promotions of any business are evaluated without database access, with their conditions compiled once and
+    shared through `promotion_predicates`. `evaluate` returns the reasons a user is not eligible, an empty list
+    means eligible.
+    """
+
+    def __init__(self, graph_db=None, predicate_cache=None):
+        self._graph_db = graph_db or DatabaseFactory().get_database_driver('graph')
+        self._predicate_cache = predicate_cache or promotion_predicates
+
+    def load_context(self, uid, now=None):
+        """Raises `DatabaseRecordNotFound` when the user does not exist and `DatabaseFindError` on errors."""
+        user, checkins, follows = self._graph_db.find_user_activity(uid)
+        return UserContext(user, checkins, follows, now)
+
+    def evaluate(self, promotion, context):
+        return self._predicate_cache.get(promotion).evaluate(context)
+
+    def evaluate_all(self, promotions, context):
+        """Returns `(promotion, reasons)` for each of `promotions`."""
+        return [(promotion, self.evaluate(promotion, context)) for promotion in promotions]
+
+
+def parse_birth_date(birth_date):
+    if not birth_date:
+        return None
+    try:
+        return datetime.datetime.strptime(birth_date, '%Y-%m-%d')
+    except ValueError:
+        return None
+
+
+def get_age(birth_date, today=None):
+    days_of_age = ((today or datetime.datetime.today()) - birth_date).days
+    return int(float(days_of_age) / 365)
@@ -9,11 +9,12 @@ from flask import request
 from flask_restful import Resource
 
 from www.resources.utilities.helpers import uuid_with_prefix
-from www import utils
-from www.resources.authentication import password_management as pm
+from www import utils, password_hasher
+from www.resources.utilities.workers import ExecutorOverloaded, ExecutorTimeout
 from www.resources.json_schemas import validate_json, JsonValidationException, signup_schema
 from www.resources.databases.factories import DatabaseFactory
-from www.resources.databases.database_drivers import DatabaseRecordNotFound
+from www.resources.databases.database_drivers import DatabaseRecordNotFound, DatabaseSaveError
+from www.resources.authentication.credentials import CredentialStore
 from www.resources.users import filter_user_info
 
 number_of_allowed_users_with_udid = 3
@@ -36,7 +37,7 @@ class SignUp(Resource):
 
         return self.sign_up_user(body)
 
-    def sign_up_user(self, body, additional_resposibilities=None):
+    def sign_up_user(self, body):
         try:
             validate_json(body, signup_schema)
             logging.debug('Client requested for sign up with payload: \n{}'.format(pprint.pformat(body)))
@@ -73,10 +74,18 @@ class SignUp(Resource):
 
         body['type'] = 'personal'
         body['uid'] = uuid_with_prefix('uid')
-        body['responsible_for'] = body['uid']
-        if additional_resposibilities and len(additional_resposibilities) > 0:
-            body['responsible_for'] += ' ' + ' '.join(additional_resposibilities)
-        hashed_password = pm.PasswordManager.hash_password(body['password'], body['uid'], body['email'])
-        body['password'] = hashed_password
+        try:
+            body['password'] = password_hasher.hash_password(body['password'], body['uid'], body['email'])
+        except (ExecutorOverloaded, ExecutorTimeout) as exc:
+            msg = {'message': 'Server is busy, please try again later.'}
+            logging.error(msg)
+            return msg, 503, {'Retry-After': '1'}
+
+        new_user = self.graph_db.create_new_user(**body)
+
+        try:
+            CredentialStore(graph_db=self.graph_db).save(CredentialStore.create_entry(body['uid'], email, body['password']))
+        except DatabaseSaveError as exc:
+            logging.error('Could not save credentials on sign up, login will rebuild them: uid: {}'.format(body['uid']))
 
-        return filter_user_info(self.graph_db.create_new_user(**body))
+        return filter_user_info(new_user)
@@ -0,0 +1,34 @@
+__author__ = 'Mepla'
+
+import logging
+
+from flask_restful import Resource
+
+from www.resources.databases.factories import DatabaseFactory
+from www.resources.databases.database_drivers import DatabaseFindError
+from www.resources.promotion_eligibility import promotion_predicates
+from www.resources.databases.promotion_cache import active_promotions
+from www.resources.databases.audience_snapshot import audience_estimator
+from www import oauth2, password_hasher
+
+
+class Status(Resource):
+    def get(self):
+        logging.debug('Client requested for service status.')
+        database_factory = DatabaseFactory()
+
+        try:
+            token_stats = oauth2.token_stats()
+        except DatabaseFindError as exc:
+            logging.error('Could not count tokens for service status.')
+            token_stats = None
+
+        return {'databases': {'mongodb': {'pools': database_factory.mongo_pool_stats()},
+                              'neo4j': {'pools': database_factory.graph_pool_stats()}},
+                'auth': {'tokens': token_stats,
+                         'token_cache': oauth2.token_cache_stats(),
+                         'client_registry': oauth2.client_registry_stats(),
+                         'password_hashing': password_hasher.stats()},
+                'promotions': {'predicate_cache': promotion_predicates.stats(),
+                               'active_cache': active_promotions.stats(),
+                               'audience_snapshot': audience_estimator.stats()}}
@@ -0,0 +1,49 @@
+__author__ = 'Mepla'
+
+import logging
+
+from flask_restful import Resource
+
+from www import oauth2
+from www.resources.databases.factories import DatabaseFactory
+from www.resources.databases.database_drivers import DatabaseFindError, DatabaseRecordNotFound, DatabaseEmptyResult
+from www.resources.databases.promotion_index import PromotionIndex
+from www.resources.promotion_eligibility import EligibilityEngine
+from www.resources.utilities.helpers import filter_general_document_db_record
+
+
+class UsersPromotions(Resource):
+    """Promotions a user is eligible for right now, of all the businesses they follow or checked into."""
+
+    def __init__(self):
+        super(UsersPromotions, self).__init__()
+        self.doc_db = DatabaseFactory().get_database_driver('document/docs')
+        self.promotion_index = PromotionIndex(self.doc_db)
+        self.eligibility_engine = EligibilityEngine()
+
+    @oauth2.check_access_token
+    def get(self, user_id, uid):
+        logging.debug('Client requested eligible promotions of user_id: {}'.format(user_id))
+
+        try:
+            context = self.eligibility_engine.load_context(user_id)
+            candidates = self.promotion_index.find_candidates(context)
+            promotions = self.doc_db.find_doc(None, None, 'business_promotions', limit=0,
+                                              conditions={'pid': {'$in': [entry['pid'] for entry in candidates]}})
+        except DatabaseRecordNotFound as exc:
+            msg = {'message': 'User does not exist.'}
+            logging.debug(msg)
+            return msg, 404
+        except DatabaseEmptyResult as exc:
+            return None, 204
+        except DatabaseFindError as exc:
+            msg = {'message': 'Internal server error.'}
+            logging.error('Error finding promotions of user: {}'.format(user_id))
+            return msg, 500
+
+        eligible_promotions = [promotion for promotion, reasons
+                               in self.eligibility_engine.evaluate_all(promotions, context) if not reasons]
+        if len(eligible_promotions) < 1:
+            return None, 204
+
+        return filter_general_document_db_record(eligible_promotions)
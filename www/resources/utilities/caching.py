@@ -0,0 +1,81 @@
+__author__ = 'Mepla'
+
+import time
+import threading
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """Thread safe, size bounded LRU cache with optional per entry time to live.
+
+    `ttl` is the default life time of an entry in seconds, `None` means entries only leave the cache when they are
+    evicted or invalidated. Hits, misses, evictions and expirations are counted for monitoring.
+    """
+
+    def __init__(self, max_size=1000, ttl=None):
+        assert max_size > 0, 'max_size > 0'
+        self._max_size = max_size
+        self._ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._expirations = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self._misses += 1
+                return default
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                self._expirations += 1
+                self._misses += 1
+                return default
+
+            self._entries[key] = entry
+            self._hits += 1
+            return value
+
+    def set(self, key, value, ttl=None):
+        if ttl is None:
+            ttl = self._ttl
+        expires_at = time.time() + ttl if ttl is not None else None
+
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (value, expires_at)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {'size': len(self._entries),
+                    'max_size': self._max_size,
+                    'hits': self._hits,
+                    'misses': self._misses,
+                    'hit_rate': float(self._hits) / lookups if lookups else 0.0,
+                    'evictions': self._evictions,
+                    'expirations': self._expirations}
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry is not None and (entry[1] is None or entry[1] > time.time())
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
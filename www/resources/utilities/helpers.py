@@ -1,8 +1,11 @@
 import uuid
 import re
+import json
 import datetime
 import pytz
 
+from flask import Response, stream_with_context
+
 
 __author__ = 'Mepla'
 
@@ -64,6 +67,17 @@ def filter_user_info(user_info):
         return return_list
 
 
+def stream_json_list(docs):
+    """Responds with a JSON array that is written while `docs` is being iterated."""
+    def generate():
+        yield '['
+        for index, doc in enumerate(docs):
+            yield (',' if index else '') + json.dumps(doc)
+        yield ']'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
 def uuid_with_prefix(prefix):
     if not prefix:
         prefix = ''
@@ -0,0 +1,102 @@
+__author__ = 'Mepla'
+
+import json
+import base64
+
+import pymongo
+from flask_restful.reqparse import RequestParser
+
+from www.resources.config import configs
+
+
+class InvalidPageArguments(Exception):
+    pass
+
+
+def encode_cursor(timestamp, doc_id):
+    return base64.urlsafe_b64encode(json.dumps([timestamp, doc_id]))
+
+
+def decode_cursor(cursor):
+    try:
+        timestamp, doc_id = json.loads(base64.urlsafe_b64decode(str(cursor)))
+        return float(timestamp), doc_id
+    except Exception as exc:
+        raise InvalidPageArguments('`cursor` argument is not a valid cursor.')
+
+
+class KeysetPaginator(object):
+    """Pages the docs of a business newest first, by (timestamp, id) instead of by offset.
+
+    Docs are sorted by `timestamp` and then by their unique `id_key`, so docs sharing a timestamp keep a stable order
+    and the cursor of a page (the position of its last doc) points at exactly one place. With the compound
+    (bid, timestamp, id_key) index from `index_keys`, every page is a single index range scan no matter how deep it
+    is. Cursors are opaque to clients, they only pass back the `next` cursor of the previous page.
+    """
+
+    def __init__(self, doc_db, doc_type, id_key, sort_key='timestamp'):
+        self._doc_db = doc_db
+        self._doc_type = doc_type
+        self._id_key = id_key
+        self._sort_key = sort_key
+
+    @staticmethod
+    def index_keys(id_key, sort_key='timestamp'):
+        return [('bid', pymongo.ASCENDING), (sort_key, pymongo.DESCENDING), (id_key, pymongo.DESCENDING)]
+
+    @staticmethod
+    def parse_args():
+        parser = RequestParser()
+        parser.add_argument('limit', type=int, help='`limit` argument must be an integer.')
+        parser.add_argument('cursor', type=str, help='`cursor` argument must be the `next` cursor of a page.')
+        parser.add_argument('before', type=float, help='`before` argument must be a timestamp (float).')
+        parser.add_argument('after', type=float, help='`after` argument must be a timestamp (float).')
+
+        args = parser.parse_args()
+
+        if args.get('before') and args.get('after') and args.get('before') < args.get('after'):
+            raise InvalidPageArguments('`before` argument must be greater than or equal to `after`.')
+
+        limit = args.get('limit')
+        max_limit = configs.get('DATABASES').get('mongodb').get('max_page_limit')
+        if not limit or limit > max_limit:
+            limit = max_limit
+
+        return limit, args.get('cursor'), args.get('before'), args.get('after')
+
+    def page(self, bid, limit, cursor=None, before=None, after=None):
+        """Returns the docs of the page and the cursor of the next page, which is `None` on the last page."""
+        conditions = {}
+
+        if before or after:
+            conditions[self._sort_key] = {}
+            if before:
+                conditions[self._sort_key]['$lt'] = before
+            if after:
+                conditions[self._sort_key]['$gt'] = after
+
+        if cursor:
+            timestamp, doc_id = decode_cursor(cursor)
+            conditions['$or'] = [{self._sort_key: {'$lt': timestamp}},
+                                 {self._sort_key: timestamp, self._id_key: {'$lt': doc_id}}]
+
+        sort = [(self._sort_key, pymongo.DESCENDING), (self._id_key, pymongo.DESCENDING)]
+        docs = list(self._doc_db.iter_docs('bid', bid, self._doc_type, limit=limit + 1, conditions=conditions,
+                                           sort_key=sort))
+
+        next_cursor = None
+        if len(docs) > limit:
+            docs = docs[:limit]
+            next_cursor = encode_cursor(docs[-1][self._sort_key], docs[-1][self._id_key])
+
+        return docs, next_cursor
+
+    def page_from_request(self, bid):
+        limit, cursor, before, after = self.parse_args()
+        return self.page(bid, limit, cursor, before, after)
+
+
+def paged_response(docs, next_cursor):
+    if next_cursor:
+        return docs, 200, {'X-Next-Cursor': next_cursor}
+    return docs, 200
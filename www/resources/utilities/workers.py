@@ -0,0 +1,171 @@
+__author__ = 'Mepla'
+
+import os
+import time
+import Queue
+import logging
+import threading
+from collections import deque
+
+
+class ExecutorOverloaded(Exception):
+    pass
+
+
+class ExecutorTimeout(Exception):
+    pass
+
+
+class _Task(object):
+    def __init__(self, func, args, kwargs):
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.enqueued_at = time.time()
+        self.done = threading.Event()
+        self.cancelled = False
+        self.result = None
+        self.exception = None
+
+
+class BoundedExecutor(object):
+    """A fixed number of worker threads fed by a bounded queue, for CPU heavy work that must not pile up.
+
+    `run` blocks the calling thread until its task is done, which keeps request handlers simple, but the work itself
+    is done by at most `workers` threads. When `max_queue_size` tasks are already waiting the task is rejected with
+    `ExecutorOverloaded` instead of being queued, and a task that waited `timeout` seconds without being finished
+    raises `ExecutorTimeout`; a task that times out before a worker picked it up is dropped. Queue and run times of
+    the last `sample_size` tasks are kept for monitoring.
+
+    The worker threads are started by the first `run`, not on construction, so creating an executor at import time
+    starts no threads. A process forked after that, like the workers of a pre-fork server, starts its own threads
+    and queue on its first `run` since threads do not survive a fork.
+    """
+
+    def __init__(self, name, workers=4, max_queue_size=64, timeout=5.0, sample_size=1000):
+        assert workers > 0, 'workers > 0'
+        self._name = name
+        self._timeout = timeout
+        self._workers_count = workers
+        self._queue = Queue.Queue(maxsize=max_queue_size)
+        self._lock = threading.Lock()
+        self._queue_times = deque(maxlen=sample_size)
+        self._run_times = deque(maxlen=sample_size)
+        self._completed = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._workers = []
+        self._pid = None
+
+    def _start_workers(self):
+        if self._pid == os.getpid():
+            return
+
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+
+            if self._pid is not None:
+                # Forked: the tasks queued in the parent have no waiter here and its workers did not survive.
+                self._queue = Queue.Queue(maxsize=self._queue.maxsize)
+            self._workers = []
+            for i in range(self._workers_count):
+                worker = threading.Thread(target=self._work, args=(self._queue,), name='{}-{}'.format(self._name, i))
+                worker.daemon = True
+                worker.start()
+                self._workers.append(worker)
+            self._pid = os.getpid()
+
+    def run(self, func, *args, **kwargs):
+        self._start_workers()
+        task = _Task(func, args, kwargs)
+        try:
+            self._queue.put_nowait(task)
+        except Queue.Full:
+            with self._lock:
+                self._rejected += 1
+            logging.warning('{} executor is overloaded, task rejected.'.format(self._name))
+            raise ExecutorOverloaded()
+
+        if not task.done.wait(self._timeout):
+            task.cancelled = True
+            with self._lock:
+                self._timed_out += 1
+            logging.warning('{} executor task timed out after {}s.'.format(self._name, self._timeout))
+            raise ExecutorTimeout()
+
+        if task.exception is not None:
+            raise task.exception
+        return task.result
+
+    def _work(self, queue):
+        while True:
+            task = queue.get()
+            if task.cancelled:
+                continue
+
+            started_at = time.time()
+            try:
+                task.result = task.func(*task.args, **task.kwargs)
+            except Exception as exc:
+                task.exception = exc
+            finished_at = time.time()
+
+            with self._lock:
+                self._completed += 1
+                self._queue_times.append(started_at - task.enqueued_at)
+                self._run_times.append(finished_at - started_at)
+            task.done.set()
+
+    @staticmethod
+    def _summary(samples):
+        if not samples:
+            return {'mean': 0.0, 'p50': 0.0, 'p95': 0.0, 'max': 0.0}
+        ordered = sorted(samples)
+        return {'mean': sum(ordered) / len(ordered),
+                'p50': ordered[int(len(ordered) * 0.50)],
+                'p95': ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)],
+                'max': ordered[-1]}
+
+    def stats(self):
+        with self._lock:
+            return {'workers': len(self._workers),
+                    'queued': self._queue.qsize(),
+                    'max_queue_size': self._queue.maxsize,
+                    'completed': self._completed,
+                    'rejected': self._rejected,
+                    'timed_out': self._timed_out,
+                    'queue_time': self._summary(self._queue_times),
+                    'run_time': self._summary(self._run_times)}
+
+
+class PeriodicTask(object):
+    """Runs `func` every `interval` seconds on a daemon thread until `stop` is called, the first time after
+    `initial_delay` seconds (`interval` by default). Exceptions are logged and do not end the task."""
+
+    def __init__(self, name, func, interval, initial_delay=None):
+        self._name = name
+        self._func = func
+        self._interval = interval
+        self._initial_delay = interval if initial_delay is None else initial_delay
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name=self._name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _loop(self):
+        delay = self._initial_delay
+        while not self._stopped.wait(delay):
+            try:
+                self._func()
+            except Exception as exc:
+                logging.error('Periodic task {} failed: {}'.format(self._name, exc))
+            delay = self._interval
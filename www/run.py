@@ -7,13 +7,46 @@ from resources.login import Login
 from resources.users import User, Users
 from www.resources.businesses import BusinessProfile, BusinessCategory, Businesses, BusinessAdmins, BusinessAdmin
 from www.resources.users_checkin import UsersCheckin
+from www.resources.users_promotions import UsersPromotions
 from www.resources.checkin import CheckIn
 from www.resources.business_surveys import BusinessSurveyResult, BusinessSurveyTemplate, BusinessSurveyResults, BusinessSurveyTemplates
 from www.resources.business_messages import BusinessMessage, BusinessMessages
 from www.resources.business_reveiws import BusinessReview, BusinessReviews
-from www.resources.business_promotions import BusinessPromotion, BusinessPromotions, EligiblePromotions, PromotionApply
+from www.resources.business_promotions import BusinessPromotion, BusinessPromotions, EligiblePromotions, PromotionApply, \
+    PromotionAudience
+from www.resources.databases.audience_snapshot import audience_estimator
 from www.resources.business_followers import BusinessFollowers
-from www import api, app
+from www.resources.status import Status
+from www.resources.databases.schema import verify_schema, log_schema_report
+from www.resources.databases.redemptions import RedemptionStore
+from www.resources.databases.database_drivers import DatabaseFindError
+from www.resources.utilities.workers import PeriodicTask
+from www.resources.config import configs
+from www import api, app, oauth2
+
+
+_background_tasks = []
+
+
+def start_background_tasks():
+    """Starts the periodic tasks of the serving process. Only the first call starts them, and `initialize_app`
+    does not call this so that the tests creating the app start no threads."""
+    if _background_tasks:
+        return
+
+    compaction_configs = configs.get('AUTH').get('token_compaction')
+    if compaction_configs.get('enabled'):
+        _background_tasks.append(PeriodicTask('token-compaction', oauth2.compact_tokens,
+                                              compaction_configs.get('interval')))
+
+    # Audience estimates are refused until the first snapshot exists, so it is built right away.
+    audience_configs = configs.get('PROMOTIONS').get('audience_snapshot')
+    if audience_configs.get('enabled'):
+        _background_tasks.append(PeriodicTask('audience-snapshot', audience_estimator.refresh,
+                                              audience_configs.get('refresh_interval'), initial_delay=0))
+
+    for task in _background_tasks:
+        task.start()
 
 
 def initialize_app():
@@ -23,6 +56,15 @@ def initialize_app():
     py2neo_logger = logging.getLogger('httpstream')
     py2neo_logger.setLevel(logging.CRITICAL)
 
+    if configs.get('verify_schema_on_startup'):
+        try:
+            log_schema_report(verify_schema())
+        except DatabaseFindError as exc:
+            logging.error('Could not verify database schema, run `python -m www.bootstrap --verify-only`.')
+
+    # Redemption limits and idempotency keys rely on unique indexes, so these are verified regardless of the above.
+    RedemptionStore().verify_indexes()
+
     api.add_resource(SignUp, '/signup')
     api.add_resource(Login, '/login')
     api.add_resource(BusinessProfile, '/businesses/<string:bid>')
@@ -30,6 +72,7 @@ def initialize_app():
     api.add_resource(Users, '/users')
     api.add_resource(User, '/users/<string:user_id>')
     api.add_resource(UsersCheckin, '/users/<string:user_id>/checkins')
+    api.add_resource(UsersPromotions, '/users/<string:user_id>/promotions')
     api.add_resource(BusinessCategory, '/businesses/categories')
     api.add_resource(BusinessSurveyResults, '/businesses/<string:bid>/surveys')
     api.add_resource(BusinessSurveyResult, '/businesses/<string:bid>/surveys/<string:survey_id>')
@@ -45,10 +88,14 @@ def initialize_app():
     api.add_resource(BusinessPromotions, '/businesses/<string:bid>/promotions')
     api.add_resource(BusinessPromotion, '/businesses/<string:bid>/promotions/<string:pid>')
     api.add_resource(EligiblePromotions, '/businesses/<string:bid>/promotions/eligible_for_me')
+    api.add_resource(PromotionAudience, '/businesses/<string:bid>/promotions/audience')
     api.add_resource(PromotionApply, '/businesses/<string:bid>/promotions/<string:pid>/apply')
 
     api.add_resource(BusinessFollowers, '/businesses/<string:bid>/followers')
 
+    api.add_resource(Status, '/status')
+
 if __name__ == '__main__':
     initialize_app()
+    start_background_tasks()
     app.run(host='0.0.0.0', debug=True, use_reloader=False)
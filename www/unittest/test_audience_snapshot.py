@@ -0,0 +1,57 @@
+__author__ = 'Mepla'
+
+import time
+import unittest
+
+from www.resources.databases.audience_snapshot import AudienceSnapshot
+from www.resources.promotion_eligibility import EligibilityEngine, UserContext, PromotionPredicateCache
+
+
+class AudienceSnapshotTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = time.mktime((2016, 5, 10, 12, 0, 0, 0, 0, -1))
+        self.users = [{'uid': 'uid1', 'gender': 'female', 'birth_date': '1990-05-10'},
+                      {'uid': 'uid2', 'gender': 'male', 'birth_date': '2000-01-01'},
+                      {'uid': 'uid3', 'gender': 'female', 'birth_date': '1970-12-31'},
+                      {'uid': 'uid4', 'gender': 'male'}]
+        self.checkins = [{'uid': 'uid1', 'bid': 'bid1', 'count': 3, 'last': self.now - 5 * 86400},
+                         {'uid': 'uid2', 'bid': 'bid1', 'count': 1, 'last': self.now - 40 * 86400},
+                         {'uid': 'uid3', 'bid': 'bid2', 'count': 7, 'last': self.now - 86400}]
+        self.follows = [{'uid': 'uid1', 'bid': 'bid1'}, {'uid': 'uid4', 'bid': 'bid1'}]
+        self.snapshot = AudienceSnapshot.build(self.users, self.checkins, self.follows)
+        self.engine = EligibilityEngine(graph_db=object(), predicate_cache=PromotionPredicateCache(max_size=10))
+
+    def _engine_count(self, bid, conditions):
+        promotion = {'pid': 'pid-{}'.format(sorted(conditions.items())), 'bid': bid, 'conditions': conditions}
+        count = 0
+        for user in self.users:
+            checkins = dict((checkin['bid'], {'count': checkin['count'], 'last': checkin['last']})
+                            for checkin in self.checkins if checkin['uid'] == user['uid'])
+            follows = set(follow['bid'] for follow in self.follows if follow['uid'] == user['uid'])
+            if not self.engine.evaluate(promotion, UserContext(user, checkins, follows, self.now)):
+                count += 1
+        return count
+
+    def test_counts_match_eligibility_engine(self):
+        for bid, conditions in [('bid1', {}),
+                                ('bid1', {'gender': 'female'}),
+                                ('bid1', {'gender': 'other'}),
+                                ('bid1', {'age': {'from': 18, 'to': 30}}),
+                                ('bid1', {'age': {'from': 26}}),
+                                ('bid1', {'checkins': {'min': 2}}),
+                                ('bid1', {'checkins': {'max': 2}}),
+                                ('bid1', {'checkins': {'days_since_last': 30}}),
+                                ('bid2', {'checkins': {'min': 1, 'must_follow': True}}),
+                                ('bid1', {'must_follow': True, 'gender': 'male'}),
+                                ('bid1', {'special_conditions': {'must_be_birthday': True}})]:
+            self.assertEqual(self.snapshot.count(bid, conditions, now=self.now), self._engine_count(bid, conditions),
+                             '{} {}'.format(bid, conditions))
+
+    def test_unknown_business(self):
+        self.assertEqual(self.snapshot.count('bid3', {'checkins': {'min': 1}}, now=self.now), 0)
+        self.assertEqual(self.snapshot.count('bid3', {'checkins': {'max': 0}}, now=self.now), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
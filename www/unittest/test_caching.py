@@ -0,0 +1,46 @@
+__author__ = 'Mepla'
+
+import time
+import unittest
+
+from www.resources.utilities.caching import LRUCache
+
+
+class LRUCacheTestCase(unittest.TestCase):
+
+    def test_least_recently_used_is_evicted(self):
+        cache = LRUCache(max_size=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+    def test_expired_entries_are_misses(self):
+        cache = LRUCache(max_size=10, ttl=0.01)
+        cache.set('a', 1)
+        cache.set('b', 2, ttl=60)
+        time.sleep(0.02)
+
+        self.assertEqual(cache.get('a', 'default'), 'default')
+        self.assertEqual(cache.get('b'), 2)
+        stats = cache.stats()
+        self.assertEqual(stats['expirations'], 1)
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+
+    def test_invalidate(self):
+        cache = LRUCache(max_size=10)
+        cache.set('a', 1)
+
+        self.assertTrue(cache.invalidate('a'))
+        self.assertFalse(cache.invalidate('a'))
+        self.assertNotIn('a', cache)
+
+
+if __name__ == '__main__':
+    unittest.main()
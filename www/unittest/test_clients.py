@@ -0,0 +1,51 @@
+__author__ = 'Mepla'
+
+import unittest
+
+from www.resources.authentication.clients import ClientRegistry
+
+
+class ClientRegistryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.loads = 0
+        self.clients = [{'client_id': 'c1', 'client_secret': 's1', 'scope': 'all read'}]
+        self.registry = ClientRegistry(self._load_clients, reload_interval=60, miss_reload_interval=60)
+
+    def _load_clients(self):
+        self.loads += 1
+        return [dict(client) for client in self.clients]
+
+    def test_scopes_are_parsed(self):
+        client = self.registry.get('c1')
+        self.assertEqual(client.client_secret, 's1')
+        self.assertEqual(client.scopes, frozenset(['all', 'read']))
+
+    def test_lookups_do_not_reload(self):
+        self.registry.get('c1')
+        self.registry.get('c1')
+        self.assertEqual(self.loads, 1)
+
+    def test_miss_reloads_once_per_interval(self):
+        self.registry.get('c1')
+        self.clients.append({'client_id': 'c2', 'client_secret': 's2', 'scope': 'read'})
+        self.registry._loaded_at -= 61
+        self.assertIsNotNone(self.registry.get('c2'))
+        self.assertIsNone(self.registry.get('c3'))
+        self.assertEqual(self.loads, 2)
+
+    def test_invalidate_reloads_changed_clients(self):
+        self.registry.get('c1')
+        self.clients[0]['client_secret'] = 's1b'
+        self.registry.invalidate()
+        self.assertEqual(self.registry.get('c1').client_secret, 's1b')
+        self.assertEqual(self.registry.stats()['rebuilds'], 2)
+
+    def test_stats_do_not_expose_secrets(self):
+        self.registry.get('c1')
+        self.assertNotIn('fingerprint', self.registry.stats())
+        self.assertNotIn('s1', str(self.registry.stats()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+__author__ = 'Mepla'
+
+import json
+import os
+import tempfile
+import unittest
+
+from www.resources.config import default_configs, load_configs
+
+
+class ConfigTestCase(unittest.TestCase):
+
+    def setUp(self):
+        handle, self.path = tempfile.mkstemp(suffix='.json')
+        with os.fdopen(handle, 'w') as config_file:
+            json.dump({'debug_mode': False, 'DATABASES': {'mongodb': {'host': 'db.example.com'}}}, config_file)
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_partial_config_keeps_defaults(self):
+        configs = load_configs(self.path)
+
+        self.assertFalse(configs['debug_mode'])
+        self.assertEqual(configs['DATABASES']['mongodb']['host'], 'db.example.com')
+        self.assertEqual(configs['DATABASES']['mongodb']['server_selection_timeout_ms'],
+                         default_configs['DATABASES']['mongodb']['server_selection_timeout_ms'])
+        self.assertEqual(configs['AUTH'], default_configs['AUTH'])
+
+    def test_defaults_are_not_modified(self):
+        load_configs(self.path)
+        self.assertTrue(default_configs['debug_mode'])
+
+    def test_missing_file_loads_defaults(self):
+        self.assertEqual(load_configs(self.path + '.missing'), default_configs)
+
+
+if __name__ == '__main__':
+    unittest.main()
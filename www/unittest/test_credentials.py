@@ -0,0 +1,77 @@
+__author__ = 'Mepla'
+
+import unittest
+
+from www.resources.authentication.credentials import CredentialStore
+from www.resources.databases.database_drivers import DatabaseRecordNotFound
+
+
+class CredentialsDatabase(object):
+    def __init__(self):
+        self.entries = {}
+        self.reads = 0
+
+    def find_doc(self, key, value, doc_type, **kwargs):
+        self.reads += 1
+        for entry in self.entries.values():
+            if entry.get(key) == value:
+                return dict(entry)
+        raise DatabaseRecordNotFound()
+
+    def replace(self, doc_type, conditions, doc, upsert=False):
+        self.entries[conditions['uid']] = doc
+
+
+class UsersGraphDatabase(object):
+    def __init__(self, users):
+        self.users = users
+        self.reads = 0
+
+    def find_single_user(self, key, value):
+        self.reads += 1
+        for user in self.users:
+            if user.get(key) == value:
+                return dict(user)
+        raise DatabaseRecordNotFound()
+
+    def update(self, doc):
+        for user in self.users:
+            if user['uid'] == doc['uid']:
+                user.update(doc)
+
+    def find_user_credentials(self, after_uid=None, limit=100):
+        users = sorted(self.users, key=lambda user: user['uid'])
+        return [dict(user) for user in users if after_uid is None or user['uid'] > after_uid][:limit]
+
+
+class CredentialStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.auth_db = CredentialsDatabase()
+        self.graph_db = UsersGraphDatabase([{'uid': 'uid1', 'email': 'a@b.c', 'password': 'hash1'},
+                                            {'uid': 'uid2', 'email': 'd@e.f', 'password': 'hash2'},
+                                            {'uid': 'uid3', 'email': 'g@h.i'}])
+        self.store = CredentialStore(self.auth_db, self.graph_db)
+
+    def test_missing_entry_is_rebuilt_from_graph(self):
+        self.assertEqual(self.store.find('a@b.c')['uid'], 'uid1')
+        self.assertEqual(self.store.find('a@b.c')['uid'], 'uid1')
+        self.assertEqual(self.graph_db.reads, 1)
+
+    def test_without_graph_fallback(self):
+        store = CredentialStore(self.auth_db, self.graph_db, graph_fallback=False)
+        self.assertRaises(DatabaseRecordNotFound, store.find, 'a@b.c')
+        self.assertEqual(self.graph_db.reads, 0)
+
+    def test_update_password(self):
+        self.store.update_password('uid1', 'a@b.c', 'hash1b')
+        self.assertEqual(self.store.find('a@b.c')['password'], 'hash1b')
+        self.assertEqual(self.graph_db.users[0]['password'], 'hash1b')
+
+    def test_rebuild_skips_users_without_credentials(self):
+        self.assertEqual(self.store.rebuild(batch_size=1), 2)
+        self.assertEqual(sorted(self.auth_db.entries), ['uid1', 'uid2'])
+
+
+if __name__ == '__main__':
+    unittest.main()
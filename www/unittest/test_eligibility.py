@@ -0,0 +1,60 @@
+__author__ = 'Mepla'
+
+import time
+import unittest
+
+from www.resources.utilities.helpers import uuid_with_prefix
+from www.resources.promotion_eligibility import EligibilityEngine, UserContext, PromotionPredicateCache, \
+    InvalidPromotionConditions, validate_promotion_conditions
+
+
+class EligibilityEngineTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.now = time.mktime((2016, 5, 10, 12, 0, 0, 0, 0, -1))
+        user = {'uid': 'uid1', 'gender': 'female', 'birth_date': '1990-05-10'}
+        checkins = {'bid1': {'count': 3, 'first': self.now - 30 * 86400, 'last': self.now - 5 * 86400}}
+        self.context = UserContext(user, checkins, set(['bid1']), self.now)
+        self.predicates = PromotionPredicateCache(max_size=10)
+        self.engine = EligibilityEngine(graph_db=object(), predicate_cache=self.predicates)
+
+    def _reasons(self, conditions, bid='bid1'):
+        promotion = {'pid': uuid_with_prefix('pid'), 'bid': bid, 'conditions': conditions}
+        return self.engine.evaluate(promotion, self.context)
+
+    def test_no_conditions_is_eligible(self):
+        self.assertEqual(self._reasons({}), [])
+
+    def test_demographics(self):
+        self.assertEqual(self._reasons({'gender': 'male'}), ['gender'])
+        self.assertEqual(self._reasons({'age': {'from': 18, 'to': 30}}), [])
+        self.assertEqual(self._reasons({'age': {'to': 20}}), ['age_above_maximum'])
+        self.assertEqual(self._reasons({'special_conditions': {'must_be_birthday': True}}), [])
+
+    def test_checkins(self):
+        self.assertEqual(self._reasons({'checkins': {'min': 2, 'max': 3, 'days_since_last': 5}}), [])
+        self.assertEqual(self._reasons({'checkins': {'max': 2}}), ['checkins_above_maximum'])
+        self.assertEqual(self._reasons({'checkins': {'min': 1, 'days_since_last': 1}}, 'bid2'),
+                         ['checkins_below_minimum', 'no_checkins'])
+
+    def test_must_follow(self):
+        self.assertEqual(self._reasons({'must_follow': True}), [])
+        self.assertEqual(self._reasons({'must_follow': True}, 'bid2'), ['must_follow'])
+        self.assertEqual(self._reasons({'checkins': {'must_follow': True}}, 'bid2'), ['must_follow'])
+
+    def test_compiled_once_per_version(self):
+        promotion = {'pid': 'pid1', 'bid': 'bid1', 'version': 1, 'conditions': {'gender': 'male'}}
+        self.assertEqual(self.engine.evaluate(promotion, self.context), ['gender'])
+        self.assertEqual(self.engine.evaluate(promotion, self.context), ['gender'])
+        self.assertEqual(self.predicates.stats()['hits'], 1)
+
+        changed = {'pid': 'pid1', 'bid': 'bid1', 'version': 2, 'conditions': {'gender': 'female'}}
+        self.assertEqual(self.engine.evaluate(changed, self.context), [])
+
+    def test_unsatisfiable_conditions_are_rejected(self):
+        self.assertRaises(InvalidPromotionConditions, validate_promotion_conditions, {'age': {'from': 30, 'to': 20}})
+        self.assertRaises(InvalidPromotionConditions, validate_promotion_conditions, {'checkins': {'min': 3, 'max': 2}})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+__author__ = 'Mepla'
+
+import unittest
+
+from www.resources.accounting.accountant import Accountant
+from www.resources.accounting.currency import BaseCurrency
+from www.resources.accounting.money import EchoGlobalPoint, BaseMoneyExchange
+from www.resources.accounting.point_transfer_reasons import PromotionPTR, PTRProcessException
+from www.resources.databases.database_drivers import DatabaseEmptyResult
+
+
+class FixedRateCurrency(BaseCurrency):
+    def convert_to(self, other_currency):
+        return 100
+
+
+class AccountingDatabase(object):
+    def __init__(self, balances):
+        self.balances = balances
+        self.logs = []
+        self.calls = []
+        self.concurrent_increments = 0
+        self.concurrent_currency = None
+        self.missed_increments = 0
+
+    def _matches(self, doc, conditions):
+        return all(doc.get(key) == value for key, value in conditions.items())
+
+    def iter_docs(self, key, value, doc_type, conditions=None, fields=None):
+        self.calls.append('iter_docs')
+        balances = [dict((field, balance[field]) for field in fields if field in balance)
+                    for balance in self.balances if balance['id'] in conditions['id']['$in']]
+        if not balances:
+            raise DatabaseEmptyResult()
+        return iter(balances)
+
+    def bulk_write(self, doc_type, inserts=None, increments=None, ordered=True):
+        self.calls.append('bulk_write')
+        self.logs.extend(inserts or [])
+        if increments and self.concurrent_increments:
+            # Another transaction increments the balance between our read and our increment.
+            self.concurrent_increments -= 1
+            self.balances[0]['balance'] += 1
+            self.balances[0]['version'] = self.balances[0].get('version', 0) + 1
+        if increments and self.concurrent_currency:
+            self.balances[0]['currency'], self.concurrent_currency = self.concurrent_currency, None
+
+        matched = 0
+        for conditions, amounts in increments or []:
+            if self.missed_increments:
+                # The increment misses although the currency of the balance did not change.
+                self.missed_increments -= 1
+                continue
+            for balance in self.balances:
+                if self._matches(balance, conditions):
+                    for field, amount in amounts.items():
+                        balance[field] = balance.get(field, 0) + amount
+                    matched += 1
+        return matched
+
+    def update_fields(self, doc_type, conditions, fields, multiple=False):
+        self.calls.append('update_fields')
+        logs = [log for log in self.logs if self._matches(log, conditions)]
+        for log in logs:
+            log.update(fields)
+        return len(logs)
+
+
+class LedgerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.acc_db = AccountingDatabase([{'id': 'uid1', 'currency': 'EGP', 'balance': 10},
+                                          {'id': 'uid2', 'currency': 'EGP', 'balance': 0, 'version': 4}])
+        self.accountant = Accountant()
+        self.accountant._db = self.acc_db
+
+    def _ptr(self, amount, creditor_id):
+        return PromotionPTR(EchoGlobalPoint(amount), 'bid1', 'bid1', creditor_id, 'pid1')
+
+    def test_transaction_is_written_in_bulk(self):
+        transaction = self.accountant.apply_ptrs([self._ptr(5, 'uid1'), self._ptr(3, 'uid1'), self._ptr(2, 'uid2')])
+
+        self.assertEqual(self.acc_db.calls, ['iter_docs', 'bulk_write', 'bulk_write', 'update_fields'])
+        self.assertEqual([(balance['balance'], balance['version']) for balance in self.acc_db.balances],
+                         [(18, 1), (2, 5)])
+        self.assertEqual(len(self.acc_db.logs), 6)
+        self.assertEqual(set(log['transaction_id'] for log in self.acc_db.logs), set([transaction.transaction_id]))
+        self.assertEqual([log['settled'] for log in self.acc_db.logs], [False, True] * 3)
+
+    def test_concurrent_credits_do_not_conflict(self):
+        self.acc_db.concurrent_increments = 2
+        self.accountant.apply_ptrs([self._ptr(5, 'uid1')])
+
+        self.assertEqual(self.acc_db.balances[0]['balance'], 16)
+        self.assertEqual(self.acc_db.balances[0]['version'], 2)
+        self.assertEqual(self.acc_db.calls, ['iter_docs', 'bulk_write', 'bulk_write', 'update_fields'])
+
+    def test_currency_change_is_retried(self):
+        self.acc_db.concurrent_currency = 'TST'
+        money = BaseMoneyExchange(FixedRateCurrency('TST'), 5)
+        self.accountant.apply_ptrs([PromotionPTR(money, 'bid1', 'bid1', 'uid1', 'pid1')])
+
+        self.assertEqual(self.acc_db.balances[0]['balance'], 15)
+        self.assertEqual(self.acc_db.calls, ['iter_docs', 'bulk_write', 'bulk_write', 'iter_docs', 'bulk_write',
+                                             'update_fields'])
+
+    def test_unexplained_miss_fails(self):
+        self.acc_db.missed_increments = 1
+        self.assertRaises(PTRProcessException, self.accountant.apply_ptrs, [self._ptr(5, 'uid1'), self._ptr(2, 'uid2')])
+
+        self.assertEqual(self.acc_db.calls, ['iter_docs', 'bulk_write', 'bulk_write', 'iter_docs'])
+        self.assertEqual([log['settled'] for log in self.acc_db.logs], [False] * 4)
+        self.assertTrue(all(log['settles_with_transaction'] for log in self.acc_db.logs[1::2]))
+
+    def test_missing_balance_fails_before_writing(self):
+        self.assertRaises(PTRProcessException, self.accountant.apply_ptrs, [self._ptr(5, 'uid3')])
+        self.assertEqual(self.acc_db.calls, ['iter_docs'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+__author__ = 'Mepla'
+
+import unittest
+
+from www.resources.utilities.pagination import KeysetPaginator, InvalidPageArguments, encode_cursor, decode_cursor
+
+
+class FakeDocumentDatabase(object):
+    def __init__(self, docs):
+        self.docs = docs
+        self.queries = []
+
+    def iter_docs(self, key, value, doc_type, limit=0, conditions=None, sort_key=None, **kwargs):
+        self.queries.append(conditions)
+        return iter(self.docs[:limit])
+
+
+class KeysetPaginatorTestCase(unittest.TestCase):
+
+    def test_cursor_round_trip(self):
+        self.assertEqual(decode_cursor(encode_cursor(1445000000.5, 'mid1')), (1445000000.5, 'mid1'))
+
+    def test_invalid_cursor(self):
+        self.assertRaises(InvalidPageArguments, decode_cursor, 'not a cursor')
+
+    def test_next_cursor_points_at_last_doc_of_page(self):
+        docs = [{'mid': 'mid3', 'timestamp': 3.0}, {'mid': 'mid2', 'timestamp': 2.0}, {'mid': 'mid1', 'timestamp': 2.0}]
+        doc_db = FakeDocumentDatabase(docs)
+        paginator = KeysetPaginator(doc_db, 'business_messages', 'mid')
+
+        page, next_cursor = paginator.page('bid1', 2)
+        self.assertEqual(page, docs[:2])
+        self.assertEqual(decode_cursor(next_cursor), (2.0, 'mid2'))
+
+        paginator.page('bid1', 2, cursor=next_cursor)
+        self.assertEqual(doc_db.queries[-1]['$or'], [{'timestamp': {'$lt': 2.0}},
+                                                     {'timestamp': 2.0, 'mid': {'$lt': 'mid2'}}])
+
+    def test_last_page_has_no_cursor(self):
+        paginator = KeysetPaginator(FakeDocumentDatabase([{'mid': 'mid1', 'timestamp': 1.0}]), 'business_messages', 'mid')
+        self.assertEqual(paginator.page('bid1', 2)[1], None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+__author__ = 'Mepla'
+
+import threading
+import unittest
+
+from www.resources.authentication.password_management import PasswordHasher, PasswordManager
+from www.resources.utilities.workers import BoundedExecutor, ExecutorOverloaded
+
+
+class PasswordHasherTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.versions = {'v2': {'algorithm': 'sha256', 'iterations': 1000, 'salt_bytes': 8}}
+        self.hasher = PasswordHasher(BoundedExecutor('test', workers=2), self.versions, 'v2')
+
+    def test_hash_and_verify(self):
+        hashed = self.hasher.hash_password('secret', 'uid1', 'a@b.c')
+        self.assertTrue(hashed.startswith('$v2$1000$'))
+        self.assertEqual(self.hasher.verify_password('secret', hashed, 'uid1', 'a@b.c'), (True, None))
+        self.assertEqual(self.hasher.verify_password('wrong', hashed, 'uid1', 'a@b.c'), (False, None))
+
+    def test_legacy_hash_is_rehashed(self):
+        legacy = PasswordManager.hash_password('secret', 'uid1', 'a@b.c')
+        matches, new_hash = self.hasher.verify_password('secret', legacy, 'uid1', 'a@b.c')
+        self.assertTrue(matches)
+        self.assertTrue(new_hash.startswith('$v2$1000$'))
+
+    def test_raised_iterations_rehash(self):
+        hashed = self.hasher.hash_password('secret', 'uid1', 'a@b.c')
+        self.versions['v2']['iterations'] = 2000
+        matches, new_hash = self.hasher.verify_password('secret', hashed, 'uid1', 'a@b.c')
+        self.assertTrue(matches)
+        self.assertTrue(new_hash.startswith('$v2$2000$'))
+
+
+class BoundedExecutorTestCase(unittest.TestCase):
+
+    def test_full_queue_rejects(self):
+        executor = BoundedExecutor('test', workers=1, max_queue_size=1, timeout=5)
+        release = threading.Event()
+        started = threading.Event()
+
+        def block():
+            started.set()
+            release.wait()
+
+        runner = threading.Thread(target=executor.run, args=(block,))
+        runner.start()
+        started.wait()
+        queued = threading.Thread(target=executor.run, args=(lambda: None,))
+        queued.start()
+        while executor.stats()['queued'] < 1:
+            pass
+
+        self.assertRaises(ExecutorOverloaded, executor.run, lambda: None)
+        release.set()
+        runner.join()
+        queued.join()
+        self.assertEqual(executor.stats()['completed'], 2)
+        self.assertEqual(executor.stats()['rejected'], 1)
+
+    def test_workers_start_on_first_run(self):
+        executor = BoundedExecutor('test', workers=2)
+        self.assertEqual(executor.stats()['workers'], 0)
+
+        self.assertEqual(executor.run(lambda: 1), 1)
+        self.assertEqual(executor.stats()['workers'], 2)
+
+        # A forked process does not have the threads of its parent and starts its own.
+        executor._pid = -1
+        self.assertEqual(executor.run(lambda: 2), 2)
+        self.assertEqual(executor.stats()['workers'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+__author__ = 'Mepla'
+
+import datetime
+import unittest
+
+from www.resources.databases.promotion_cache import ActivePromotionCache
+
+
+class PromotionsDocDatabase(object):
+    def __init__(self, promotions):
+        self.promotions = promotions
+        self.reads = 0
+
+    def iter_docs(self, key, value, doc_type, limit=0, conditions=None, sort_key=None):
+        self.reads += 1
+        promotions = [dict(promotion) for promotion in self.promotions if promotion[key] == value]
+        if conditions:
+            today = conditions['life_span.end_date']['$gt']
+            promotions = [promotion for promotion in promotions if promotion['life_span']['end_date'] > today]
+        if sort_key:
+            promotions.sort(key=lambda promotion: promotion['life_span']['start_date'])
+        return iter(promotions[:limit or None])
+
+
+class ActivePromotionCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.today = datetime.date.today()
+        self.doc_db = PromotionsDocDatabase([self._promotion('pid1', -10, 10), self._promotion('pid2', 2, 20),
+                                             self._promotion('pid3', -20, -1)])
+        self.cache = ActivePromotionCache(self.doc_db, max_ttl=3600)
+
+    def _promotion(self, pid, start_offset, end_offset):
+        start_date = self.today + datetime.timedelta(days=start_offset)
+        end_date = self.today + datetime.timedelta(days=end_offset)
+        return {'pid': pid, 'bid': 'bid1', 'life_span': {'start_date': start_date.strftime('%Y-%m-%d'),
+                                                         'end_date': end_date.strftime('%Y-%m-%d')}}
+
+    def test_active_promotions_are_cached(self):
+        self.assertEqual([promotion['pid'] for promotion in self.cache.active_promotions('bid1')], ['pid1'])
+        self.assertEqual(len(self.cache.promotions('bid1')), 3)
+        self.assertEqual(self.doc_db.reads, 2)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+
+    def test_next_boundary(self):
+        promotions = self.doc_db.promotions
+        self.assertEqual(ActivePromotionCache.next_boundary(promotions, self.today),
+                         self.today + datetime.timedelta(days=3))
+        self.assertIsNone(ActivePromotionCache.next_boundary(promotions[2:], self.today))
+
+    def test_invalidate(self):
+        self.cache.active_promotions('bid1')
+        self.doc_db.promotions.append(self._promotion('pid4', -1, 1))
+        self.cache.invalidate('bid1')
+        self.assertEqual(len(self.cache.active_promotions('bid1')), 2)
+        self.assertEqual(self.doc_db.reads, 4)
+
+    def test_old_promotions_do_not_hide_active_ones(self):
+        self.doc_db.promotions = [self._promotion('old{}'.format(i), -100 - i, -50) for i in range(5)]
+        self.doc_db.promotions.append(self._promotion('pid1', -10, 10))
+        cache = ActivePromotionCache(self.doc_db, max_promotions=3)
+
+        self.assertEqual([promotion['pid'] for promotion in cache.active_promotions('bid1')], ['pid1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
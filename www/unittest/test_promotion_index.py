@@ -0,0 +1,35 @@
+__author__ = 'Mepla'
+
+import unittest
+
+from www.resources.databases.promotion_index import PromotionIndex
+
+
+class PromotionIndexTestCase(unittest.TestCase):
+
+    def test_checkin_buckets_never_exceed_count(self):
+        for count in range(0, 150):
+            self.assertLessEqual(PromotionIndex.checkin_bucket(count), count)
+        self.assertEqual(PromotionIndex.checkin_bucket(None), 0)
+        self.assertEqual(PromotionIndex.checkin_bucket(7), 5)
+
+    def test_entry_buckets(self):
+        entry = PromotionIndex.create_entry({'pid': 'pid1', 'bid': 'bid1',
+                                             'life_span': {'start_date': '2016-01-01', 'end_date': '2016-12-31'},
+                                             'conditions': {'age': {'from': 18, 'to': 35},
+                                                            'checkins': {'min': 3, 'must_follow': True}}})
+        self.assertEqual(entry['gender'], PromotionIndex.any_value)
+        self.assertEqual(entry['age_bands'], [1, 2, 3])
+        self.assertEqual(entry['checkins_bucket'], 2)
+        self.assertTrue(entry['must_follow'])
+
+    def test_open_entry(self):
+        entry = PromotionIndex.create_entry({'pid': 'pid1', 'bid': 'bid1', 'conditions': {'gender': 'female'}})
+        self.assertEqual(entry['gender'], 'female')
+        self.assertEqual(entry['age_bands'], [PromotionIndex.any_value])
+        self.assertEqual(entry['checkins_bucket'], 0)
+        self.assertFalse(entry['must_follow'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+__author__ = 'Mepla'
+
+import unittest
+
+from www.resources.databases.redemptions import RedemptionStore, RedemptionLimitReached
+from www.resources.databases.database_drivers import DatabaseRecordNotFound, DuplicateDocument
+
+
+class RedemptionsDatabase(object):
+    def __init__(self):
+        self.collections = {}
+        self.index_information_calls = 0
+        self.created_indexes = []
+        self.concurrent_upserts = 0
+        self.duplicate_codes = False
+
+    def index_information(self, doc_type):
+        self.index_information_calls += 1
+        return {}
+
+    def create_index(self, doc_type, keys, **kwargs):
+        self.created_indexes.append((doc_type, keys))
+
+    def _find(self, doc_type, conditions):
+        for doc in self.collections.setdefault(doc_type, []):
+            if all(doc.get(key) < value['$lt'] if isinstance(value, dict) else doc.get(key) == value
+                   for key, value in conditions.items()):
+                return doc
+
+    def increment(self, doc_type, conditions, increments, upsert=False):
+        doc = self._find(doc_type, conditions)
+        if doc is None and upsert and self.concurrent_upserts:
+            # A concurrent first redemption inserts the counter, our upsert hits the unique index.
+            self.concurrent_upserts -= 1
+            counter_key = dict((key, value) for key, value in conditions.items() if not isinstance(value, dict))
+            self.collections[doc_type].append(dict(counter_key, count=1))
+            raise DatabaseRecordNotFound()
+        if doc is None and upsert:
+            doc = dict((key, value) for key, value in conditions.items() if not isinstance(value, dict))
+            if self._find(doc_type, doc) is not None:
+                # The counter exists at its limit, the upsert would violate the unique index.
+                raise DatabaseRecordNotFound()
+            doc['count'] = 0
+            self.collections[doc_type].append(doc)
+        if doc is None:
+            raise DatabaseRecordNotFound()
+        doc['count'] += increments['count']
+        return dict(doc)
+
+    def save(self, doc, doc_type, multiple=False):
+        if self.duplicate_codes:
+            raise DuplicateDocument()
+        self.collections.setdefault(doc_type, []).append(doc)
+
+    def find_doc(self, key, value, doc_type, conditions=None, **kwargs):
+        doc = self._find(doc_type, conditions)
+        if doc is None:
+            raise DatabaseRecordNotFound()
+        return dict(doc)
+
+
+class RedemptionStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        RedemptionStore.indexes_verified = False
+        self.doc_db = RedemptionsDatabase()
+        self.store = RedemptionStore(self.doc_db)
+        self.promotion = {'pid': 'pid1', 'bid': 'bid1', 'limits': {'total': 2, 'per_user': 1}}
+
+    def tearDown(self):
+        RedemptionStore.indexes_verified = False
+
+    def test_limits(self):
+        self.assertTrue(self.store.redeem(self.promotion, 'uid1')[1])
+        self.assertRaises(RedemptionLimitReached, self.store.redeem, self.promotion, 'uid1')
+        self.store.redeem(self.promotion, 'uid2')
+        self.assertRaises(RedemptionLimitReached, self.store.redeem, self.promotion, 'uid3')
+
+    def test_concurrent_first_redemption_is_not_a_limit(self):
+        self.doc_db.concurrent_upserts = 1
+        redeem_code_doc, created = self.store.redeem({'pid': 'pid1', 'bid': 'bid1', 'limits': {'per_user': 3}}, 'uid1')
+        self.assertTrue(created)
+        self.assertEqual(self.doc_db._find('user_redemptions', {'pid': 'pid1', 'uid': 'uid1'})['count'], 2)
+
+    def test_idempotency_key(self):
+        first, created = self.store.redeem(self.promotion, 'uid1', 'key1')
+        again, created_again = self.store.redeem(self.promotion, 'uid1', 'key1')
+        self.assertEqual((first['rcid'], created, created_again), (again['rcid'], True, False))
+
+    def test_duplicate_code_without_idempotency_key_is_raised(self):
+        self.doc_db.duplicate_codes = True
+        self.assertRaises(DuplicateDocument, self.store.redeem, self.promotion, 'uid1')
+        self.assertEqual(self.doc_db._find('user_redemptions', {'pid': 'pid1', 'uid': 'uid1'})['count'], 0)
+
+    def test_missing_indexes_are_created_once(self):
+        self.store.redeem(self.promotion, 'uid1')
+        self.store.redeem(self.promotion, 'uid2')
+        self.assertEqual(len(self.doc_db.created_indexes), len(RedemptionStore.indexes))
+        self.assertEqual(self.doc_db.index_information_calls, len(RedemptionStore.indexes))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+__author__ = 'Mepla'
+
+import unittest
+
+from www.resources.authentication.scopes import ScopeMatcher
+
+
+class ScopeMatcherTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.loads = 0
+        self.scopes = {'all': ['get /users/{self}$', 'get /users/{self}/checkins', 'post /businesses/.*/checkins'],
+                       'read': ['get /businesses/.*']}
+        self.matcher = ScopeMatcher(self._load_scopes, reload_interval=60)
+
+    def _load_scopes(self):
+        self.loads += 1
+        return self.scopes
+
+    def test_self_is_bound_to_uid(self):
+        self.assertTrue(self.matcher.is_allowed('all', 'get /users/uid1/checkins', 'uid1'))
+        self.assertFalse(self.matcher.is_allowed('all', 'get /users/uid2/checkins', 'uid1'))
+        self.assertFalse(self.matcher.is_allowed('all', 'get /users/uid1/followers', 'uid1'))
+
+    def test_routes_are_matched_per_method(self):
+        self.assertTrue(self.matcher.is_allowed('all', 'post /businesses/bid1/checkins', 'uid1'))
+        self.assertFalse(self.matcher.is_allowed('all', 'get /businesses/bid1/checkins', 'uid1'))
+
+    def test_any_of_several_scopes(self):
+        self.assertTrue(self.matcher.is_allowed('all read', 'get /businesses/bid1/checkins', 'uid1'))
+        self.assertFalse(self.matcher.is_allowed('unknown', 'get /businesses/bid1/checkins', 'uid1'))
+
+    def test_definitions_are_loaded_once_per_interval(self):
+        self.matcher.is_allowed('all', 'get /users/uid1', 'uid1')
+        self.matcher.is_allowed('all', 'get /users/uid1', 'uid1')
+        self.assertEqual(self.loads, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+__author__ = 'Mepla'
+
+import time
+import unittest
+
+from www.resources.config import configs
+from www.resources.authentication.oauth2 import OAuth2Provider, SigningKeyMissing
+from www.resources.authentication.signed_tokens import SignedTokenCodec, RevocationList, InvalidSignedToken
+from www.resources.databases.database_drivers import DatabaseEmptyResult, DatabaseRecordNotFound
+
+
+class FakeDocumentDatabase(object):
+    def __init__(self):
+        self.docs = []
+
+    def save(self, doc, doc_type, multiple=False):
+        self.docs.append(doc)
+
+    def find_doc(self, key, value, doc_type, limit=1, conditions=None, **kwargs):
+        if key:
+            raise DatabaseRecordNotFound()
+        docs = [doc for doc in self.docs if doc['expires_at'] > conditions['expires_at']['$gt']]
+        if not docs:
+            raise DatabaseEmptyResult()
+        return docs
+
+
+class SignedTokenCodecTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.codec = SignedTokenCodec('test-key')
+
+    def test_round_trip(self):
+        token, claims = self.codec.encode('uid1', 'client1', 'all', 3600)
+
+        self.assertTrue(SignedTokenCodec.is_signed(token))
+        decoded = self.codec.decode(token)
+        self.assertEqual(decoded, claims)
+        self.assertEqual((decoded['uid'], decoded['client_id'], decoded['scope']), ('uid1', 'client1', 'all'))
+
+    def test_tampered_token_is_rejected(self):
+        token, claims = self.codec.encode('uid1', 'client1', 'all', 3600)
+        forged, forged_claims = self.codec.encode('uid2', 'client1', 'all', 3600)
+        payload = forged.rsplit('.', 1)[0]
+        signature = token.rsplit('.', 1)[1]
+
+        self.assertRaises(InvalidSignedToken, self.codec.decode, payload + '.' + signature)
+        self.assertRaises(InvalidSignedToken, SignedTokenCodec('other-key').decode, token)
+        self.assertRaises(InvalidSignedToken, self.codec.decode, 'st.garbage')
+
+
+class RevocationListTestCase(unittest.TestCase):
+
+    def test_revocations_are_shared_through_database(self):
+        doc_db = FakeDocumentDatabase()
+        RevocationList(doc_db).revoke('jti1', time.time() + 60)
+        RevocationList(doc_db).revoke('jti2', time.time() - 60)
+
+        revocation_list = RevocationList(doc_db)
+        self.assertTrue(revocation_list.is_revoked('jti1'))
+        self.assertFalse(revocation_list.is_revoked('jti2'))
+        self.assertFalse(revocation_list.is_revoked('jti3'))
+
+
+class TokenModeTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.auth_configs = dict(configs['AUTH'])
+
+    def tearDown(self):
+        configs['AUTH'] = self.auth_configs
+
+    def test_signed_tokens_are_rejected_in_opaque_mode(self):
+        configs['AUTH'] = dict(self.auth_configs, token_mode='opaque', signing_key='test-key')
+        provider = OAuth2Provider(FakeDocumentDatabase())
+        token, claims = SignedTokenCodec('test-key').encode('uid1', 'client1', 'all', 3600)
+
+        self.assertRaises(DatabaseRecordNotFound, provider.find_access_token, token)
+
+    def test_signed_mode_needs_a_signing_key(self):
+        configs['AUTH'] = dict(self.auth_configs, token_mode='signed', signing_key=None)
+        self.assertRaises(SigningKeyMissing, OAuth2Provider, FakeDocumentDatabase())
+
+        configs['AUTH'] = dict(self.auth_configs, token_mode='signed', signing_key='test-key')
+        token, claims = SignedTokenCodec('test-key').encode('uid1', 'client1', 'all', 3600)
+        self.assertEqual(OAuth2Provider(FakeDocumentDatabase()).find_access_token(token), claims)
+
+
+if __name__ == '__main__':
+    unittest.main()
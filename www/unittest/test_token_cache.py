@@ -0,0 +1,58 @@
+__author__ = 'Mepla'
+
+import time
+import unittest
+
+from www.resources.authentication.oauth2 import OAuth2Provider
+from www.resources.databases.database_drivers import DatabaseRecordNotFound
+
+
+class TokensDatabase(object):
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.reads = 0
+
+    def find_doc(self, key, value, doc_type, limit=1, conditions=None, **kwargs):
+        self.reads += 1
+        for token in self.tokens:
+            if token.get(key) == value:
+                return dict(token)
+        raise DatabaseRecordNotFound()
+
+    def delete(self, doc_type, conditions, multiple=False):
+        before = len(self.tokens)
+        self.tokens = [token for token in self.tokens if token.get('access_token') != conditions['access_token']]
+        return before - len(self.tokens)
+
+
+class TokenCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        now = time.time()
+        self.auth_db = TokensDatabase([
+            {'access_token': 'at1', 'uid': 'uid1', 'client_id': 'client1', 'issue_date': now, 'expires_in': 3600},
+            {'access_token': 'at2', 'uid': 'uid1', 'client_id': 'client1', 'issue_date': now - 60, 'expires_in': 30}])
+        self.provider = OAuth2Provider(auth_db=self.auth_db)
+
+    def test_valid_token_is_read_once(self):
+        self.assertEqual(self.provider.find_access_token('at1')['uid'], 'uid1')
+        self.assertEqual(self.provider.find_access_token('at1')['uid'], 'uid1')
+        self.assertEqual(self.auth_db.reads, 1)
+        self.assertEqual(self.provider.token_cache_stats()['hits'], 1)
+
+    def test_expired_token_is_not_cached(self):
+        self.provider.find_access_token('at2')
+        self.provider.find_access_token('at2')
+        self.assertEqual(self.auth_db.reads, 2)
+
+    def test_unknown_token(self):
+        self.assertRaises(DatabaseRecordNotFound, self.provider.find_access_token, 'at3')
+
+    def test_revoked_token_is_dropped_from_cache(self):
+        self.provider.find_access_token('at1')
+        self.provider.revoke_access_token('at1')
+        self.assertRaises(DatabaseRecordNotFound, self.provider.find_access_token, 'at1')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+__author__ = 'Mepla'
+
+import time
+import unittest
+from datetime import datetime
+
+from www.resources.authentication.oauth2 import OAuth2Provider, RefreshTokenNotValid
+from www.resources.databases.database_drivers import DatabaseRecordNotFound, DatabaseEmptyResult
+
+
+def _matches(doc, conditions):
+    for key, condition in conditions.items():
+        value = doc.get(key)
+        if not isinstance(condition, dict):
+            if value != condition:
+                return False
+            continue
+        for operator, operand in condition.items():
+            if operator == '$exists' and (key in doc) != operand:
+                return False
+            if operator == '$lt' and not (value is not None and value < operand):
+                return False
+            if operator == '$lte' and not (value is not None and value <= operand):
+                return False
+            if operator == '$gt' and not (value is not None and value > operand):
+                return False
+    return True
+
+
+class AuthDatabase(object):
+    def __init__(self):
+        self.collections = {'clients': [{'client_id': 'client1', 'client_secret': 'secret1', 'scope': 'all'}],
+                            'tokens': [], 'revoked_tokens': []}
+        self.counts = 0
+
+    def save(self, doc, doc_type, multiple=False):
+        self.collections[doc_type].append(doc)
+
+    def find_doc(self, key, value, doc_type, limit=1, conditions=None, **kwargs):
+        conditions = dict(conditions or {})
+        if key:
+            conditions[key] = value
+        docs = [dict(doc) for doc in self.collections[doc_type] if _matches(doc, conditions)]
+        if limit == 1:
+            if not docs:
+                raise DatabaseRecordNotFound()
+            return docs[0]
+        if not docs:
+            raise DatabaseEmptyResult()
+        return docs
+
+    def find_and_delete(self, doc_type, conditions):
+        doc = self.find_doc(None, None, doc_type, conditions=conditions)
+        self.delete(doc_type, conditions)
+        return doc
+
+    def delete(self, doc_type, conditions, multiple=False):
+        docs = self.collections[doc_type]
+        self.collections[doc_type] = [doc for doc in docs if not _matches(doc, conditions)]
+        return len(docs) - len(self.collections[doc_type])
+
+    def count(self, doc_type, conditions=None):
+        self.counts += 1
+        return len([doc for doc in self.collections[doc_type] if _matches(doc, conditions or {})])
+
+
+class TokenStoreTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.auth_db = AuthDatabase()
+        self.provider = OAuth2Provider(self.auth_db)
+
+    def test_refresh_token_is_single_use(self):
+        tokens = self.provider.generate_access_token('uid1', 'client1', 'all', ttl=3600)
+        self.provider.find_access_token(tokens['access_token'])
+
+        refreshed = self.provider.refresh_access_token(tokens['refresh_token'], 'client1')
+
+        self.assertNotEqual(refreshed['access_token'], tokens['access_token'])
+        self.assertRaises(DatabaseRecordNotFound, self.provider.find_access_token, tokens['access_token'])
+        self.assertRaises(RefreshTokenNotValid, self.provider.refresh_access_token, tokens['refresh_token'],
+                          'client1')
+
+    def test_refresh_token_of_other_client_is_rejected(self):
+        tokens = self.provider.generate_access_token('uid1', 'client1', 'all', ttl=3600)
+        self.assertRaises(RefreshTokenNotValid, self.provider.refresh_access_token, tokens['refresh_token'],
+                          'client2')
+
+    def test_compaction_deletes_expired_and_legacy_tokens(self):
+        now = time.time()
+        self.provider.generate_access_token('uid1', 'client1', 'all', ttl=3600)
+        self.auth_db.save({'access_token': 'at1', 'issue_date': now - 86400,
+                           'expires_at': datetime.utcfromtimestamp(now - 60)}, 'tokens')
+        self.auth_db.save({'access_token': 'at2', 'issue_date': now - 2 * self.provider._refresh_token_ttl}, 'tokens')
+        self.auth_db.save({'jti': 'jti1', 'expires_at': now - 60}, 'revoked_tokens')
+
+        result = self.provider.compact_tokens()
+
+        self.assertEqual((result['tokens'], result['legacy_tokens'], result['revoked_tokens']), (1, 1, 1))
+        self.assertEqual(len(self.auth_db.collections['tokens']), 1)
+
+    def test_token_stats_are_cached(self):
+        self.provider.generate_access_token('uid1', 'client1', 'all', ttl=3600)
+        self.assertEqual(self.provider.token_stats()['live'], 1)
+        counts = self.auth_db.counts
+
+        self.provider.generate_access_token('uid2', 'client1', 'all', ttl=3600)
+        self.assertEqual(self.provider.token_stats()['live'], 1)
+        self.assertEqual(self.auth_db.counts, counts)
+
+        self.provider._token_stats_at -= self.provider._token_stats_ttl + 1
+        self.assertEqual(self.provider.token_stats()['live'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()